@@ -1,28 +1,33 @@
 
-import random
+from caches import DepthPreferredCache, LRUCache, estimate_size
 from checkers import Board, Game, Piece
+from checkers import canonical_key, game_seed, make_rng, position_key, \
+    swaps_colors, transform_square
 import math
+import json
+import time
 from copy import deepcopy
-import click
-from colorama import Fore, Style
 
 
 class RandomBot:
     """
     Class representing the random bot
     """
-    def __init__(self, game : Game, color : str):
+    def __init__(self, game : Game, color : str, seed = None):
         """
         Constructor
 
         Args:
             game(Game): the current game
             color (str): color of bot's pieces
+            seed (optional): seed of the bot's moves (see make_rng). Defaults
+            to None, drawing from the game's random number generator.
         """
         self._game = game
         self._board = self._game.board
         self._color = color
         self.wins = 0
+        self.rng = game.rng if seed is None else make_rng(seed)
 
     def suggest_move(self) -> tuple:
         """
@@ -33,46 +38,582 @@ class RandomBot:
             where it should be moved to
         """
         all_moves = self._game.player_all_moves(self._board, self._game.current_player)
-        rand = random.choice(all_moves)
+        rand = self.rng.choice(all_moves)
         _,move,piece = rand
         return piece, move
 
+class SearchAborted(Exception):
+    """
+    Raised inside a search that has been stopped or has run out of time.
+    """
+
+
+class SearchProfile:
+    """
+    Class that records where a single SmartBot search spends its tree: nodes,
+    branching factor and cutoffs per ply, table hit rates, and the time spent
+    in move generation, evaluation and board copying.
+    """
+
+    TIMERS = ("movegen", "evaluation", "copying")
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.plies = {}
+        self.tables = {}
+        self.timers = {name: 0.0 for name in self.TIMERS}
+        self._start = time.perf_counter()
+        self.total_time = 0.0
+
+    def _ply(self, ply : int) -> dict:
+        if ply not in self.plies:
+            self.plies[ply] = {"nodes": 0, "expanded": 0, "children": 0,
+                               "cutoffs": 0, "cutoff_positions": {}}
+        return self.plies[ply]
+
+    def node(self, ply : int) -> None:
+        """
+        Records a visit to a node at the given ply.
+        """
+        self._ply(ply)["nodes"] += 1
+
+    def expand(self, ply : int, num_moves : int) -> None:
+        """
+        Records that num_moves children of a node at the given ply were
+        searched, before a cutoff or after running out of moves.
+        """
+        stats = self._ply(ply)
+        stats["expanded"] += 1
+        stats["children"] += num_moves
+
+    def cutoff(self, ply : int, move_index : int) -> None:
+        """
+        Records a cutoff at the given ply, caused by the move searched at
+        position move_index (0 being the first move tried).
+        """
+        stats = self._ply(ply)
+        stats["cutoffs"] += 1
+        positions = stats["cutoff_positions"]
+        positions[move_index] = positions.get(move_index, 0) + 1
+
+    def probe(self, table : str, hit : bool) -> None:
+        """
+        Records a lookup in one of the search tables.
+        """
+        stats = self.tables.setdefault(table, {"probes": 0, "hits": 0})
+        stats["probes"] += 1
+        if hit:
+            stats["hits"] += 1
+
+    def add_time(self, timer : str, seconds : float) -> None:
+        """
+        Adds time spent in move generation, evaluation or copying.
+        """
+        self.timers[timer] += seconds
+
+    def finish(self) -> None:
+        """
+        Stops the clock on the search.
+        """
+        self.total_time = time.perf_counter() - self._start
+
+    def report(self) -> dict:
+        """
+        Summarizes the recorded statistics.
+
+        Returns:
+            dict: JSON-serializable report of the search
+        """
+        plies = []
+        for ply in sorted(self.plies):
+            stats = self.plies[ply]
+            expanded = stats["expanded"]
+            cutoffs = stats["cutoffs"]
+            positions = stats["cutoff_positions"]
+            plies.append({
+                "ply": ply,
+                "nodes": stats["nodes"],
+                "branching_factor": stats["children"] / expanded if expanded else 0.0,
+                "cutoff_rate": cutoffs / expanded if expanded else 0.0,
+                "mean_cutoff_position": (sum(i * n for i, n in positions.items())
+                                         / cutoffs if cutoffs else None),
+                "cutoff_positions": {str(i): positions[i] for i in sorted(positions)},
+            })
+        tables = {}
+        for name, stats in self.tables.items():
+            tables[name] = dict(stats, hit_rate=stats["hits"] / stats["probes"]
+                                if stats["probes"] else 0.0)
+        timed = sum(self.timers.values())
+        return {
+            "nodes": sum(stats["nodes"] for stats in self.plies.values()),
+            "total_time": self.total_time,
+            "time": dict(self.timers, other=max(self.total_time - timed, 0.0)),
+            "tables": tables,
+            "plies": plies,
+        }
+
+    def to_json(self, indent = None) -> str:
+        """
+        Returns the report as a JSON string.
+        """
+        return json.dumps(self.report(), indent=indent)
+
+
+# int: estimated bytes of a transposition table entry, with its key
+_TT_ENTRY_BYTES = estimate_size((2 ** 63, [8, 1.5, 0, ((5, 1), (4, 2)), 100]))
+
+# int: estimated bytes of an evaluation cache entry, with its key
+_EVAL_ENTRY_BYTES = estimate_size((2 ** 63, 1.5))
+
+
 class SmartBot:
     """
-    Class representing the smartbot
+    Class representing the smartbot. The bot runs an alpha-beta search and
+    keeps its transposition table, killer moves, history scores and principal
+    variation from one move to the next, ageing them as the game goes on.
     """
 
-    def __init__(self, game : Game, color : str):
+    # int: score of a won position, less the ply at which it is won
+    WIN_SCORE = 1000
+
+    # int: most plies a search reaches, so that any score beyond
+    # WIN_SCORE - MAX_PLY is a win or a loss
+    MAX_PLY = 256
+
+    # int: number of searches after which an unused transposition table
+    # entry is ignored
+    MAX_AGE = 8
+
+    # int: transposition table entry flags
+    EXACT, LOWER, UPPER = 0, 1, 2
+
+    # int: number of nodes searched between two checks of the stop flag and
+    # the deadline
+    CHECK_INTERVAL = 256
+
+    def __init__(self, game : Game, color : str, profile = False, depth = 2,
+                 evaluator = None, symmetric_tables = False, tt_mb = 16,
+                 eval_cache_mb = 4):
         """
         Constructor
 
         Args:
             game (Game): the current game
             color (str): color of bot's pieces
+            profile (bool, optional): whether to record a SearchProfile for
+            every search. Defaults to False.
+            depth (int, optional): the depth of the game tree. Defaults to 2.
+            evaluator (optional): a learned evaluator from the evaluator
+            module, used instead of Board._evaluate. Leaf positions are then
+            evaluated in batches. Defaults to None.
+            symmetric_tables (bool, optional): whether positions equivalent
+            under the board's symmetries share a transposition table entry.
+            This assumes the evaluation is the same for equivalent positions,
+            with the sign changed when the colors are swapped, which holds
+            for Board._evaluate and the weighted evaluator. Defaults to False.
+            tt_mb (float, optional): memory limit of the transposition table,
+            in megabytes. When it is full, the deepest entry of the current
+            search is kept. Defaults to 16.
+            eval_cache_mb (float, optional): memory limit of the cache of
+            learned evaluations, in megabytes. When it is full, the least
+            recently used evaluation is dropped. Defaults to 4.
         """
         self._game = game
         self._board = self._game.board
         self._color = color
         self.wins = 0
+        self.profile = profile
+        self.depth = depth
+        self.evaluator = evaluator
+        self.symmetric_tables = symmetric_tables
+        # DepthPreferredCache: [depth, score, flag, move, generation] keyed
+        # by position key, or canonical key with symmetric tables
+        self._tt = DepthPreferredCache(
+            lambda entry: (entry[4], entry[0]), max_mb=tt_mb,
+            entry_bytes=_TT_ENTRY_BYTES)
+        # LRUCache: learned evaluations from black's point of view, keyed
+        # by board hash
+        self._eval_cache = LRUCache(max_mb=eval_cache_mb,
+                                    entry_bytes=_EVAL_ENTRY_BYTES)
+        # float | None: time.monotonic() after which searches are abandoned
+        self.deadline = None
+        # int: nodes searched by the last search
+        self.nodes = 0
+        # float | None: score of the last completed search, from the bot's
+        # point of view
+        self.last_score = None
+        # bool: whether the last search was abandoned
+        self.aborted = False
+        self._stopped = False
+        self.last_profile = None
+        self._profile = None
+        self._pv_table = {}
+        self._pv_key = None
+        self.reset_search()
+
+    def reset_search(self) -> None:
+        """
+        Clears the search state kept between moves.
+        """
+        self._tt.clear()
+        self._killers = {}
+        self._history = {}
+        self._pv = []
+        self._generation = 0
+        self._game_number = self._game.game_number
+        self._search_color = self._color
+        self._root_key = None
 
     def suggest_move(self) -> tuple:
         """
-        Suggests a move!
+        Suggests a move! The search is abandoned, aborted set and None
+        returned, if stop is called or the deadline passes before it
+        finishes.
 
         Returns:
             tuple(Piece, tuple): a tuple containing the piece that should be
             moved and where it should be moved in coordinate form
         """
 
-        _, best_move = self._minimax(self._board, 2, True, self._game)
-
+        self._age_search()
+        self._profile = SearchProfile() if self.profile else None
+        jump_bool = self._game.jump_bool
+        self._pv_table = {}
+        self.nodes = 0
+        self.aborted = False
+        try:
+            score, best_move = self._minimax(self._board, self.depth, True,
+                                             self._game)
+        except SearchAborted:
+            self.aborted = True
+            self._profile = None
+            return None
+        finally:
+            self._game.jump_bool = jump_bool
+            self._stopped = False
+        self.last_score = score
+        self._pv = self._pv_table.get(0, [])
+        self._pv_key = self._position_after(self._pv[:2])
+        self._game.jump_bool = jump_bool
+        if self._profile is not None:
+            self._profile.finish()
+            self.last_profile = self._profile
+            self._profile = None
 
+        if best_move is None:
+            return None
         piece, move = best_move
         #print(f"I suggest this move: {piece.location} to {move[0] + 1, move[1] + 1}")
 
         return piece, move
 
-    def _minimax(self, board_state : Board, depth : int, max_player : bool, game : Game):
+    def analysis(self, num_moves = 3, max_depth = None):
+        """
+        Analyses the current position one depth deeper at a time, yielding
+        the best root moves after every completed depth. Each root move is
+        searched with a window that only proves it worse than the last of
+        the best moves so far, so the scores of the moves yielded are exact.
+        The analysis ends early, without yielding the unfinished depth, if
+        stop is called, the deadline passes or the caller stops iterating.
+        The board must not change while the analysis runs.
+
+        Args:
+            num_moves (int, optional): number of best moves to yield.
+            Defaults to 3.
+            max_depth (int, optional): the deepest depth to search. Defaults
+            to the bot's depth.
+        Yields:
+            tuple(int, list[dict]): the depth, and the best moves from best
+            to worst, each a dict with the "piece", its "move" as a
+            (location, destination) pair, its "score" from the bot's point
+            of view and its principal variation "pv", a list of
+            (location, destination) moves starting with the move
+        """
+        game = self._game
+        board = self._board
+        max_depth = self.depth if max_depth is None else max_depth
+        self._age_search()
+        self._profile = None
+        jump_bool = game.jump_bool
+        self.nodes = 0
+        self.aborted = False
+        root_moves = list(game.generate_moves(board, self._color))
+        game.jump_bool = jump_bool
+        scores = {}
+        try:
+            for depth in range(1, max_depth + 1):
+                # search the best moves of the last depth first
+                root_moves.sort(key=lambda entry: scores.get(
+                    (entry[0], entry[1]), -math.inf), reverse=True)
+                lines = []
+                for location, move, piece in root_moves:
+                    alpha = lines[-1]["score"] if len(lines) >= num_moves \
+                        else -math.inf
+                    self._pv_table = {}
+                    new_board = self.simulate_move(piece, move, board, game)
+                    score, _ = self._minimax(new_board, depth - 1, False, game,
+                                             1, alpha, math.inf)
+                    scores[(location, move)] = score
+                    if score <= alpha:
+                        continue
+                    lines.append({"piece": piece, "move": (location, move),
+                                  "score": score, "pv": [(location, move)] +
+                                  self._pv_table.get(1, [])})
+                    lines.sort(key=lambda line: line["score"], reverse=True)
+                    del lines[num_moves:]
+                if lines:
+                    self.last_score = lines[0]["score"]
+                    self._pv = lines[0]["pv"]
+                game.jump_bool = jump_bool
+                yield depth, lines
+                if not lines:
+                    return
+        except SearchAborted:
+            self.aborted = True
+        finally:
+            self._stopped = False
+            self._pv_key = self._position_after(self._pv[:2])
+            game.jump_bool = jump_bool
+
+    def analyse(self, callback, num_moves = 3, max_depth = None) -> list:
+        """
+        Runs an analysis (see analysis), calling callback with the depth and
+        the best moves after every completed depth. The analysis stops early
+        if callback returns False.
+
+        Args:
+            callback (function): called with (depth, lines)
+            num_moves (int, optional): number of best moves to report.
+            Defaults to 3.
+            max_depth (int, optional): the deepest depth to search. Defaults
+            to the bot's depth.
+        Returns:
+            list[dict]: the best moves at the deepest completed depth, empty
+            if none completed
+        """
+        result = []
+        analysis = self.analysis(num_moves, max_depth)
+        try:
+            for depth, lines in analysis:
+                result = lines
+                if callback(depth, lines) is False:
+                    break
+        finally:
+            analysis.close()
+        return result
+
+    def cache_stats(self) -> dict:
+        """
+        Returns the hit rate, fill level and memory use of the bot's caches
+        (see Cache.stats).
+        """
+        stats = {"transposition": self._tt.stats()}
+        if self.evaluator is not None:
+            stats["evaluation"] = self._eval_cache.stats()
+        return stats
+
+    def stop(self) -> None:
+        """
+        Abandons the search running in another thread, or the next search
+        if none is running.
+        """
+        self._stopped = True
+
+    def dump_profile(self, path : str, indent = 2) -> None:
+        """
+        Writes the profile of the last search to a JSON file.
+
+        Args:
+            path (str): file to write the report to
+            indent (int, optional): JSON indentation. Defaults to 2.
+        Raises:
+            ValueError: if profiling is off or no search has run yet
+        """
+        if self.last_profile is None:
+            raise ValueError("No profiled search to dump, construct the bot with profile=True")
+        with open(path, "w") as f:
+            f.write(self.last_profile.to_json(indent))
+
+    def _age_search(self) -> None:
+        """
+        Private method that ages the search state before a new search, or
+        clears it if a rematch has started or the bot changed color.
+        """
+        if self._game_number != self._game.game_number or \
+                self._search_color != self._color:
+            self.reset_search()
+            self._root_key = self._game.position_key()
+            return
+        # searching the same position again, for example one depth deeper,
+        # keeps the search state as it is
+        root_key = self._game.position_key()
+        if root_key == self._root_key:
+            return
+        self._root_key = root_key
+        self._generation += 1
+        self._history = {move: score // 2 for move, score
+                         in self._history.items() if score > 1}
+        # a move and a reply have been played since the last search
+        self._killers = {ply - 2: moves for ply, moves
+                         in self._killers.items() if ply >= 2}
+        if self._pv_key is not None and \
+                self._pv_key == (self._board.hash, self._color):
+            self._pv = self._pv[2:]
+        else:
+            self._pv = []
+
+    def _position_after(self, moves : list):
+        """
+        Private method that returns the transposition table key of the
+        position reached by playing moves from the current position, or None
+        if there are fewer than two moves.
+        """
+        if len(moves) < 2:
+            return None
+        board = self._board
+        for location, move in moves:
+            board = self.simulate_move(board.get_piece(location), move, board,
+                                       self._game)
+        self._game.jump_bool = False
+        return (board.hash, self._color)
+
+    def _evaluate(self, board : Board) -> float:
+        """
+        Private method that evaluates a board from the bot's point of view.
+        """
+        return self._evaluate_batch([board])[0]
+
+    def _evaluate_batch(self, boards : list) -> list:
+        """
+        Private method that evaluates boards from the bot's point of view,
+        in one batch if the bot has a learned evaluator.
+        """
+        start = time.perf_counter()
+        if self.evaluator is None:
+            scores = [board._evaluate() for board in boards]
+        else:
+            cache = self._eval_cache
+            scores = [cache.get(board.hash) for board in boards]
+            missing = [i for i, score in enumerate(scores) if score is None]
+            if missing:
+                new_scores = self.evaluator.evaluate_batch(
+                    [boards[i] for i in missing]).tolist()
+                for i, score in zip(missing, new_scores):
+                    scores[i] = score
+                    cache.put(boards[i].hash, score)
+        if self._profile is not None:
+            self._profile.add_time("evaluation", time.perf_counter() - start)
+        return scores if self._color == "B" else [-score for score in scores]
+
+    def _table_key(self, board : Board, color : str) -> tuple:
+        """
+        Private method that returns the transposition table key of a
+        position and the symmetry that takes it to the position stored under
+        that key.
+        """
+        if self.symmetric_tables:
+            return canonical_key(board, color)
+        return position_key(board, color), "identity"
+
+    def _transform_move(self, move, size : int, symmetry : str):
+        """
+        Private method that maps a (location, destination) move between a
+        position and its transposition table entry. Every symmetry is its own
+        inverse, so the same call maps both ways.
+        """
+        if move is None or symmetry == "identity":
+            return move
+        return (transform_square(move[0], size, symmetry),
+                transform_square(move[1], size, symmetry))
+
+    def _transform_score(self, score : float, flag : int, symmetry : str) -> tuple:
+        """
+        Private method that maps a score and its bound flag between a
+        position and its transposition table entry. A symmetry that swaps the
+        colors negates the score, turning lower bounds into upper bounds.
+        """
+        if not swaps_colors(symmetry):
+            return score, flag
+        if flag != self.EXACT:
+            flag = self.UPPER if flag == self.LOWER else self.LOWER
+        return -score, flag
+
+    def _score_to_table(self, score : float, ply : int) -> float:
+        """
+        Private method that turns a win or loss score, counted from the root
+        of the search, into one counted from the node at ply it is stored
+        at, so that the entry holds wherever the position is reached again.
+        """
+        if score > self.WIN_SCORE - self.MAX_PLY:
+            return score + ply
+        if score < self.MAX_PLY - self.WIN_SCORE:
+            return score - ply
+        return score
+
+    def _score_from_table(self, score : float, ply : int) -> float:
+        """
+        Private method that turns a win or loss score read from the
+        transposition table at ply back into one counted from the root (see
+        _score_to_table).
+        """
+        if score > self.WIN_SCORE - self.MAX_PLY:
+            return score - ply
+        if score < self.MAX_PLY - self.WIN_SCORE:
+            return score + ply
+        return score
+
+    def _staged_moves(self, board : Board, color : str, ply : int, tt_move,
+                      game : Game):
+        """
+        Private generator of the moves to search at a node, in stages: the
+        transposition table move first if it is a legal capture, then the
+        other captures, or if there are none, the quiet moves with the
+        transposition table, principal variation and killer moves first and
+        the rest by history score.
+        """
+        if tt_move is not None and abs(tt_move[1][0] - tt_move[0][0]) == 2:
+            location, destination = tt_move
+            piece = board.get_piece(location)
+            if piece is not None and piece.color == color and \
+                    destination in game._piece_moves_jumps(board, piece)[0]:
+                yield (location, destination, piece)
+            else:
+                tt_move = None
+            skip = tt_move
+        else:
+            skip = None
+
+        pv_move = self._pv[ply] if ply < len(self._pv) else None
+        killers = self._killers.get(ply, ())
+        history = self._history
+
+        def priority(location, move):
+            key = (location, move)
+            return (key == tt_move, key == pv_move, key in killers,
+                    history.get((color, location, move), 0))
+
+        for entry in game.generate_moves(board, color, priority):
+            if skip is not None and (entry[0], entry[1]) == skip:
+                continue
+            yield entry
+
+    def _store_cutoff(self, color : str, ply : int, move : tuple, depth : int) -> None:
+        """
+        Private method that records a move that caused a cutoff in the killer
+        and history tables.
+        """
+        killers = self._killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        location, destination = move
+        key = (color, location, destination)
+        self._history[key] = self._history.get(key, 0) + depth * depth
+
+    def _minimax(self, board_state : Board, depth : int, max_player : bool,
+                 game : Game, ply = 0, alpha = -math.inf, beta = math.inf):
         """
         Private method for finding the best move for the smartbot.
 
@@ -81,33 +622,119 @@ class SmartBot:
             depth (int): the depth of the game tree
             max_player (bool): whether this is the max player or not
             game (Game): current game
+            ply (int, optional): distance from the root of the search
+            alpha (float, optional): score the max player is already assured of
+            beta (float, optional): score the min player is already assured of
 
         Returns:
-            _type_: _description_
+            tuple(float, tuple | None): the score of the board and the best
+            (piece, move) from it, if one was searched
         """
 
+        profile = self._profile
+        if profile is not None:
+            profile.node(ply)
+        self.nodes += 1
+        if self.nodes % self.CHECK_INTERVAL == 0 and (self._stopped or (
+                self.deadline is not None and time.monotonic() > self.deadline)):
+            raise SearchAborted
+        self._pv_table[ply] = []
 
         if depth == 0 or game.end_game:
-            return board_state._evaluate(), board_state
+            return self._evaluate(board_state), None
+
+        color = self._color if max_player else \
+            ("R" if self._color == "B" else "B")
+        key, symmetry = self._table_key(board_state, color)
+        entry = self._tt.get(key)
+        if entry is not None and self._generation - entry[4] > self.MAX_AGE:
+            entry = None
+        if profile is not None:
+            profile.probe("transposition", entry is not None)
+        tt_move = None
+        if entry is not None:
+            entry[4] = self._generation
+            tt_move = self._transform_move(entry[3], board_state.size, symmetry)
+            if ply > 0 and entry[0] >= depth:
+                score, flag = self._transform_score(entry[1], entry[2], symmetry)
+                score = self._score_from_table(score, ply)
+                if flag == self.EXACT:
+                    return score, None
+                if flag == self.LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score, None
+        orig_alpha, orig_beta = alpha, beta
+
+        moves = self._staged_moves(board_state, color, ply, tt_move, game)
+        frontier = None
+        if depth == 1 and self.evaluator is not None:
+            # evaluate all the leaves below this node in one batch
+            moves = list(moves)
+            frontier = self._evaluate_batch([
+                self.simulate_move(piece, move, board_state, game)
+                for _, move, piece in moves])
+            moves = iter(moves)
 
         best_move = None
-        if max_player: #if AI
-            best = -math.inf
-            all_moves = self.get_all_moves(board_state, "B", game) #get all of the simulated moves
-            for piece,move,new_board in all_moves:
-                eval, _ = self._minimax(new_board, depth - 1, False, game)
-                if eval > best:
-                    best = eval
-                    best_move = (piece, move)
-
-        else: #if random or human
-            best = math.inf
-            all_moves = self.get_all_moves(board_state, "R", game)
-            for piece, move, new_board in all_moves:
-                eval, _ = self._minimax(new_board, depth - 1, True, game)
-                if eval < best:
-                    best = eval
-                    best_move = (piece, move)
+        best_key = None
+        best = -math.inf if max_player else math.inf
+        index = 0
+        while True:
+            if profile is None:
+                next_move = next(moves, None)
+            else:
+                start = time.perf_counter()
+                next_move = next(moves, None)
+                profile.add_time("movegen", time.perf_counter() - start)
+            if next_move is None:
+                break
+            location, move, piece = next_move
+            if frontier is not None:
+                if profile is not None:
+                    profile.node(ply + 1)
+                eval = frontier[index]
+            else:
+                new_board = self.simulate_move(piece, move, board_state, game)
+                eval, _ = self._minimax(new_board, depth - 1, not max_player,
+                                        game, ply + 1, alpha, beta)
+            index += 1
+            if (max_player and eval > best) or (not max_player and eval < best):
+                best = eval
+                best_move = (piece, move)
+                best_key = (location, move)
+                self._pv_table[ply] = [best_key] + \
+                    self._pv_table.get(ply + 1, [])
+            if max_player:
+                alpha = max(alpha, best)
+            else:
+                beta = min(beta, best)
+            if alpha >= beta:
+                if profile is not None:
+                    profile.cutoff(ply, index - 1)
+                self._store_cutoff(color, ply, (location, move), depth)
+                break
+
+        if profile is not None:
+            profile.expand(ply, index)
+        if index == 0:
+            # the player to move has lost
+            score = self.WIN_SCORE - ply
+            return (-score if max_player else score), None
+
+        if best <= orig_alpha:
+            flag = self.UPPER
+        elif best >= orig_beta:
+            flag = self.LOWER
+        else:
+            flag = self.EXACT
+        if entry is None or entry[0] <= depth or entry[4] < self._generation:
+            score, flag = self._transform_score(
+                self._score_to_table(best, ply), flag, symmetry)
+            self._tt.put(key, [depth, score, flag, self._transform_move(
+                best_key, board_state.size, symmetry), self._generation])
 
         return best, best_move
 
@@ -119,46 +746,19 @@ class SmartBot:
         ###ALL MOVES INPUTTED WILL BE VALID####
         ###JUST HAVE TO HANDLE JUMPS AND KINGS####
 
-        original_loc = piece.location
-        start_row, start_col = piece.location
-        end_row, end_col = move
-
-        #are there jumps for the move we're considering?
-        jumps = game.piece_all_jumps(piece)
-        jumped_piece = None
-
-        #find the piece that the specified move will jump over
-        if jumps:
-            jumped_piece = board.get_piece_between(piece.location, move)
-
-            #if there is a jumped piece, remove it
-            if jumped_piece:
-                row, col = jumped_piece.location
-                board.grid[row][col] = None
         game.jump_bool = False
+        undo = board.make_move(piece.location, move)
 
-        #MOVE THE PIECE!
-
-        board.grid[start_row][start_col] = None
-        board.grid[end_row][end_col] = piece
-        board.pieces[piece.color].append(piece)
-
-
-        #handle kings
-        if not piece.is_king:
-            if (piece.color == 'R' and end_row == board.size - 1) or \
-            (piece.color == 'B' and end_row == 0):
-                piece.became_king = True
-                piece.is_king = True
-
-
-        new_board = deepcopy(board)
+        if self._profile is None:
+            new_board = deepcopy(board)
+        else:
+            start = time.perf_counter()
+            new_board = deepcopy(board)
+            self._profile.add_time("copying", time.perf_counter() - start)
 
         # REVERSE THE MOVE!
 
-
-        board._reverse_move(move, original_loc, game, jumped_piece)
-
+        board.unmake_move(undo)
 
         return new_board
 
@@ -166,7 +766,12 @@ class SmartBot:
     def get_all_moves(self, board, color, game):
         #get all possible moves that we can make from a board
         moves = []
-        all_moves = game.player_all_moves(board, color)
+        if self._profile is None:
+            all_moves = game.player_all_moves(board, color)
+        else:
+            start = time.perf_counter()
+            all_moves = game.player_all_moves(board, color)
+            self._profile.add_time("movegen", time.perf_counter() - start)
 
         #print(f"all moves redunancy check: {all_moves}")
         for _,move,piece in all_moves:
@@ -176,6 +781,188 @@ class SmartBot:
         return moves
 
 
+class _MCTSNode:
+    """
+    Node of the MCTSBot search tree. Each node is the position reached by
+    playing move from its parent's position.
+    """
+
+    __slots__ = ("move", "parent", "player", "key", "children", "untried",
+                 "visits", "wins")
+
+    def __init__(self, move, parent, player : str, key : int):
+        """
+        Constructor
+
+        Args:
+            move (tuple | None): (location, destination) of the move leading
+            to this node, None for the root
+            parent (_MCTSNode | None): the parent node
+            player (str): color of the player that made move
+            key (int): position key of the node's position
+        """
+        self.move = move
+        self.parent = parent
+        self.player = player
+        self.key = key
+        self.children = []
+        self.untried = None
+        self.visits = 0
+        self.wins = 0.0
+
+    def select_child(self, exploration : float):
+        """
+        Returns the child with the highest UCT score.
+        """
+        log_visits = math.log(self.visits)
+        return max(self.children, key=lambda child: child.wins / child.visits +
+                   exploration * math.sqrt(log_visits / child.visits))
+
+
+class MCTSBot:
+    """
+    Class representing the Monte Carlo Tree Search bot. Moves are chosen by
+    UCT selection over random playouts, and the subtree under the played move
+    is kept for the next turn.
+    """
+
+    def __init__(self, game : Game, color : str, playouts = 1000,
+                 time_limit = 2.0, exploration = 1.4, rollout_limit = 200,
+                 seed = None):
+        """
+        Constructor
+
+        Args:
+            game (Game): the current game
+            color (str): color of bot's pieces
+            playouts (int | None, optional): maximum number of playouts per
+            move. Defaults to 1000.
+            time_limit (float | None, optional): maximum number of seconds
+            per move. Defaults to 2.0.
+            exploration (float, optional): UCT exploration constant. Defaults
+            to 1.4.
+            rollout_limit (int, optional): number of moves after which a
+            playout is scored on material. Defaults to 200.
+            seed (optional): seed of the playouts (see make_rng). Defaults to
+            None, drawing from the game's random number generator. The moves
+            only replay exactly with time_limit None, as the number of
+            playouts then no longer depends on the machine.
+        Raises:
+            ValueError: if neither a playout nor a time budget is given
+        """
+        if playouts is None and time_limit is None:
+            raise ValueError("MCTSBot needs a playout or a time budget")
+        self._game = game
+        self._board = self._game.board
+        self._color = color
+        self.wins = 0
+        self.playouts = playouts
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.rollout_limit = rollout_limit
+        self.rng = game.rng if seed is None else make_rng(seed)
+        self._root = None
+
+    def suggest_move(self) -> tuple:
+        """
+        Suggests a move by running playouts from the current position.
+
+        Returns:
+            tuple(Piece, tuple): a tuple containing the piece that should be
+            moved and where it should be moved in coordinate form
+        """
+        root = self._find_root()
+        start = time.perf_counter()
+        done = 0
+        while self.playouts is None or done < self.playouts:
+            if self.time_limit is not None and \
+                    time.perf_counter() - start >= self.time_limit:
+                break
+            self._playout(root)
+            done += 1
+            if root.untried == [] and not root.children:
+                break
+
+        if not root.children:
+            return None
+        best = max(root.children, key=lambda child: child.visits)
+        best.parent = None
+        self._root = best
+        location, move = best.move
+        return self._board.get_piece(location), move
+
+    def _find_root(self) -> _MCTSNode:
+        """
+        Private method that returns the node of the kept tree matching the
+        current position, or a new root if there is none.
+        """
+        key = self._game.position_key()
+        if self._root is not None:
+            # the opponent's reply, possibly several hops of a multi-jump
+            level = [self._root]
+            for _ in range(4):
+                for node in level:
+                    if node.key == key:
+                        node.parent = None
+                        return node
+                level = [child for node in level for child in node.children]
+        other = "B" if self._game.current_player == "R" else "R"
+        return _MCTSNode(None, None, other, key)
+
+    def _playout(self, root : _MCTSNode) -> None:
+        """
+        Private method that runs one select, expand, rollout and backpropagate
+        cycle from root.
+        """
+        game = deepcopy(self._game)
+        board = game.board
+        node = root
+
+        # selection
+        while node.untried == [] and node.children and not game.end_game:
+            node = node.select_child(self.exploration)
+            location, move = node.move
+            game.apply_move_unchecked(board.get_piece(location), move)
+
+        # expansion
+        if not game.end_game:
+            if node.untried is None:
+                node.untried = [(location, move) for location, move, _
+                    in game.player_all_moves(board, game.current_player)]
+                self.rng.shuffle(node.untried)
+            if node.untried:
+                location, move = node.untried.pop()
+                player = game.current_player
+                game.apply_move_unchecked(board.get_piece(location), move)
+                child = _MCTSNode((location, move), node, player,
+                                  game.position_key())
+                node.children.append(child)
+                node = child
+
+        # rollout
+        moves_left = self.rollout_limit
+        while not game.end_game and moves_left > 0:
+            _, move, piece = self.rng.choice(
+                game.player_all_moves(board, game.current_player))
+            game.apply_move_unchecked(piece, move)
+            moves_left -= 1
+        if game.end_game:
+            winner = game.winner
+        elif board.material != 0:
+            winner = "B" if board.material > 0 else "R"
+        else:
+            winner = None
+
+        # backpropagation
+        while node is not None:
+            node.visits += 1
+            if winner is None:
+                node.wins += 0.5
+            elif winner == node.player:
+                node.wins += 1
+            node = node.parent
+
+
 ##SIMULATION
 def print_board(board: Board, selected = (-1,-1), pos = [(-1,-1)]) -> None:
     """
@@ -189,6 +976,9 @@ def print_board(board: Board, selected = (-1,-1), pos = [(-1,-1)]) -> None:
         selected(tuple[int,int]): The piece currently selected.
         pos(list[tuple(int,int)]): A list of possible destinations for selected
     """
+    # only needed for printing, so not imported with the bots
+    from colorama import Fore, Style
+
     # length = board.length
     # width = board.width
     # setting board width and length to 8
@@ -235,45 +1025,77 @@ def print_board(board: Board, selected = (-1,-1), pos = [(-1,-1)]) -> None:
     print("  └───" + (width - 1) * "┴───" + "┘")
     print(Style.RESET_ALL)
 
+# dict[str, type]: the bots by name
+BOT_TYPES = {"random": RandomBot, "smart": SmartBot, "mcts": MCTSBot}
+
+
+def make_bot(name : str, game : Game, color : str, **options):
+    """
+    Creates a bot by name.
+
+    Args:
+        name (str): "random", "smart" or "mcts"
+        game (Game): the current game
+        color (str): color of bot's pieces
+        options: passed on to the bot's constructor
+    Raises:
+        ValueError: if the bot name is unknown
+    Returns:
+        the bot
+    """
+    if name not in BOT_TYPES:
+        raise ValueError(f"Unknown bot {name}, expected one of {list(BOT_TYPES)}")
+    return BOT_TYPES[name](game, color, **options)
+
+
 class BotPlayer:
 
     def __init__(self, name, color, game):
         self.name = name
-        if self.name == "random":
-            self.bot = RandomBot(game, color)
-        elif self.name == "smart":
-            self.bot = SmartBot(game, color)
+        if self.name in BOT_TYPES:
+            self.bot = make_bot(self.name, game, color)
 
         self.color = color
         self.wins = 0
 
-def simulate(player1, player2, num_games, board):
+def simulate(player1, player2, num_games, board, seed = None, first_game = 0,
+             log = None):
+    """
+    Plays games between two bots and prints how often each wins. Every game
+    gets its own seed derived from seed, so that with the same seed, game i
+    replays exactly on its own with first_game=i and num_games=1.
+    If a log is given (see simulate.SimulationLog), every finished game is
+    streamed to it, the games it already holds are not played again, and
+    the percentages cover all the games it holds.
+    """
     black_wins = 0
     red_wins = 0
+    draws = 0
 
-    starting_players = []
-    for i in range(num_games):
+    for i in range(first_game, first_game + num_games):
+        if log is not None and i in log.completed:
+            continue
         print(f"starting game {i}")
         board.reset_board()
-        game = Game(board) #current player starts as Black
-        if i != 0:
-            if starting_players[-1] == "B":
-                game.current_player = "R"
-            else:
-                game.current_player = "B"
+        game = Game(board, seed=game_seed(seed, i))
+        # black starts the even games and red the odd ones
+        if i % 2:
+            game.current_player = "R"
+        positions = [game.to_position()] if log is not None else None
 
-        starting_players.append(game.current_player)
         #print(f"{game.current_player} starting this game")
         #print_board(game.board)
         bot1 = BotPlayer(player1, "B", game)
         bot2 = BotPlayer(player2, "R", game)
         bots = {"B": bot1, "R": bot2}
         while not game.end_game:
-            piece, move = bots[game.current_player].bot.suggest_move() if bots[game.current_player].bot.suggest_move() != None else None
+            piece, move = bots[game.current_player].bot.suggest_move()
             #print(f'bot suggests move: {piece.location} to {move}')
-            row, col = piece.location
             if move != None:
-                game.move(piece, move)#alternates the turn
+                # bots only suggest generated moves, so skip re-validation
+                game.apply_move_unchecked(piece, move)#alternates the turn
+                if positions is not None:
+                    positions.append(game.to_position())
                 #print_board(game.board)
 
 
@@ -286,20 +1108,19 @@ def simulate(player1, player2, num_games, board):
                 black_wins += 1
             else:
                 red_wins += 1
+        else:
+            draws += 1
+        if log is not None:
+            log.record(i, game_seed(seed, i), game, positions)
         #print(f"game {i} over")
 
     #calculate wins
+    if log is not None:
+        black_wins, red_wins, draws = (log.counts["B"], log.counts["R"],
+                                       log.counts["draw"])
+        num_games = len(log.completed)
 
-    print(f"'B'({bots['B'].name}) is: {(black_wins/num_games) * 100} %")
-    print(f"'R' bot ({bots['R'].name}) is: {(red_wins/num_games) * 100} %")
-
-
-#check randombot against randombot
-#board = Board(6)
-#print('testing random against random')
-#simulate("random", "random", 10000, board)
+    print(f"'B'({player1}) is: {(black_wins/num_games) * 100} %")
+    print(f"'R' bot ({player2}) is: {(red_wins/num_games) * 100} %")
+    print(f"draws: {(draws/num_games) * 100} %")
 
-#check smart against random
-board = Board(6)
-print('testing smart against random')
-simulate("smart", 'random', 100, board)
@@ -0,0 +1,230 @@
+# memory-bounded caches for the bots and front-ends
+
+import abc
+import sys
+from collections import OrderedDict
+
+# int: bytes a dictionary or table slot costs on top of its key and value
+SLOT_BYTES = 16
+
+
+def estimate_size(value, depth = 3) -> int:
+    """
+    Estimates the bytes a value takes, following tuples, lists and dicts
+    down to depth levels. Objects shared with other values are counted in
+    full, so this errs on the high side.
+    Args:
+        value: the value
+        depth (int, optional): how many levels of containers to follow.
+        Defaults to 3.
+    Returns:
+        int: the estimated size in bytes
+    """
+    size = sys.getsizeof(value)
+    if depth > 0:
+        if isinstance(value, (tuple, list)):
+            size += sum(estimate_size(item, depth - 1) for item in value)
+        elif isinstance(value, dict):
+            size += sum(estimate_size(key, depth - 1) + estimate_size(item, depth - 1)
+                        for key, item in value.items())
+    return size
+
+
+class Cache(abc.ABC):
+    """
+    Base class of the caches. A cache holds at most capacity entries, given
+    directly or as megabytes with an estimate of the bytes per entry, and
+    counts its hits, misses and evictions. Subclasses say how many entries
+    they hold.
+    """
+
+    def __init__(self, max_entries = None, max_mb = None, entry_bytes = 256):
+        """
+        Constructor
+
+        Args:
+            max_entries (int, optional): the most entries to hold
+            max_mb (float, optional): the most memory to use, in megabytes,
+            if max_entries is not given
+            entry_bytes (int, optional): estimated bytes per entry, used to
+            turn max_mb into entries and to report memory use. Defaults to
+            256.
+        Raises:
+            ValueError: if neither limit is given, or the capacity is not
+            positive
+        """
+        if max_entries is None:
+            if max_mb is None:
+                raise ValueError("A cache needs max_entries or max_mb")
+            max_entries = int(max_mb * 2 ** 20 // (entry_bytes + SLOT_BYTES))
+        if max_entries < 1:
+            raise ValueError("A cache must hold at least one entry")
+        self.capacity = max_entries
+        self.entry_bytes = entry_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        """
+        Returns the number of entries held.
+        """
+
+    def stats(self) -> dict:
+        """
+        Returns how well the cache is doing.
+        Returns:
+            dict: the "entries", "capacity", "fill" level, "hits", "misses",
+            "hit_rate", "evictions" and estimated "memory" in bytes
+        """
+        probes = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "capacity": self.capacity,
+            "fill": len(self) / self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / probes if probes else 0.0,
+            "evictions": self.evictions,
+            "memory": len(self) * (self.entry_bytes + SLOT_BYTES),
+        }
+
+    def _count(self, value):
+        """
+        Private method that counts a probe as a hit or a miss.
+        """
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+
+class LRUCache(Cache):
+    """
+    Cache that evicts the least recently used entry when it is full.
+    """
+
+    def __init__(self, max_entries = None, max_mb = None, entry_bytes = 256):
+        super().__init__(max_entries, max_mb, entry_bytes)
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def get(self, key, default = None):
+        """
+        Returns the value stored for key, or default.
+        """
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        self._count(value)
+        return default if value is None else value
+
+    def put(self, key, value) -> None:
+        """
+        Stores a value, evicting the least recently used entry if the cache
+        is full.
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Removes every entry, keeping the counts.
+        """
+        self._entries.clear()
+
+
+class DepthPreferredCache(Cache):
+    """
+    Fixed-size table for integer keys such as position keys, as used by
+    transposition tables. Each key maps to a bucket of two slots: the first
+    keeps the entry with the highest priority, say the deepest search, and
+    the second always takes the newest entry that the first turned down.
+    """
+
+    def __init__(self, priority, max_entries = None, max_mb = None,
+                 entry_bytes = 256):
+        """
+        Constructor
+
+        Args:
+            priority (function): returns the priority of a value. Of two
+            entries competing for a slot, the higher priority one is kept.
+            max_entries, max_mb, entry_bytes: see Cache
+        """
+        super().__init__(max_entries, max_mb, entry_bytes)
+        self.priority = priority
+        self._buckets = max(self.capacity // 2, 1)
+        self.capacity = self._buckets * 2
+        self._keys = [None] * self.capacity
+        self._values = [None] * self.capacity
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def get(self, key : int, default = None):
+        """
+        Returns the value stored for key, or default.
+        """
+        slot = (key % self._buckets) * 2
+        keys = self._keys
+        if keys[slot] == key:
+            return self._count(self._values[slot])
+        if keys[slot + 1] == key:
+            return self._count(self._values[slot + 1])
+        self.misses += 1
+        return default
+
+    def put(self, key : int, value) -> None:
+        """
+        Stores a value, replacing the value stored for key if there is one.
+        Otherwise it goes in the first slot of its bucket if that is empty
+        or holds a lower priority entry, which moves to the second slot, and
+        in the second slot if not.
+        """
+        slot = (key % self._buckets) * 2
+        keys = self._keys
+        values = self._values
+        if keys[slot] == key:
+            values[slot] = value
+            return
+        if keys[slot + 1] == key:
+            if self.priority(value) >= self.priority(values[slot]):
+                # the entry now beats the first slot's, so they swap
+                keys[slot], keys[slot + 1] = key, keys[slot]
+                values[slot], values[slot + 1] = value, values[slot]
+            else:
+                values[slot + 1] = value
+            return
+        if keys[slot] is None:
+            keys[slot], values[slot] = key, value
+            self._size += 1
+            return
+        if self.priority(value) >= self.priority(values[slot]):
+            # the first slot's entry moves down, evicting the second's
+            key, keys[slot] = keys[slot], key
+            value, values[slot] = values[slot], value
+        if keys[slot + 1] is None:
+            self._size += 1
+        else:
+            self.evictions += 1
+        keys[slot + 1], values[slot + 1] = key, value
+
+    def clear(self) -> None:
+        """
+        Removes every entry, keeping the counts.
+        """
+        self._keys = [None] * self.capacity
+        self._values = [None] * self.capacity
+        self._size = 0
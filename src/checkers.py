@@ -1,4 +1,328 @@
 #Checkers game
+import random
+from copy import deepcopy
+
+# dict[int, dict]: Zobrist keys per board size, built on first use
+_ZOBRIST_KEYS = {}
+
+# float: evaluation weight of a man and of a king
+MAN_VALUE = 1
+KING_VALUE = 1.5
+
+# int: Zobrist key xored into a position key when red is to move
+SIDE_KEY = random.Random("side").getrandbits(64)
+
+
+def make_rng(seed = None) -> random.Random:
+    """
+    Returns a random number generator for a seed, so that everything random
+    can be replayed from its seed.
+    Args:
+        seed (optional): an int or str seed, a random.Random to use as is,
+        or None for an unpredictable seed. Defaults to None.
+    Returns:
+        random.Random: the generator
+    """
+    if isinstance(seed, random.Random):
+        return seed
+    return random.Random(seed)
+
+
+def game_seed(master, index : int):
+    """
+    Derives the seed of one game of a run from the run's master seed, so
+    that any game can be replayed on its own.
+    Args:
+        master: the master seed, or None
+        index (int): the number of the game in the run
+    Returns:
+        str | None: the game's seed, None if the master seed is None
+    """
+    if master is None:
+        return None
+    return f"{master}:{index}"
+
+
+def zobrist_keys(size : int) -> dict:
+    """
+    Returns the Zobrist keys for a board size, keyed by (color, is_king) and
+    then by row and column. The keys are seeded by the size, so hashes are
+    the same from one run to the next.
+    Args:
+        size (int): the size of the board
+    Returns:
+        dict: the Zobrist keys for every piece kind on every square
+    """
+    if size not in _ZOBRIST_KEYS:
+        rng = random.Random(size)
+        _ZOBRIST_KEYS[size] = {
+            kind: [[rng.getrandbits(64) for _ in range(size)]
+                   for _ in range(size)]
+            for kind in (("B", False), ("B", True), ("R", False), ("R", True))
+        }
+    return _ZOBRIST_KEYS[size]
+
+
+# dict[int, dict]: diagonal lookup tables per board size, built on first use
+_DIAGONAL_TABLES = {}
+
+# tuple[tuple[int, int]]: the directions a man of each color moves in, and the
+# directions a king moves in
+DIRECTIONS = {"R": ((1, 1), (1, -1)),
+              "B": ((-1, 1), (-1, -1)),
+              "K": ((1, 1), (1, -1), (-1, 1), (-1, -1))}
+
+
+def diagonal_tables(size : int) -> dict:
+    """
+    Returns the diagonal lookup tables for a board size. The tables hold:
+        "rays": for each piece kind ("R" and "B" for men, "K" for kings), a
+        grid giving for every square a tuple of (neighbor, landing) pairs,
+        one per direction the piece moves in with a neighbor on the board.
+        landing is the square a jump over the neighbor lands on, or None if
+        that square is off the board.
+        "between": the square jumped over for every (start, landing) pair.
+    Args:
+        size (int): the size of the board
+    Returns:
+        dict: the lookup tables
+    """
+    if size not in _DIAGONAL_TABLES:
+        rays = {}
+        between = {}
+        for kind, directions in DIRECTIONS.items():
+            grid = [[None for _ in range(size)] for _ in range(size)]
+            for row in range(size):
+                for col in range(size):
+                    square = []
+                    for d_row, d_col in directions:
+                        next_row, next_col = row + d_row, col + d_col
+                        if not (0 <= next_row < size and 0 <= next_col < size):
+                            continue
+                        landing = (next_row + d_row, next_col + d_col)
+                        if 0 <= landing[0] < size and 0 <= landing[1] < size:
+                            between[((row, col), landing)] = (next_row, next_col)
+                        else:
+                            landing = None
+                        square.append(((next_row, next_col), landing))
+                    grid[row][col] = tuple(square)
+            rays[kind] = grid
+        _DIAGONAL_TABLES[size] = {"rays": rays, "between": between}
+    return _DIAGONAL_TABLES[size]
+
+
+# tuple[str]: the symmetries of a position. "flip" turns the board around
+# and swaps the colors of the pieces and of the player to move, "mirror"
+# reflects the board left to right.
+SYMMETRIES = ("identity", "flip", "mirror", "flip_mirror")
+
+
+def board_symmetries(size : int) -> tuple:
+    """
+    Returns the symmetries that keep pieces on the dark squares of a board.
+    Reflecting a board left to right moves dark squares onto light squares
+    when the size is even, so only odd sizes have the mirror symmetries.
+    Args:
+        size (int): the size of the board
+    Returns:
+        tuple[str]: the symmetries, from SYMMETRIES
+    """
+    return SYMMETRIES if size % 2 else SYMMETRIES[:2]
+
+
+def swaps_colors(symmetry : str) -> bool:
+    """
+    Returns whether a symmetry swaps the colors of the pieces, in which case
+    scores from a player's point of view change sign under it.
+    """
+    return symmetry.startswith("flip")
+
+
+def transform_square(square : tuple, size : int, symmetry : str) -> tuple:
+    """
+    Returns where a square goes under a symmetry. Every symmetry is its own
+    inverse, so this also maps squares back.
+    Args:
+        square (tuple): the square
+        size (int): the size of the board
+        symmetry (str): the symmetry, from SYMMETRIES
+    Returns:
+        tuple: the transformed square
+    """
+    row, col = square
+    if symmetry.startswith("flip"):
+        row, col = size - 1 - row, size - 1 - col
+    if symmetry.endswith("mirror"):
+        col = size - 1 - col
+    return (row, col)
+
+
+def transform_position(position : str, symmetry : str) -> str:
+    """
+    Returns a position written by Game.to_position transformed by a symmetry.
+    Args:
+        position (str): the position
+        symmetry (str): the symmetry, from SYMMETRIES
+    Returns:
+        str: the transformed position
+    """
+    player, _, text = position.strip().partition(":")
+    rows = text.split("/")
+    if symmetry.startswith("flip"):
+        player = "R" if player == "B" else "B"
+        rows = [row[::-1].translate(_SWAP_COLORS) for row in reversed(rows)]
+    if symmetry.endswith("mirror"):
+        rows = [row[::-1] for row in rows]
+    return f"{player}:{'/'.join(rows)}"
+
+
+_SWAP_COLORS = str.maketrans("bBrR", "rRbB")
+
+
+def position_key(board, player : str) -> int:
+    """
+    Returns a hash of a position: the pieces on a board and the player to
+    move.
+    Args:
+        board (Board): the board
+        player (str): the player to move
+    Returns:
+        int: the position key
+    """
+    if player == "R":
+        return board.hash ^ SIDE_KEY
+    return board.hash
+
+
+def symmetric_keys(board, player : str) -> dict:
+    """
+    Returns the position key of a position under each of its board's
+    symmetries, without building the transformed boards.
+    Args:
+        board (Board): the board
+        player (str): the player to move
+    Returns:
+        dict[str, int]: the key of the transformed position per symmetry
+    """
+    keys = zobrist_keys(board.size)
+    last = board.size - 1
+    result = {}
+    for symmetry in board_symmetries(board.size):
+        flip = symmetry.startswith("flip")
+        mirror = symmetry.endswith("mirror")
+        key = SIDE_KEY if (player == "R") != flip else 0
+        for color, other in (("B", "R"), ("R", "B")):
+            new_color = other if flip else color
+            for piece in board.pieces[color]:
+                row, col = piece.location
+                if flip:
+                    row, col = last - row, last - col
+                if mirror:
+                    col = last - col
+                key ^= keys[(new_color, piece.is_king)][row][col]
+        result[symmetry] = key
+    return result
+
+
+def canonical_key(board, player : str) -> tuple:
+    """
+    Returns the key shared by all the positions equivalent to a position
+    under the board's symmetries, so that tables can store one entry for
+    all of them.
+    Args:
+        board (Board): the board
+        player (str): the player to move
+    Returns:
+        tuple(int, str): the canonical key, and the symmetry taking the
+        position to its canonical form
+    """
+    keys = symmetric_keys(board, player)
+    symmetry = min(keys, key=keys.get)
+    return keys[symmetry], symmetry
+
+
+class PieceList:
+    """
+    The pieces of one color on a board, with constant time adds and removes:
+    a removed piece's slot is filled by the last piece. Each piece records
+    its slot, so a piece can only be in one PieceList at a time. Iterating
+    gives the pieces in slot order, which restore puts back exactly when
+    removes are undone in reverse order.
+    """
+
+    __slots__ = ("_items",)
+
+    def __init__(self, pieces = ()):
+        self._items = []
+        for piece in pieces:
+            self.add(piece)
+
+    def add(self, piece) -> None:
+        """
+        Adds a piece at the end of the list.
+        Raises:
+            ValueError: if the piece is already in a list
+        """
+        if piece._index is not None:
+            raise ValueError(f"Piece at {piece.location} is already on a board")
+        piece._index = len(self._items)
+        self._items.append(piece)
+
+    def remove(self, piece) -> int:
+        """
+        Removes a piece, moving the last piece into its slot.
+        Returns:
+            int: the slot the piece was in, for restore
+        Raises:
+            ValueError: if the piece is not in the list
+        """
+        index = piece._index
+        if index is None or index >= len(self._items) or \
+                self._items[index] is not piece:
+            raise ValueError(f"Piece at {piece.location} is not on the board")
+        last = self._items.pop()
+        if last is not piece:
+            self._items[index] = last
+            last._index = index
+        piece._index = None
+        return index
+
+    def restore(self, piece, index : int) -> None:
+        """
+        Puts a removed piece back into the slot remove returned, moving the
+        piece now in that slot to the end, which undoes the remove.
+        """
+        self.add(piece)
+        if index != piece._index:
+            moved = self._items[index]
+            self._items[index] = piece
+            self._items[-1] = moved
+            moved._index = piece._index
+            piece._index = index
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __contains__(self, piece) -> bool:
+        index = getattr(piece, "_index", None)
+        return index is not None and index < len(self._items) and \
+            self._items[index] is piece
+
+    def __repr__(self) -> str:
+        return f"PieceList({self._items!r})"
+
+    def __deepcopy__(self, memo):
+        pieces = PieceList.__new__(PieceList)
+        pieces._items = [deepcopy(piece, memo) for piece in self._items]
+        return pieces
+
+
 class Board:
     """
     Class that generates and represents a game board, establishes piece objects,
@@ -25,11 +349,27 @@ class Board:
             width (int): the width of the board
         """
 
-        self.pieces = {'B': [], 'R': []}
-        self.red_kings = 0
-        self.black_kings = 0
+        # dict[str, PieceList]: the pieces on the board by color
+        self.pieces = {'B': PieceList(), 'R': PieceList()}
+        # list[Piece | None]: the pieces added to the board by id
+        self._by_id = []
         self.terminal_board = False
 
+        # dict[str, int]: the number of men and kings of each color, kept up
+        # to date by every method that changes the pieces
+        self.men = {'B': 0, 'R': 0}
+        self.kings = {'B': 0, 'R': 0}
+
+        # float: black's material minus red's material, kept up to date
+        # alongside the counts
+        self.material = 0
+
+        # int: Zobrist hash of the pieces on the board, kept up to date
+        # alongside the counts
+        self.hash = 0
+        self._zobrist = zobrist_keys(size)
+        self._tables = diagonal_tables(size)
+
 
         # list[list[Piece]]: the board
         self.grid = [[None for _ in range(size)] for _ in range(size)]
@@ -62,15 +402,22 @@ class Board:
 
     def add_piece(self, piece):
         """
-        Method to add a piece to the board
+        Method to add a piece to the board. A piece gets an id the first time
+        it is added, which it keeps while it is on this board and in copies
+        of it, so that a move can be given as (piece id, destination).
         Args:
             piece (Piece object) - piece to add
+        Raises:
+            ValueError: if the piece is already on a board
         Returns:
             None
         """
-        row, col = piece.location
-        self.grid[row][col] = piece
-        self.pieces[piece.color].append(piece)
+        self.pieces[piece.color].add(piece)
+        if piece.id is None or piece.id >= len(self._by_id) or \
+                self._by_id[piece.id] is not piece:
+            piece.id = len(self._by_id)
+            self._by_id.append(piece)
+        self._place_piece(piece)
 
     def remove_piece(self, piece):
         """
@@ -78,12 +425,73 @@ class Board:
         attribute
         Args:
             piece (Piece object) - piece to remove
+        Raises:
+            ValueError: if the piece is not on the board
         Returns:
             None
         """
+        self._take_piece(piece)
+
+    def move_piece(self, piece, destination : tuple) -> None:
+        """
+        Method that moves a piece on the board to an empty square, without
+        captures or promotion.
+        Args:
+            piece (Piece object) - piece to move
+            destination (tuple) - where to move it
+        Returns:
+            None
+        """
+        keys = self._zobrist[(piece.color, piece.is_king)]
         row, col = piece.location
         self.grid[row][col] = None
-        self.pieces[piece.color].remove(piece)
+        self.hash ^= keys[row][col]
+        row, col = destination
+        self.grid[row][col] = piece
+        self.hash ^= keys[row][col]
+        piece.location = destination
+
+    def piece_by_id(self, piece_id : int):
+        """
+        Method that returns the piece with an id if it is on the board.
+        Args:
+            piece_id (int) - the id of the piece
+        Returns:
+            Piece | None: the piece, or None if it is not on the board
+        """
+        if 0 <= piece_id < len(self._by_id):
+            piece = self._by_id[piece_id]
+            if piece in self.pieces[piece.color]:
+                return piece
+        return None
+
+    def promote_piece(self, piece) -> None:
+        """
+        Method that makes a piece on the board a king, keeping the piece
+        counts and the hash up to date. Does nothing if the piece is already
+        a king.
+        Args:
+            piece (Piece object) - piece to promote
+        Returns:
+            None
+        """
+        if piece.is_king:
+            return
+        self._set_king(piece, True)
+
+    @property
+    def red_kings(self) -> int:
+        """
+        The number of red kings on the board
+        """
+        return self.kings['R']
+
+    @property
+    def black_kings(self) -> int:
+        """
+        The number of black kings on the board
+        """
+        return self.kings['B']
 
 
     def get_piece(self, location):
@@ -109,23 +517,111 @@ class Board:
         Returns:
             The piece on the square between the two locations, if it exists
         """
-        x1, y1 = start
-        x2, y2 = end
-        if abs(x2 - x1) != 2 or abs(y2 - y1) != 2:
+        mid_pos = self._tables["between"].get((start, end))
+        if mid_pos is None:
             return None  # No piece to remove
 
-        # Determine position of piece between start and end positions
-        mid_x = (x1 + x2) // 2
-        mid_y = (y1 + y2) // 2
-        mid_pos = (mid_x, mid_y)
-
         # Get the piece at the middle position
-        return self.get_piece(mid_pos)
+        return self.grid[mid_pos[0]][mid_pos[1]]
 
     def get_all_pieces(self, color : str):
         #print(f"all pieces for {color} are: {self.pieces[color]}")
         return self.pieces[color]
 
+    def make_move(self, location : tuple, destination : tuple) -> tuple:
+        """
+        Method that moves the piece at location to destination, capturing the
+        piece jumped over if any and promoting the piece if it reaches the
+        last row. The move is not checked, and only the board changes: use
+        Game.move to play a move in a game.
+        Args:
+            location (tuple) - location of the piece to move
+            destination (tuple) - where to move it
+        Returns:
+            tuple: what unmake_move needs to take the move back
+        """
+        piece = self.grid[location[0]][location[1]]
+        jumped_piece = self.get_piece_between(location, destination)
+        jumped_index = self._take_piece(jumped_piece) if jumped_piece else None
+        self.move_piece(piece, destination)
+        promoted = False
+        if not piece.is_king and destination[0] == \
+                (self.size - 1 if piece.color == "R" else 0):
+            self._set_king(piece, True)
+            promoted = True
+        return (piece, location, jumped_piece, jumped_index, promoted)
+
+    def unmake_move(self, undo : tuple) -> None:
+        """
+        Method that takes back a move made with make_move.
+        Args:
+            undo (tuple) - the value returned by make_move
+        Returns:
+            None
+        """
+        piece, location, jumped_piece, jumped_index, promoted = undo
+        if promoted:
+            self._set_king(piece, False)
+        self.move_piece(piece, location)
+        if jumped_piece:
+            self.pieces[jumped_piece.color].restore(jumped_piece, jumped_index)
+            self._place_piece(jumped_piece)
+
+    def to_text(self) -> str:
+        """
+        Method that describes the pieces on the board as text: one row per
+        line separated by "/", with "." for an empty square, "b" and "r" for
+        black and red men, and "B" and "R" for black and red kings.
+        Returns:
+            str: the text form of the board
+        """
+        rows = []
+        for row in self.grid:
+            rows.append("".join("." if piece is None else
+                                piece.color if piece.is_king else
+                                piece.color.lower() for piece in row))
+        return "/".join(rows)
+
+    @classmethod
+    def from_text(cls, text : str) -> "Board":
+        """
+        Method that builds a board from its text form (see to_text).
+        Args:
+            text (str) - the text form of the board
+        Raises:
+            ValueError: if the text does not describe a square board
+        Returns:
+            Board: the board
+        """
+        board = cls(len(text.strip().split("/")))
+        board.load_text(text)
+        return board
+
+    def load_text(self, text : str) -> None:
+        """
+        Method that replaces the pieces on the board with those of a board
+        of the same size in text form (see to_text).
+        Args:
+            text (str) - the text form of the board
+        Raises:
+            ValueError: if the text does not describe a board of this size
+        Returns:
+            None
+        """
+        rows = text.strip().split("/")
+        if len(rows) != self.size or any(len(row) != self.size for row in rows):
+            raise ValueError(f"Board text must have {self.size} rows of "
+                             f"{self.size} squares")
+        self.empty_board()
+        for row, squares in enumerate(rows):
+            for col, square in enumerate(squares):
+                if square == ".":
+                    continue
+                if square.upper() not in ("B", "R"):
+                    raise ValueError(f"Unknown square {square!r} in board text")
+                self.add_piece(Piece(square.upper(), (row, col),
+                                     is_king=square.isupper()))
+
     def empty_board(self) -> None:
         """
         Method that removes all of the pieces on a board.
@@ -133,17 +629,85 @@ class Board:
         for piece in self.pieces["B"]:
             row, col = piece.location
             self.grid[row][col] = None
+            piece._index = None
 
         for piece in self.pieces["R"]:
             row, col = piece.location
             self.grid[row][col] = None
-        self.pieces["B"] = []
-        self.pieces["R"] = []
+            piece._index = None
+        self.pieces["B"] = PieceList()
+        self.pieces["R"] = PieceList()
+        self._by_id = []
+        self.hash = 0
+        self.men = {'B': 0, 'R': 0}
+        self.kings = {'B': 0, 'R': 0}
+        self.material = 0
+
+    def __deepcopy__(self, memo):
+        """
+        Copies the board and its pieces. The lookup tables are shared by all
+        boards of a size and are not copied.
+        """
+        memo[id(self._zobrist)] = self._zobrist
+        memo[id(self._tables)] = self._tables
+        board = Board.__new__(Board)
+        memo[id(self)] = board
+        for name, value in self.__dict__.items():
+            setattr(board, name, deepcopy(value, memo))
+        return board
+
+    def _place_piece(self, piece) -> None:
+        """
+        Private method that puts a piece already in the piece lists on its
+        square, updating the hash and counts.
+        """
+        row, col = piece.location
+        self.grid[row][col] = piece
+        self.hash ^= self._zobrist[(piece.color, piece.is_king)][row][col]
+        self._count_piece(piece, 1)
+
+    def _take_piece(self, piece) -> int:
+        """
+        Private method that takes a piece off the board, returning the slot
+        it had in its piece list.
+        """
+        index = self.pieces[piece.color].remove(piece)
+        row, col = piece.location
+        self.grid[row][col] = None
+        self.hash ^= self._zobrist[(piece.color, piece.is_king)][row][col]
+        self._count_piece(piece, -1)
+        return index
+
+    def _set_king(self, piece, is_king : bool) -> None:
+        """
+        Private method that crowns or uncrowns a piece on the board, updating
+        the hash and counts.
+        """
+        row, col = piece.location
+        self._count_piece(piece, -1)
+        self.hash ^= self._zobrist[(piece.color, piece.is_king)][row][col]
+        piece.is_king = is_king
+        self.hash ^= self._zobrist[(piece.color, piece.is_king)][row][col]
+        self._count_piece(piece, 1)
+
+    def _count_piece(self, piece, n : int) -> None:
+        """
+        Private method that adds n pieces like piece to the piece counts and
+        the material balance.
+        """
+        if piece.is_king:
+            self.kings[piece.color] += n
+            value = KING_VALUE * n
+        else:
+            self.men[piece.color] += n
+            value = MAN_VALUE * n
+        if piece.color == "B":
+            self.material += value
+        else:
+            self.material -= value
 
     def _evaluate(self):
-        black_left = len(self.pieces["B"])
-        red_left = len(self.pieces["R"])
-        return black_left - red_left + (self.black_kings * 0.5 - self.red_kings * 0.5)
+        return self.material
 
 
     def _reverse_move(self, move, original_loc, game, jumped_piece = None):
@@ -153,32 +717,25 @@ class Board:
         #jumps --> pieces jumped during the move that we need to add back
 
 
-        start_row, start_col = move
-        end_row, end_col = original_loc
-
         #get the piece that moved
         piece_moved = self.get_piece(move)
 
-        #if the piece became a king, unking it
-
+        #lift the moved piece off the square it moved to, and if the piece
+        #became a king, unking it
 
         if piece_moved.became_king:
-            piece_moved.is_king = False
+            self._set_king(piece_moved, False)
             piece_moved.became_king = False
 
 
-        #return the moved piece back to its original location and empty out the
-        #square it moved to
+        #return the moved piece back to its original location
 
-        self.grid[end_row][end_col] = piece_moved
-        self.pieces[piece_moved.color].remove(piece_moved)
-        self.grid[start_row][start_col] = None
+        self.move_piece(piece_moved, original_loc)
 
 
         #if pieces were jumped, return them to the board
         if jumped_piece:
-            row, col = jumped_piece.location
-            self.grid[row][col] = jumped_piece
+            self.add_piece(jumped_piece)
             #if game.jump_bool:
                 #game.jump_bool = False
 
@@ -203,6 +760,10 @@ class Piece:
         self.location = location
         self.is_king = is_king
         self.became_king = False
+        # int | None: the id the piece gets when it is first added to a board
+        self.id = None
+        # int | None: the piece's slot in its board's PieceList
+        self._index = None
 
     def make_king(self):
         """
@@ -214,25 +775,47 @@ class Piece:
 class Game:
     "Class to represent the game being played"
 
-    def __init__(self, board : Board, end_game = False):
+    def __init__(self, board : Board, end_game = False, quiet_move_limit = 80,
+                 repetition_limit = 3, seed = None):
         """
         Constructor
         Args:
             board (Board): the board containing the current game
             current_player (str): the player whose turn it is
             end_game (bool): whether the game is over or not
+            quiet_move_limit (int | None, optional): number of consecutive
+            moves without a capture or a man moving after which the game is
+            drawn. None disables the rule. Defaults to 80 (40 per player).
+            repetition_limit (int | None, optional): number of times the same
+            position may occur before the game is drawn. None disables the
+            rule. Defaults to 3.
+            seed (optional): seed of the game's random number generator,
+            which bots without a seed of their own draw from (see make_rng).
+            Defaults to None.
         Raises:
             ValueError: if the current player name does not exist
         """
         self.draw_offered = False
+        self.draw_reason = None
+        self.quiet_move_limit = quiet_move_limit
+        self.repetition_limit = repetition_limit
+        self.quiet_moves = 0
+        # list[int]: position keys at the start of every turn
+        self.position_history = []
+        self._position_counts = {}
         self.board = board
         self.current_player = "B" #Player with black pieces plays first
         self.jump_bool = False
         self.end_game = end_game
         self.winner = None
+        # random.Random: the game's random number generator
+        self.rng = make_rng(seed)
         self.players = {1: "R",
                         2: "B"}
         self.score = [0,0]
+        # int: the number of rematches played, so that bots can tell a new
+        # game from the current one
+        self.game_number = 0
 
         self._alternate_colors()
     #
@@ -279,9 +862,7 @@ class Game:
         if not self.draw_offered:
             return
         if accept:
-            self.end_game = True
-            self.board.terminal_board = True
-            self.winner = None
+            self._declare_draw("agreement")
         else:
             self.draw_offered = False
 
@@ -289,7 +870,9 @@ class Game:
         """
         Public method for moving pieces on the board. This method checks for
         the validity of the move, whether the piece being moved is already a
-        king, and whether the piece being moved should become a king.
+        king, and whether the piece being moved should become a king. After
+        the move the game ends if a player has won, or as a draw if the
+        repetition or quiet move limit has been reached.
         Args:
             piece (piece object): piece to move
             destination (tuple): tuple containing the coordinates of where the
@@ -305,37 +888,56 @@ class Game:
         if destination not in self.piece_all_moves(self.board, piece):
             raise ValueError(f"Invalid move, cannot move {piece.location} to {destination}")
 
-        # Update the is_king attribute if the piece becomes a king
-
         if self.is_valid_move(piece,destination) is False:
             raise ValueError("Inputed move is not valid")
         if self._jumps_available_tf == True and len(self._piece_moves_jumps(self.board, piece)[0] == 0):
             raise ValueError("Move a piece that has jumps available")
         if not self.is_valid_move(piece, destination):
             raise ValueError("Invalid move")
-        if not piece.is_king:
-            if (piece.color == 'R' and destination[0] == self.board.size - 1) or \
-                    (piece.color == 'B' and destination[0] == 0):
-                piece.make_king()
-                if piece.color == "R":
-                    self.board.red_kings += 1
-                else:
-                    self.board.black_kings += 1
+        self.apply_move_unchecked(piece, destination)
+
+    def apply_move_unchecked(self, piece, destination : tuple) -> None:
+        """
+        Applies a move without checking that it is legal, for callers such as
+        bots that took the move from player_all_moves or piece_all_moves.
+        Promotion, turn switching and the end of game and draw checks are
+        handled exactly as in move.
+        Args:
+            piece (piece object): piece to move
+            destination (tuple): tuple containing the coordinates of where the
+            piece moves to
+        Returns:
+            None
+        """
+        if not self.position_history:
+            self._record_position()
+        man_moved = not piece.is_king
 
         # Move the piece to the new location
-        self.board.remove_piece(piece)
         jumped_piece = self.board.get_piece_between(piece.location, destination)
         if jumped_piece:
             self.board.remove_piece(jumped_piece)
-        piece.location = destination
-        self.board.add_piece(piece)
-        piece.location = destination
+        self.board.move_piece(piece, destination)
+
+        # Update the is_king attribute if the piece becomes a king
+        if (piece.color == 'R' and destination[0] == self.board.size - 1) or \
+                (piece.color == 'B' and destination[0] == 0):
+            self.board.promote_piece(piece)
+
+        # Captures and man moves can never be undone, so no earlier position
+        # can repeat after one
+        if jumped_piece or man_moved:
+            self.quiet_moves = 0
+            self._position_counts = {}
+        else:
+            self.quiet_moves += 1
         # swap turns
         # This is the first part of my janky way to implement double jumps
         # Feel free to change it I just want it to be testable for the tui
         # If the conditional is present the game will not switch turns until
         # a second move is made or passed on.
-        if not jumped_piece or len(self.piece_all_jumps(piece)) == 0:
+        turn_over = not jumped_piece or len(self.piece_all_jumps(piece)) == 0
+        if turn_over:
             self._alternate_turns()
         #self._alternate_turns()
         winner = self.winner_loser(self.board)
@@ -347,6 +949,8 @@ class Game:
                 self.score[1] += 1
             self.end_game = True
             self.board.teminal_board = True
+        elif turn_over:
+            self._check_draw_rules()
 
     def is_valid_move(self, piece : Piece, destination : tuple) -> bool:
         """
@@ -446,6 +1050,53 @@ class Game:
             return moves["jumps"]
         return moves["moves"]
 
+    def generate_moves(self, board : Board, color : str, key = None):
+        """
+        Generates the legal moves of a player in stages, so that a caller that
+        stops early never pays for the moves it did not look at. Captures are
+        found and yielded piece by piece first. Only if there are none (jumps
+        being compulsory) are the quiet moves generated, then yielded sorted
+        by key. Unlike player_all_moves, this does not change jump_bool. The
+        board may be changed between two moves as long as it is restored.
+        Args:
+            board (Board): the board containing the current game
+            color (str): the player to generate moves for
+            key (function, optional): sort key of the quiet moves, taking
+            (location, destination). Higher keys come first. Defaults to the
+            board order.
+        Yields:
+            tuple: location, destination and piece of every legal move, as in
+            player_all_moves
+        """
+        grid = board.grid
+        kinds = board._tables["rays"]
+        # callers may add and remove pieces between two yields, which
+        # reorders the piece lists
+        pieces = list(board.pieces[color])
+        captured = False
+        for piece in pieces:
+            row, col = piece.location
+            for next_square, landing in \
+                    kinds["K" if piece.is_king else color][row][col]:
+                next_piece = grid[next_square[0]][next_square[1]]
+                if next_piece is not None and next_piece.color != color and \
+                        landing is not None and \
+                        grid[landing[0]][landing[1]] is None:
+                    captured = True
+                    yield (piece.location, landing, piece)
+        if captured:
+            return
+
+        moves = []
+        for piece in pieces:
+            row, col = piece.location
+            for next_square, _ in kinds["K" if piece.is_king else color][row][col]:
+                if grid[next_square[0]][next_square[1]] is None:
+                    moves.append((piece.location, next_square, piece))
+        if key is not None:
+            moves.sort(key=lambda move: key(move[0], move[1]), reverse=True)
+        yield from moves
+
     def winner_loser(self, board : Board) -> str or None:
         """
         Checks if there is a winner and returns the winning player. If there is
@@ -455,28 +1106,93 @@ class Game:
         Returns:
             str | None: the name of the player who has won
         """
-        all_moves = self.player_all_moves(board, self.current_player)
         if len(board.get_all_pieces("B")) == 0:
             #if all black pieces have been captured, red wins
-            print("all the black pieces have been captured")
             return "R"
         elif len(board.get_all_pieces("R")) == 0:
             #if all red pieces have been captured, black wins
-            print("all the red pieces have been captured")
             return "B"
-        elif not all_moves:
+        elif not self.player_all_moves(board, self.current_player):
             #there are no legal moves for the current player
-            print("there are no legal moves for the current player")
             if self.current_player == "B":
-                print(f"all moves for B are: {all_moves}")
                 return "R"
             else:
-                print(f"all moves for R are: {all_moves}")
                 return "B"
         else:
             #there is no winner
             return None
 
+    def position_key(self) -> int:
+        """
+        Returns a hash of the current position: the pieces on the board and
+        the player to move.
+        Returns:
+            int: the position key
+        """
+        return position_key(self.board, self.current_player)
+
+    def canonical_key(self) -> tuple:
+        """
+        Returns the key of the current position that is shared by all the
+        positions equivalent to it under the board's symmetries.
+        Returns:
+            tuple(int, str): the canonical key, and the symmetry taking the
+            position to its canonical form
+        """
+        return canonical_key(self.board, self.current_player)
+
+    def canonical_position(self) -> str:
+        """
+        Returns the canonical form of the current position as text: the
+        position equivalent to it with the smallest key.
+        Returns:
+            str: the canonical position
+        """
+        return transform_position(self.to_position(), self.canonical_key()[1])
+
+    def to_position(self) -> str:
+        """
+        Returns the current position as text: the player to move, a colon,
+        and the text form of the board, e.g. "B:.r.r/..../..../b.b.".
+        Returns:
+            str: the position
+        """
+        return f"{self.current_player}:{self.board.to_text()}"
+
+    @classmethod
+    def from_position(cls, position : str, **kwargs) -> "Game":
+        """
+        Creates a game, on a new board, starting from a position written by
+        to_position.
+        Args:
+            position (str): the position
+            kwargs: passed on to the Game constructor
+        Raises:
+            ValueError: if the position is not valid
+        Returns:
+            Game: the game
+        """
+        text = position.strip().partition(":")[2]
+        game = cls(Board(len(text.split("/"))), **kwargs)
+        game.set_position(position)
+        return game
+
+    def set_position(self, position : str) -> None:
+        """
+        Sets up a position written by to_position on the game's board, which
+        must be of the same size. The game's history and state are kept.
+        Args:
+            position (str): the position
+        Raises:
+            ValueError: if the position is not valid for this board
+        """
+        player, _, text = position.strip().partition(":")
+        if player not in ("B", "R"):
+            raise ValueError(f"Unknown player to move {player!r} in position")
+        self.board.load_text(text)
+        self.current_player = player
+        self.jump_bool = False
+
     def rematch(self) -> None:
         """
         Method that resets the game's board, winner, and end_game state to for
@@ -487,8 +1203,13 @@ class Game:
         self.end_game = False
         self.board.terminal_board = False
         self.draw_offered = False
+        self.draw_reason = None
+        self.quiet_moves = 0
+        self.position_history = []
+        self._position_counts = {}
         self._alternate_colors()
         self.current_player = "B"
+        self.game_number += 1
 
     #
     # PRIVATE METHODS
@@ -502,6 +1223,42 @@ class Game:
                         self.jump_bool = True
         return self.jump_bool
 
+    def _record_position(self) -> int:
+        """
+        Private method that adds the current position to the position history.
+        Returns:
+            int: how many times the position has now occurred
+        """
+        key = self.position_key()
+        self.position_history.append(key)
+        count = self._position_counts.get(key, 0) + 1
+        self._position_counts[key] = count
+        return count
+
+    def _check_draw_rules(self) -> None:
+        """
+        Private method called at the start of every turn that ends the game as
+        a draw if the position has repeated too often or if too many moves
+        have been made without a capture or a man moving.
+        """
+        count = self._record_position()
+        if self.repetition_limit is not None and count >= self.repetition_limit:
+            self._declare_draw("repetition")
+        elif self.quiet_move_limit is not None and \
+                self.quiet_moves >= self.quiet_move_limit:
+            self._declare_draw("move limit")
+
+    def _declare_draw(self, reason : str) -> None:
+        """
+        Private method that ends the game as a draw.
+        Args:
+            reason (str): why the game was drawn
+        """
+        self.end_game = True
+        self.board.terminal_board = True
+        self.winner = None
+        self.draw_reason = reason
+
     def _alternate_colors(self) -> None:
         """
         Private method that alternates the players' colors between each game.
@@ -538,35 +1295,17 @@ class Game:
         jumps = []
 
         row, col = piece.location
-
-        if piece.is_king:
-            directions = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
-        elif piece.color == 'B':
-            directions = [(-1, 1), (-1, -1)]
-        else:
-            directions = [(1, 1), (1, -1)]
-
-        for direction in directions:
-            d_row, d_col = direction
-            next_row, next_col = row + d_row, col + d_col
-
-            if not (0 <= next_row < board.size and 0 <= next_col < board.size):
-                continue
-
-            next_square = board.grid[next_row][next_col]
-
-            if next_square is None:
-                moves.append((next_row, next_col))
-            elif next_square.color != piece.color:
-                jump_row, jump_col = next_row + d_row, next_col + d_col
-
-                if not (0 <= jump_row < board.size and
-                    0 <= jump_col < board.size):
-                    continue
-
-                jump_square = board.grid[jump_row][jump_col]
-
-                if jump_square is None:
-                    jumps.append((jump_row, jump_col))
+        grid = board.grid
+        rays = board._tables["rays"]["K" if piece.is_king else piece.color]
+
+        # the tables only hold neighbors and landings that are on the board
+        for next_square, landing in rays[row][col]:
+            next_piece = grid[next_square[0]][next_square[1]]
+
+            if next_piece is None:
+                moves.append(next_square)
+            elif next_piece.color != piece.color and landing is not None:
+                if grid[landing[0]][landing[1]] is None:
+                    jumps.append(landing)
 
         return (jumps, moves)
@@ -0,0 +1,474 @@
+# text engine protocol, an adapter bot for engine processes and the
+# reference engine wrapping SmartBot
+#
+# The protocol is line based, in the style of UCI. The front-end sends:
+#     cep                         start the session
+#     isready                     ask the engine to answer once it is idle
+#     newgame                     a new game starts, forget the old one
+#     position <position>         set the position, as Game.to_position
+#     go [depth <n>] [movetime <ms>] [multipv <n>]
+#                                 search the position, reporting the best n
+#                                 moves
+#     stop                        finish the search as soon as possible
+#     quit                        exit
+# and the engine answers:
+#     id name <name>              once, after cep
+#     cepok                       after the id lines
+#     readyok                     after isready
+#     info depth <n> [multipv <k>] score <s> nodes <n> time <ms> pv <move> ...
+#                                 after each completed search depth, one
+#                                 line per move reported
+#     bestmove <move> | none      when a search ends
+#     info string <message>       when a command is not valid, which is
+#                                 ignored
+# Moves are written like "6,2-5,1": the 1-based row and column of the piece
+# and of its destination. Scores are from the point of view of the player
+# to move.
+
+import os
+import queue
+import shlex
+import subprocess
+import sys
+import threading
+import time
+
+import click
+
+from checkers import Board, Game
+
+# str: the command that starts a session
+PROTOCOL = "cep"
+
+# str: the name the reference engine gives itself
+ENGINE_NAME = "checkers-project SmartBot"
+
+# tuple[int]: the smallest and largest board sizes the engine plays on
+SIZES = (6, 20)
+
+
+def format_move(location : tuple, destination : tuple) -> str:
+    """
+    Writes a move with 1-based squares, as the protocol expects.
+    Args:
+        location (tuple): the square of the piece that moves
+        destination (tuple): the square it moves to
+    Returns:
+        str: the move
+    """
+    return "-".join(f"{row + 1},{col + 1}" for row, col in (location, destination))
+
+
+def parse_move(text : str) -> tuple:
+    """
+    Reads a move written by format_move.
+    Args:
+        text (str): the move
+    Raises:
+        ValueError: if the text is not a move
+    Returns:
+        tuple(tuple, tuple): the location of the piece and its destination
+    """
+    try:
+        squares = [tuple(int(n) - 1 for n in square.split(","))
+                   for square in text.split("-")]
+    except ValueError:
+        raise ValueError(f"Malformed move {text!r}") from None
+    if len(squares) != 2 or any(len(square) != 2 for square in squares):
+        raise ValueError(f"Malformed move {text!r}")
+    return squares[0], squares[1]
+
+
+def parse_info(line : str) -> dict:
+    """
+    Reads an info line into a dictionary, with the principal variation as a
+    list of (location, destination) moves.
+    Args:
+        line (str): the line, starting with "info"
+    Returns:
+        dict: the values on the line
+    """
+    words = line.split()[1:]
+    info = {}
+    i = 0
+    while i < len(words):
+        name = words[i]
+        if name == "pv":
+            info["pv"] = [parse_move(move) for move in words[i + 1:]]
+            break
+        if name == "string":
+            info["string"] = " ".join(words[i + 1:])
+            break
+        if i + 1 < len(words):
+            value = words[i + 1]
+            info[name] = float(value) if name == "score" else int(value)
+        i += 2
+    return info
+
+
+class ReferenceEngine:
+    """
+    Class representing the engine side of the protocol, running a SmartBot
+    analysis in a background thread so that stop is answered while it
+    searches.
+    """
+
+    def __init__(self, depth = 4, evaluator = None, output = None, hash_mb = 16):
+        """
+        Constructor
+
+        Args:
+            depth (int, optional): depth searched when go gives no depth.
+            Defaults to 4.
+            evaluator (optional): a learned evaluator for the SmartBot.
+            Defaults to None.
+            output (optional): file the answers are written to. Defaults to
+            standard output.
+            hash_mb (float, optional): memory limit of the bot's
+            transposition table, in megabytes. Defaults to 16.
+        """
+        from bots import SmartBot
+
+        self.depth = depth
+        self.output = output or sys.stdout
+        self.game = Game(Board(8))
+        self.hash_mb = hash_mb
+        self.bot = SmartBot(self.game, "B", evaluator=evaluator, tt_mb=hash_mb)
+        self._evaluator = evaluator
+        self._thread = None
+        self._stop_requested = False
+        self._lock = threading.Lock()
+
+    def send(self, line : str) -> None:
+        """
+        Writes one line to the front-end.
+        """
+        with self._lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def handle(self, line : str) -> bool:
+        """
+        Handles one command from the front-end. A command that is not valid
+        is ignored, and the reason is sent as an info string.
+        Args:
+            line (str): the command
+        Returns:
+            bool: False once the engine should exit
+        """
+        try:
+            return self._handle(line.split())
+        except ValueError as err:
+            self.send(f"info string {line.split()[0]} ignored: {err}")
+            return True
+
+    def _handle(self, words : list) -> bool:
+        """
+        Private method that handles one command, split into words.
+        Raises:
+            ValueError: if the command is not valid
+        """
+        if not words:
+            return True
+        command = words[0]
+        if command == PROTOCOL:
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"{PROTOCOL}ok")
+        elif command == "isready":
+            self._wait()
+            self.send("readyok")
+        elif command == "newgame":
+            self._wait()
+            self.game.rematch()
+        elif command == "position":
+            self._wait()
+            self._set_position(" ".join(words[1:]))
+        elif command == "go":
+            self._wait()
+            limits = dict(zip(words[1::2], (int(n) for n in words[2::2])))
+            for name, value in limits.items():
+                if value < 1:
+                    raise ValueError(f"{name} must be at least 1")
+            # a stop that came after the last search ended is stale
+            self._stop_requested = False
+            self.bot._stopped = False
+            self._thread = threading.Thread(target=self._search, args=(
+                limits.get("depth", self.depth), limits.get("movetime"),
+                limits.get("multipv", 1)),
+                daemon=True)
+            self._thread.start()
+        elif command == "stop":
+            self._stop()
+        elif command == "quit":
+            self._stop()
+            return False
+        return True
+
+    def _stop(self) -> None:
+        """
+        Private method that ends the running search, if any.
+        """
+        if self._thread is not None:
+            self._stop_requested = True
+            self.bot.stop()
+            self._wait()
+
+    def _wait(self) -> None:
+        """
+        Private method that waits for the running search, if any, to end.
+        """
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _set_position(self, position : str) -> None:
+        """
+        Private method that sets up a position, building a new game and bot
+        if the board size changes.
+        Raises:
+            ValueError: if the position is not valid, in which case the
+            current one is kept
+        """
+        from bots import SmartBot
+
+        size = position.count("/") + 1
+        if not SIZES[0] <= size <= SIZES[1]:
+            raise ValueError(f"the board size must be between {SIZES[0]} and "
+                             f"{SIZES[1]}, not {size}")
+        if size != self.game.board.size:
+            game = Game(Board(size))
+            game.set_position(position)
+            game.game_number = self.game.game_number
+            self.game = game
+            self.bot = SmartBot(self.game, "B", evaluator=self._evaluator,
+                                tt_mb=self.hash_mb)
+        else:
+            previous = self.game.to_position()
+            try:
+                self.game.set_position(position)
+            except ValueError:
+                self.game.set_position(previous)
+                raise
+        self.bot._color = self.game.current_player
+
+    def _search(self, depth : int, movetime, multipv : int) -> None:
+        """
+        Private method that analyses the position one depth deeper at a time
+        until depth is reached, the time runs out or the search is stopped,
+        answering with the best move of the deepest completed depth.
+        """
+        start = time.monotonic()
+        self.bot.deadline = None if movetime is None else start + movetime / 1000
+        best = None
+        for current, lines in self.bot.analysis(multipv, depth):
+            elapsed = int((time.monotonic() - start) * 1000)
+            for n, line in enumerate(lines, 1):
+                pv = " ".join(format_move(*move) for move in line["pv"])
+                multi = f" multipv {n}" if multipv > 1 else ""
+                self.send(f"info depth {current}{multi} score {line['score']:g} "
+                          f"nodes {self.bot.nodes} time {elapsed} pv {pv}")
+            best = lines[0]["move"] if lines else None
+            if self._stop_requested:
+                break
+        if best is None and self.bot.aborted:
+            # stopped before even the first depth completed, which is
+            # searched in full to have a move to give
+            self.bot.deadline = None
+            self.bot.depth = 1
+            move = self.bot.suggest_move()
+            if move is not None:
+                best = (move[0].location, move[1])
+        self.bot.deadline = None
+        self._stop_requested = False
+        self.send(f"bestmove {'none' if best is None else format_move(*best)}")
+
+    def run(self, lines = None) -> None:
+        """
+        Handles commands until quit or the end of the input.
+        Args:
+            lines (optional): iterable of commands. Defaults to standard input.
+        """
+        for line in (lines or sys.stdin):
+            if not self.handle(line.strip()):
+                break
+        self._stop()
+
+
+class EngineBot:
+    """
+    Class representing a bot whose moves come from an engine process that
+    speaks the protocol, such as the reference engine or another build of
+    it. The process can be pinned to a CPU, and is killed if it does not
+    answer in time.
+    """
+
+    def __init__(self, game : Game, color : str, command = None, depth = None,
+                 movetime = None, timeout = None, cpu = None):
+        """
+        Constructor, starts the engine process.
+
+        Args:
+            game (Game): the current game
+            color (str): color of bot's pieces
+            command (str | list, optional): the command that starts the
+            engine. Defaults to the reference engine.
+            depth (int, optional): depth passed to go. Defaults to None, the
+            engine's own default.
+            movetime (int, optional): milliseconds per move passed to go.
+            Defaults to None.
+            timeout (float, optional): seconds to wait for a move before
+            sending stop, and as long again before killing the engine.
+            Defaults to None, waiting movetime plus a second if it is set and
+            forever if not.
+            cpu (int, optional): CPU to pin the engine process to, where the
+            platform allows it. Defaults to None.
+        Raises:
+            RuntimeError: if the engine does not start the session
+        """
+        self._game = game
+        self._board = game.board
+        self._color = color
+        self.wins = 0
+        self.depth = depth
+        self.movetime = movetime
+        if timeout is None and movetime is not None:
+            timeout = movetime / 1000 + 1
+        self.timeout = timeout
+        if command is None:
+            command = [sys.executable, os.path.abspath(__file__)]
+        elif isinstance(command, str):
+            command = shlex.split(command)
+        self._process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            text=True, bufsize=1)
+        if cpu is not None and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(self._process.pid, {cpu})
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read, daemon=True).start()
+        self._game_number = game.game_number
+        # list[dict]: info lines of the last search
+        self.last_info = []
+
+        self.name = " ".join(command)
+        self._send(PROTOCOL)
+        for line in self._until(f"{PROTOCOL}ok", 10):
+            if line.startswith("id name "):
+                self.name = line[len("id name "):]
+
+    def _read(self) -> None:
+        """
+        Private method run in a thread that queues the engine's lines, with
+        None once it exits.
+        """
+        for line in self._process.stdout:
+            self._lines.put(line.strip())
+        self._lines.put(None)
+
+    def _send(self, line : str) -> None:
+        """
+        Private method that writes one command to the engine.
+        """
+        self._process.stdin.write(line + "\n")
+        self._process.stdin.flush()
+
+    def _until(self, word : str, timeout = None) -> list:
+        """
+        Private method that returns the engine's lines up to and including
+        the first that starts with word.
+        Raises:
+            RuntimeError: if the engine exits or takes longer than timeout
+            seconds
+        """
+        lines = []
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                line = self._lines.get(timeout=wait)
+            except queue.Empty:
+                raise RuntimeError(f"Engine {self.name} did not answer "
+                                   f"within {timeout} s") from None
+            if line is None:
+                raise RuntimeError(f"Engine {self.name} exited")
+            lines.append(line)
+            if line.split(" ", 1)[0] == word:
+                return lines
+
+    def suggest_move(self) -> tuple:
+        """
+        Suggests a move, asking the engine for it. An engine that overruns
+        the timeout is sent stop, and killed if it still does not answer.
+
+        Raises:
+            RuntimeError: if the engine exits, is killed, gives an illegal
+            move or gives none when there are legal moves
+        Returns:
+            tuple(Piece, tuple) | None: a tuple containing the piece that
+            should be moved and where it should be moved in coordinate form,
+            or None if the player has no legal moves
+        """
+        if self._game_number != self._game.game_number:
+            self._game_number = self._game.game_number
+            self._send("newgame")
+        self._send(f"position {self._game.to_position()}")
+        limits = ""
+        if self.depth is not None:
+            limits += f" depth {self.depth}"
+        if self.movetime is not None:
+            limits += f" movetime {self.movetime}"
+        self._send(f"go{limits}")
+        try:
+            lines = self._until("bestmove", self.timeout)
+        except RuntimeError:
+            if self._process.poll() is not None:
+                raise
+            self._send("stop")
+            try:
+                lines = self._until("bestmove", self.timeout)
+            except RuntimeError:
+                self._process.kill()
+                raise
+        self.last_info = [parse_info(line) for line in lines
+                          if line.startswith("info ")]
+        move = lines[-1].split()[1]
+        legal = list(self._game.generate_moves(self._board, self._color))
+        if move == "none":
+            if legal:
+                raise RuntimeError(f"Engine {self.name} gave no move with "
+                                   f"{len(legal)} legal moves")
+            return None
+        location, destination = parse_move(move)
+        for legal_location, legal_destination, piece in legal:
+            if (legal_location, legal_destination) == (location, destination):
+                return piece, destination
+        raise RuntimeError(f"Engine {self.name} played an illegal move {move}")
+
+    def close(self) -> None:
+        """
+        Stops the engine process.
+        """
+        if self._process.poll() is None:
+            try:
+                self._send("quit")
+                self._process.wait(1)
+            except (BrokenPipeError, OSError, subprocess.TimeoutExpired):
+                self._process.kill()
+        self._process.stdin.close()
+
+
+@click.command()
+@click.option("--depth", default=4, help="depth searched when go gives none")
+@click.option("--weights", default=None, help="evaluator weights file")
+@click.option("--hash", "hash_mb", default=16.0,
+              help="transposition table size in megabytes")
+def cmd(depth: int, weights: str, hash_mb: float) -> None:
+    evaluator = None
+    if weights:
+        # numpy is only needed for learned evaluators
+        from evaluator import load_evaluator
+        evaluator = load_evaluator(weights)
+    ReferenceEngine(depth, evaluator, hash_mb=hash_mb).run()
+
+
+if __name__ == "__main__":
+    cmd()
@@ -0,0 +1,374 @@
+# learned evaluation functions for the smartbot
+
+import json
+import click
+import numpy as np
+
+from checkers import Board, Game, game_seed
+
+# list[str]: the board features, all from black's point of view
+FEATURES = ["men", "kings", "advancement", "center", "back_rank", "edge",
+            "material_left"]
+
+
+def board_features(board : Board) -> list:
+    """
+    Computes the features of a board. The features do not depend on the size
+    of the board, so a model trained on one size can be used on any other.
+    Args:
+        board (Board): the board to describe
+    Returns:
+        list[float]: the features, in the order of FEATURES
+    """
+    size = board.size
+    last = size - 1
+    advancement = center = back_rank = edge = 0
+    for color, sign in (("B", 1), ("R", -1)):
+        for piece in board.pieces[color]:
+            row, col = piece.location
+            if not piece.is_king:
+                # rows travelled towards the king row, as a fraction
+                advancement += sign * ((last - row) if color == "B" else row) / last
+                if row == (last if color == "B" else 0):
+                    back_rank += sign
+            if 2 * abs(2 * col - last) < size and 2 * abs(2 * row - last) < size:
+                center += sign
+            if col == 0 or col == last:
+                edge += sign
+    men = board.men["B"] - board.men["R"]
+    kings = board.kings["B"] - board.kings["R"]
+    total = sum(board.men.values()) + sum(board.kings.values())
+    # the side ahead gains more from trading down
+    material_left = (men + kings) / total if total else 0.0
+    return [men, kings, advancement, center, back_rank, edge, material_left]
+
+
+def _sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+class LinearEvaluator:
+    """
+    Class representing a linear evaluation over the board features
+    """
+
+    kind = "linear"
+
+    def __init__(self, weights, bias = 0.0):
+        """
+        Constructor
+        Args:
+            weights (array): one weight per feature
+            bias (float, optional): the bias. Defaults to 0.
+        """
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+
+    def predict(self, features) -> np.ndarray:
+        """
+        Predicts black's expected score (1 for a win, 0 for a loss) for a batch
+        of feature rows.
+        """
+        return _sigmoid(np.asarray(features, dtype=np.float64) @ self.weights
+                        + self.bias)
+
+    def evaluate(self, board : Board) -> float:
+        """
+        Evaluates a board from black's point of view, between -1 and 1.
+        """
+        return float(self.evaluate_batch([board])[0])
+
+    def evaluate_batch(self, boards : list) -> np.ndarray:
+        """
+        Evaluates a list of boards at once from black's point of view,
+        between -1 and 1.
+        """
+        features = [board_features(board) for board in boards]
+        return 2 * self.predict(features) - 1
+
+    def arrays(self) -> dict:
+        return {"weights": self.weights, "bias": np.array(self.bias)}
+
+
+class MLPEvaluator(LinearEvaluator):
+    """
+    Class representing a one hidden layer perceptron over the board features
+    """
+
+    kind = "mlp"
+
+    def __init__(self, hidden_weights, hidden_bias, weights, bias = 0.0):
+        """
+        Constructor
+        Args:
+            hidden_weights (array): features x hidden units weights
+            hidden_bias (array): one bias per hidden unit
+            weights (array): one output weight per hidden unit
+            bias (float, optional): the output bias. Defaults to 0.
+        """
+        super().__init__(weights, bias)
+        self.hidden_weights = np.asarray(hidden_weights, dtype=np.float64)
+        self.hidden_bias = np.asarray(hidden_bias, dtype=np.float64)
+
+    def predict(self, features) -> np.ndarray:
+        hidden = np.tanh(np.asarray(features, dtype=np.float64)
+                         @ self.hidden_weights + self.hidden_bias)
+        return _sigmoid(hidden @ self.weights + self.bias)
+
+    def arrays(self) -> dict:
+        return dict(super().arrays(), hidden_weights=self.hidden_weights,
+                    hidden_bias=self.hidden_bias)
+
+
+class WeightedEvaluator:
+    """
+    Class representing a hand-written evaluation: a weighted sum of the board
+    features in material units, as fitted by the tuner module. The default
+    weights give the same scores as Board._evaluate.
+    """
+
+    kind = "weighted"
+
+    # dict[str, float]: the weights matching Board._evaluate
+    DEFAULT_WEIGHTS = {"men": 1.0, "kings": 1.5}
+
+    def __init__(self, weights = None):
+        """
+        Constructor
+        Args:
+            weights (dict[str, float], optional): weight of each feature in
+            FEATURES, missing features weigh 0. Defaults to DEFAULT_WEIGHTS.
+        Raises:
+            ValueError: if a weight is given for an unknown feature
+        """
+        weights = self.DEFAULT_WEIGHTS if weights is None else weights
+        unknown = set(weights) - set(FEATURES)
+        if unknown:
+            raise ValueError(f"Unknown features {sorted(unknown)}")
+        self.weights = {name: float(weights.get(name, 0.0)) for name in FEATURES}
+        self._vector = np.array([self.weights[name] for name in FEATURES])
+
+    def evaluate(self, board : Board) -> float:
+        """
+        Evaluates a board from black's point of view, in material units.
+        """
+        return float(np.dot(board_features(board), self._vector))
+
+    def evaluate_batch(self, boards : list) -> np.ndarray:
+        """
+        Evaluates a list of boards at once from black's point of view, in
+        material units.
+        """
+        features = np.array([board_features(board) for board in boards],
+                            dtype=np.float64).reshape(len(boards), len(FEATURES))
+        return features @ self._vector
+
+
+def save_evaluator(evaluator, path : str) -> None:
+    """
+    Writes an evaluator's weights to a file: a .json file for a
+    WeightedEvaluator, a .npz file for the other models.
+    Args:
+        evaluator (WeightedEvaluator | LinearEvaluator | MLPEvaluator): the
+        evaluator to save
+        path (str): the file to write
+    """
+    if evaluator.kind == "weighted":
+        with open(path, "w") as f:
+            json.dump({"kind": evaluator.kind, "weights": evaluator.weights},
+                      f, indent=2)
+    else:
+        np.savez(path, kind=np.array(evaluator.kind), **evaluator.arrays())
+
+
+def load_evaluator(path : str):
+    """
+    Loads an evaluator from a weights file written by save_evaluator.
+    Args:
+        path (str): the weights file
+    Raises:
+        ValueError: if the file does not hold a known model
+    Returns:
+        WeightedEvaluator | LinearEvaluator | MLPEvaluator: the evaluator
+    """
+    if path.endswith(".json"):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("kind") != "weighted":
+            raise ValueError(f"Unknown evaluator kind {data.get('kind')} in {path}")
+        return WeightedEvaluator(data["weights"])
+    with np.load(path) as data:
+        kind = str(data["kind"])
+        if kind == "linear":
+            return LinearEvaluator(data["weights"], data["bias"])
+        if kind == "mlp":
+            return MLPEvaluator(data["hidden_weights"], data["hidden_bias"],
+                                data["weights"], data["bias"])
+    raise ValueError(f"Unknown evaluator kind {kind} in {path}")
+
+
+def self_play_games(num_games : int, size : int, depth = 2, epsilon = 0.2,
+                    seed = None):
+    """
+    Plays games between two smartbots. Moves are picked at random with
+    probability epsilon, so that the games differ from each other.
+    Args:
+        num_games (int): the number of games to play
+        size (int): the size of the board
+        depth (int, optional): the smartbots' search depth. Defaults to 2.
+        epsilon (float, optional): the probability of a random move.
+        Defaults to 0.2.
+        seed (optional): master seed of the games, see bots.simulate.
+        Defaults to None.
+    Yields:
+        tuple(list[str], float): the positions reached in a game (see
+        Game.to_position) and black's score in it (1 for a win, 0.5 for a
+        draw, 0 for a loss)
+    """
+    from bots import SmartBot
+
+    for i in range(num_games):
+        board = Board(size)
+        game = Game(board, seed=game_seed(seed, i))
+        bots = {"B": SmartBot(game, "B", depth=depth),
+                "R": SmartBot(game, "R", depth=depth)}
+        positions = []
+        while not game.end_game:
+            if game.rng.random() < epsilon:
+                _, move, piece = game.rng.choice(
+                    game.player_all_moves(board, game.current_player))
+            else:
+                piece, move = bots[game.current_player].suggest_move()
+            game.apply_move_unchecked(piece, move)
+            positions.append(game.to_position())
+        if game.winner is None:
+            outcome = 0.5
+        else:
+            outcome = 1.0 if game.winner == "B" else 0.0
+        yield positions, outcome
+
+
+def self_play(num_games : int, size : int, depth = 2, epsilon = 0.2,
+              seed = None) -> tuple:
+    """
+    Plays games between two smartbots (see self_play_games) and labels every
+    position reached with the outcome of its game.
+    Args:
+        num_games (int): the number of games to play
+        size (int): the size of the board
+        depth (int, optional): the smartbots' search depth. Defaults to 2.
+        epsilon (float, optional): the probability of a random move.
+        Defaults to 0.2.
+        seed (optional): master seed of the games. Defaults to None.
+    Returns:
+        tuple(np.ndarray, np.ndarray): the features of every position and
+        black's score in its game
+    """
+    features = []
+    outcomes = []
+    for positions, outcome in self_play_games(num_games, size, depth,
+                                              epsilon, seed):
+        features.extend(board_features(Game.from_position(position).board)
+                        for position in positions)
+        outcomes.extend([outcome] * len(positions))
+    return np.array(features, dtype=np.float64), np.array(outcomes)
+
+
+def train(features, outcomes, model = "linear", hidden = 16, epochs = 200,
+          learning_rate = 0.1, batch_size = 256, seed = 0):
+    """
+    Fits an evaluator to (position, outcome) pairs by minimizing the cross
+    entropy between predicted and actual outcomes with minibatch gradient
+    descent.
+    Args:
+        features (array): one row of board features per position
+        outcomes (array): black's score in the game of each position
+        model (str, optional): "linear" or "mlp". Defaults to "linear".
+        hidden (int, optional): hidden units of the mlp. Defaults to 16.
+        epochs (int, optional): passes over the data. Defaults to 200.
+        learning_rate (float, optional): step size. Defaults to 0.1.
+        batch_size (int, optional): positions per step. Defaults to 256.
+        seed (int, optional): seed of the initial weights and shuffling.
+    Raises:
+        ValueError: if model is not "linear" or "mlp"
+    Returns:
+        LinearEvaluator | MLPEvaluator: the trained evaluator
+    """
+    rng = np.random.default_rng(seed)
+    x = np.asarray(features, dtype=np.float64)
+    y = np.asarray(outcomes, dtype=np.float64)
+    n_features = x.shape[1]
+    if model == "linear":
+        evaluator = LinearEvaluator(np.zeros(n_features))
+    elif model == "mlp":
+        evaluator = MLPEvaluator(rng.normal(0, 1 / np.sqrt(n_features),
+                                            (n_features, hidden)),
+                                 np.zeros(hidden),
+                                 rng.normal(0, 1 / np.sqrt(hidden), hidden))
+    else:
+        raise ValueError(f"Unknown model {model}, expected linear or mlp")
+
+    for _ in range(epochs):
+        order = rng.permutation(len(x))
+        for start in range(0, len(x), batch_size):
+            batch = order[start:start + batch_size]
+            xb, yb = x[batch], y[batch]
+            if model == "linear":
+                error = evaluator.predict(xb) - yb
+                evaluator.weights -= learning_rate * xb.T @ error / len(xb)
+                evaluator.bias -= learning_rate * error.mean()
+            else:
+                hidden_out = np.tanh(xb @ evaluator.hidden_weights
+                                     + evaluator.hidden_bias)
+                error = _sigmoid(hidden_out @ evaluator.weights
+                                 + evaluator.bias) - yb
+                hidden_error = np.outer(error, evaluator.weights) * \
+                    (1 - hidden_out ** 2)
+                evaluator.weights -= learning_rate * hidden_out.T @ error / len(xb)
+                evaluator.bias -= learning_rate * error.mean()
+                evaluator.hidden_weights -= learning_rate * xb.T @ hidden_error / len(xb)
+                evaluator.hidden_bias -= learning_rate * hidden_error.mean(axis=0)
+    return evaluator
+
+
+@click.group()
+def cmd():
+    pass
+
+
+@cmd.command()
+@click.option("--games", default=100, help="number of self-play games")
+@click.option("--size", default=8, help="board size")
+@click.option("--depth", default=2, help="smartbot search depth")
+@click.option("--epsilon", default=0.2, help="probability of a random move")
+@click.option("--out", default="selfplay.npz", help="file to write the data to")
+@click.option("--seed", default=None, help="master seed of the games")
+def selfplay(games, size, depth, epsilon, out, seed):
+    features, outcomes = self_play(games, size, depth, epsilon, seed)
+    np.savez(out, features=features, outcomes=outcomes)
+    print(f"wrote {len(features)} positions to {out}")
+
+
+@cmd.command(name="train")
+@click.option("--data", multiple=True, required=True,
+              help="self-play data file, may be repeated")
+@click.option("--model", type=click.Choice(["linear", "mlp"]), default="linear")
+@click.option("--hidden", default=16, help="hidden units of the mlp")
+@click.option("--epochs", default=200)
+@click.option("--learning_rate", default=0.1)
+@click.option("--out", default="weights.npz", help="file to write the weights to")
+def train_cmd(data, model, hidden, epochs, learning_rate, out):
+    features = []
+    outcomes = []
+    for path in data:
+        with np.load(path) as arrays:
+            features.append(arrays["features"])
+            outcomes.append(arrays["outcomes"])
+    evaluator = train(np.concatenate(features), np.concatenate(outcomes),
+                      model, hidden, epochs, learning_rate)
+    save_evaluator(evaluator, out)
+    print(f"wrote {model} weights to {out}")
+
+
+if __name__ == "__main__":
+    cmd()
@@ -16,7 +16,10 @@ COFFEE = (103, 71, 54)
 YELLOW = (255, 239, 0)
 
 from checkers import Board, Game, Piece
-from bots import RandomBot, SmartBot
+from bots import RandomBot, SmartBot, MCTSBot
+from worker import WorkerBot
+from engine import EngineBot
+from hints import HintEngine
 
 class GUIPlayer:
     """
@@ -24,17 +27,28 @@ class GUIPlayer:
     """
 
     def __init__(self, n: int, player_type: str, board: Board,
-                 color: str, game: Game):
+                 color: str, game: Game, worker: bool = False,
+                 engine: str = None):
         """ Constructor
         Args:
             n: The player's number (1 or 2)
-            player_type: "human", "random-bot", or "smart-bot"
+            player_type: "human", "randombot", "smartbot", "mctsbot" or
+                "enginebot"
             board: The game board
             color: The player's color
             opponent_color: The opponent's color
+            worker: whether a bot runs in its own engine worker process
+            engine: command starting an enginebot's engine process, None
+                for the reference engine
         """
 
-        if player_type == "human":
+        if player_type == "enginebot":
+            self.bot = EngineBot(game, color, engine)
+            self.name = f"{self.bot.name} {n}"
+        elif player_type != "human" and worker:
+            self.name = f"{player_type} {n}"
+            self.bot = WorkerBot(game, color, player_type[:-len("bot")])
+        elif player_type == "human":
             self.name = f"Player {n}"
             self.bot = None
         elif player_type == "smartbot":
@@ -43,6 +57,9 @@ class GUIPlayer:
         elif player_type == "randombot":
             self.name = f'Random Bot {n}'
             self.bot = RandomBot(game, color)
+        elif player_type == "mctsbot":
+            self.name = f'MCTS Bot {n}'
+            self.bot = MCTSBot(game, color)
 
         self.type = player_type
         self.board = board
@@ -51,9 +68,90 @@ class GUIPlayer:
         return
 
 
+# dict[tuple, SpriteAtlas]: sprite atlases by board size and cell size,
+# built on first use
+_ATLASES = {}
+
+
+class SpriteAtlas:
+    """
+    Class holding the sprites of a board size, pre-rendered once on a single
+    surface so that drawing a frame is a handful of blits: the empty board,
+    then a sprite per piece and per highlighted move.
+    """
+
+    # tuple[str]: the sprites, in atlas order
+    SPRITES = ("B", "B king", "R", "R king", "highlight")
+
+    def __init__(self, size: int, cell_height: int, cell_width: int) -> None:
+        """ Constructor
+        Args:
+            size: the number of squares per row of the board
+            cell_height: the height of a square in pixels
+            cell_width: the width of a square in pixels
+        """
+        self.size = size
+        self.cell_height = cell_height
+        self.cell_width = cell_width
+
+        radius = min(cell_height//3, cell_width//3)
+        center = (cell_width//2, cell_height//2)
+        self.surface = pg.Surface((cell_width * len(self.SPRITES), cell_height),
+                                  pg.SRCALPHA)
+        # dict[str, pg.Rect]: the area of each sprite on the atlas surface
+        self.rects = {}
+        for i, name in enumerate(self.SPRITES):
+            rect = pg.Rect(i * cell_width, 0, cell_width, cell_height)
+            sprite = self.surface.subsurface(rect)
+            if name == "highlight":
+                pg.draw.circle(sprite, color=BLUE, center=center, radius=radius, width=3)
+            else:
+                pg.draw.circle(sprite, color=BLACK if name[0] == "B" else RED,
+                               center=center, radius=radius)
+                if name.endswith("king"):
+                    pg.draw.circle(sprite, color=YELLOW, center=center, radius=radius, width=3)
+            self.rects[name] = rect
+
+        # the squares never change, so the empty board is one sprite
+        self.background = pg.Surface((cell_width * size, cell_height * size))
+        self.background.fill(COFFEE)
+        for row in range(size):
+            for col in range(row%2, size, 2):
+                rect = (col * cell_width, row * cell_height, cell_width, cell_height)
+                pg.draw.rect(self.background, color=BISQUE, rect=rect, width=0)
+
+        if pg.display.get_surface() is not None:
+            # match the window's pixel format so that blits need no conversion
+            self.surface = self.surface.convert_alpha()
+            self.background = self.background.convert()
+
+    def blit(self, surface: pg.surface.Surface, name: str, square: tuple) -> None:
+        """
+        Draws a sprite on a square
+        parameters:
+            surface: pygame surface to draw on
+            name: the sprite, one of SPRITES
+            square: the square's (row, col) on the board
+        """
+        surface.blit(self.surface, (square[0] * self.cell_width,
+                                    square[1] * self.cell_height),
+                     self.rects[name])
+
+
+def get_atlas(size: int, cell_height: int, cell_width: int) -> SpriteAtlas:
+    """
+    Returns the sprite atlas of a board size and cell size, building it on
+    first use.
+    """
+    key = (size, cell_height, cell_width)
+    if key not in _ATLASES:
+        _ATLASES[key] = SpriteAtlas(size, cell_height, cell_width)
+    return _ATLASES[key]
+
+
 def draw_board(surface: pg.surface.Surface, board: Board, moves = None) -> None:
     """
-    Draws the current state of the board
+    Draws the current state of the board, scaled to fill the surface
     parameters:
         surface: pygame surface to draw the board on
         board: the board to draw
@@ -66,15 +164,11 @@ def draw_board(surface: pg.surface.Surface, board: Board, moves = None) -> None:
     ncols = board.size
 
     # Compute each cell height and width
-    cell_height = HEIGHT // nrows + 1
-    cell_width = WIDTH // ncols + 1
+    cell_height = surface.get_height() // nrows + 1
+    cell_width = surface.get_width() // ncols + 1
 
-    surface.fill(COFFEE)
-    # add the lighter squares to the board
-    for row in range(nrows):
-        for col in range(row%2, ncols, 2):
-            rect = (col * cell_width, row * cell_height, cell_width, cell_height)
-            pg.draw.rect(surface, color=BISQUE, rect=rect, width=0)
+    atlas = get_atlas(board.size, cell_height, cell_width)
+    surface.blit(atlas.background, (0, 0))
 
     draw_pieces(surface, board, cell_height, cell_width, moves)
 
@@ -82,36 +176,21 @@ def draw_board(surface: pg.surface.Surface, board: Board, moves = None) -> None:
 
 def draw_pieces(surface: pg.surface.Surface, board: Board, cell_height: int, cell_width: int, moves = None) -> None:
 
-    p1pieces = board.pieces['B']
-    p2pieces = board.pieces['R']
-
-    radius = min(cell_height//3, cell_width//3)
-    for p1 in p1pieces:
-        center = (p1.location[0]*cell_width + cell_width//2, p1.location[1]*cell_height + cell_height//2)
-        if p1.is_king:
-            pg.draw.circle(surface, color=BLACK, center = center, radius=radius)
-            pg.draw.circle(surface, color=YELLOW, center = center, radius=radius, width = 3)
-        else:
-            pg.draw.circle(surface, color=BLACK, center = center, radius=radius)
-            
-    for p2 in p2pieces:
-        center = (p2.location[0]*cell_width + cell_width//2, p2.location[1]*cell_height + cell_height//2)
-        if p2.is_king:
-            pg.draw.circle(surface, color=RED, center = center, radius=radius)
-            pg.draw.circle(surface, color=YELLOW, center = center, radius=radius, width = 3)
-        else:
-            pg.draw.circle(surface, color=RED, center = center, radius=radius)
+    atlas = get_atlas(board.size, cell_height, cell_width)
+    for color in ('B', 'R'):
+        for piece in board.pieces[color]:
+            atlas.blit(surface, f"{color} king" if piece.is_king else color,
+                       piece.location)
 
     if moves is not None:
-        for mx, my in moves:
-            center = (mx*cell_width + cell_width//2, my*cell_height + cell_height//2)
-            pg.draw.circle(surface, color=BLUE, center = center, radius=radius, width = 3)
+        for move in moves:
+            atlas.blit(surface, "highlight", move)
 
     return
 
 
 def play_game(game: Game, board: Board, players: dict[GUIPlayer],
-                bot_delay: float = 2) -> None:
+                bot_delay: float = 2, hints: HintEngine = None) -> None:
     """
     Plays the game in a pygame window
 
@@ -120,6 +199,8 @@ def play_game(game: Game, board: Board, players: dict[GUIPlayer],
         board: the board the game is being played on
         players: the players
         bot_delay: artifical time delay, in seconds, before the bot makes a move
+        hints: analyses the position while a human thinks, so that pressing
+            H selects the best move found so far, or None for no hints
     """
 
     pg.init()
@@ -135,6 +216,17 @@ def play_game(game: Game, board: Board, players: dict[GUIPlayer],
         for event in pg.event.get():
             if event.type == pg.QUIT:
                 running = False
+            elif current.bot is None and hints is not None and \
+                    event.type == pg.KEYDOWN and event.key == pg.K_h:
+                hint = hints.hint(game)
+                if hint is None:
+                    print("No hint yet, ask again in a moment")
+                else:
+                    location, destination = hint["move"]
+                    print(f"Hint: {location} to {destination} (score "
+                          f"{hint['score']:g} at depth {hint['depth']})")
+                    selected = board.get_piece(location)
+                    moves = [destination]
             elif current.bot is None and event.type == pg.MOUSEBUTTONDOWN:
                 xx, yy = event.pos
                 x = int(xx//(WIDTH/board.size))
@@ -145,10 +237,24 @@ def play_game(game: Game, board: Board, players: dict[GUIPlayer],
                 else:
                     moves = None
             
-        if current.bot is not None:
-            pg.time.wait(int(bot_delay * 1000))
-            selected, location = current.bot.suggest_move()
-            move(game, selected, location[0], location[1])
+        if hints is not None:
+            # analyse while a human is to move, stopping once they move
+            if current.bot is None and not game.end_game:
+                hints.start(game)
+            else:
+                hints.cancel()
+
+        if current.bot is not None and not game.end_game:
+            if isinstance(current.bot, WorkerBot):
+                # the worker searches while the window keeps refreshing
+                current.bot.request_move()
+                move = current.bot.poll_move(bot_delay)
+                if move is not None:
+                    game.apply_move_unchecked(*move)
+            else:
+                pg.time.wait(int(bot_delay * 1000))
+                selected, location = current.bot.suggest_move()
+                game.apply_move_unchecked(selected, location)
 
         draw_board(surface, board, moves)
         pg.display.update()
@@ -214,17 +320,28 @@ def move(game: Game, selected: Piece, row: int, col: int) -> None:
 
 @click.command()
 #@click.option('--mode', default='real')
-@click.option('--player1', default="human", help="The type of player 1 (human, randombot or smartbot)")
-@click.option('--player2', default="human", help="The type of player 2 (human, randombot or smartbot)")
+@click.option('--player1', default="human", help="The type of player 1 (human, randombot, smartbot, mctsbot or enginebot)")
+@click.option('--player2', default="human", help="The type of player 2 (human, randombot, smartbot, mctsbot or enginebot)")
 @click.option('--size', default=6, help="n x n size of the board")
-def cmd(size, player1, player2):
+@click.option('--worker', is_flag=True, help="run each bot in its own engine worker process")
+@click.option('--engine1', default=None, help="command starting player 1's engine, if not the reference one")
+@click.option('--engine2', default=None, help="command starting player 2's engine, if not the reference one")
+@click.option('--hints', is_flag=True, help="analyse in the background so human players can press H for a hint")
+@click.option('--hint_depth', default=6, help="depth of the hint analysis")
+def cmd(size, player1, player2, worker, engine1, engine2, hints, hint_depth):
     board = Board(size)
-    checkers = Game(board, "R")
-    player1 = GUIPlayer(1, player1, board, "B", checkers)
-    player2 = GUIPlayer(2, player2, board, "R", checkers)
+    checkers = Game(board)
+    player1 = GUIPlayer(1, player1, board, "B", checkers, worker, engine1)
+    player2 = GUIPlayer(2, player2, board, "R", checkers, worker, engine2)
     players = {player1.color: player1, player2.color: player2}
 
-    play_game(checkers, board, players)
+    hint_engine = HintEngine(hint_depth) if hints else None
+    play_game(checkers, board, players, hints=hint_engine)
+    if hint_engine is not None:
+        hint_engine.cancel()
+    for player in players.values():
+        if isinstance(player.bot, (WorkerBot, EngineBot)):
+            player.bot.close()
 
 if __name__ == "__main__":
     cmd()
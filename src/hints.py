@@ -0,0 +1,132 @@
+# move hints for human players, analysed in the background
+
+import threading
+
+from caches import LRUCache
+from checkers import Board, Game
+
+
+class HintEngine:
+    """
+    Class that analyses the position in a background thread while a human
+    thinks, so that the best move found so far is ready the moment a hint is
+    asked for. Analyses run on a private copy of the game with a SmartBot
+    per color, and their results are cached by position key.
+    """
+
+    def __init__(self, depth = 6, evaluator = None, max_entries = 4096,
+                 tt_mb = 16):
+        """
+        Constructor
+
+        Args:
+            depth (int, optional): the deepest depth to analyse. Defaults to 6.
+            evaluator (optional): a learned evaluator for the analysis.
+            Defaults to None.
+            max_entries (int, optional): the most positions to keep hints
+            for, dropping the least recently used. Defaults to 4096.
+            tt_mb (float, optional): memory limit of each analysing bot's
+            transposition table, in megabytes. Defaults to 16.
+        """
+        self.depth = depth
+        self.evaluator = evaluator
+        self.tt_mb = tt_mb
+        # LRUCache: the deepest completed analysis of each position
+        self.cache = LRUCache(max_entries)
+        # guards the cache, which the analysis thread writes to
+        self._lock = threading.Lock()
+        self._game = None
+        self._bots = {}
+        self._key = None
+        self._thread = None
+
+    def start(self, game : Game) -> None:
+        """
+        Starts analysing the current position of a game, cancelling the
+        analysis of any other position. Does nothing if the position is
+        already being analysed or its analysis is complete.
+        Args:
+            game (Game): the game
+        """
+        key = game.position_key()
+        if key == self._key:
+            return
+        self.cancel()
+        self._key = key
+        with self._lock:
+            hint = self.cache.get(key)
+        if hint is not None and hint["depth"] >= self.depth:
+            return
+        self._set_position(game)
+        bot = self._bots[game.current_player]
+        self._thread = threading.Thread(target=self._analyse, args=(bot, key),
+                                        daemon=True)
+        self._thread.start()
+
+    def hint(self, game : Game):
+        """
+        Returns the best move found so far for the current position of a
+        game, without waiting.
+        Args:
+            game (Game): the game
+        Returns:
+            dict | None: the "move" as a (location, destination) pair, its
+            "score" from the point of view of the player to move, the
+            "depth" it was found at and its principal variation "pv", or None
+            if no depth has been completed yet
+        """
+        with self._lock:
+            return self.cache.get(game.position_key())
+
+    def cache_stats(self) -> dict:
+        """
+        Returns the hit rate, fill level and memory use of the hint cache
+        and of the analysing bots' caches (see Cache.stats).
+        """
+        with self._lock:
+            stats = {"hints": self.cache.stats()}
+        for color, bot in self._bots.items():
+            for name, bot_stats in bot.cache_stats().items():
+                stats[f"{name} {color}"] = bot_stats
+        return stats
+
+    def cancel(self) -> None:
+        """
+        Stops the running analysis, if any, keeping what it found.
+        """
+        if self._thread is not None:
+            bot = self._bots[self._game.current_player]
+            bot.stop()
+            self._thread.join()
+            self._thread = None
+            # the analysis may have ended before it saw the stop
+            bot._stopped = False
+        self._key = None
+
+    def _set_position(self, game : Game) -> None:
+        """
+        Private method that copies a game's position into the private game,
+        building it and its bots the first time or if the board size changes.
+        """
+        from bots import SmartBot
+
+        if self._game is None or self._game.board.size != game.board.size:
+            self._game = Game(Board(game.board.size))
+            self._bots = {color: SmartBot(self._game, color,
+                                          evaluator=self.evaluator,
+                                          tt_mb=self.tt_mb)
+                          for color in ("B", "R")}
+        self._game.set_position(game.to_position())
+
+    def _analyse(self, bot, key : int) -> None:
+        """
+        Private method run in the background thread, caching the result of
+        every completed depth.
+        """
+        for depth, lines in bot.analysis(1, self.depth):
+            if not lines:
+                break
+            with self._lock:
+                self.cache.put(key, {"depth": depth, "move": lines[0]["move"],
+                                     "score": lines[0]["score"],
+                                     "pv": lines[0]["pv"]})
@@ -0,0 +1,57 @@
+# benchmark of how long each module takes to import in a fresh interpreter
+
+import os
+import subprocess
+import sys
+import time
+
+import click
+
+# list[str]: the modules to time, from the engine up to the front-ends
+MODULES = ["checkers", "caches", "bots", "worker", "engine", "hints", "perft",
+           "simulate", "tui", "tournament", "evaluator", "tuner", "positiondb",
+           "render", "service", "gui"]
+
+
+def import_time(module : str, repeats = 5) -> float:
+    """
+    Times the import of a module in a fresh interpreter, including the
+    interpreter's own start-up.
+    Args:
+        module (str): the module to import
+        repeats (int, optional): runs to take the fastest of. Defaults to 5.
+    Raises:
+        RuntimeError: if the module cannot be imported
+    Returns:
+        float: the fastest time in seconds
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", f"import {module}"],
+                                cwd=here, capture_output=True, text=True)
+        seconds = time.perf_counter() - start
+        if result.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+@click.command()
+@click.option("--repeats", default=5, help="runs per module, the fastest counts")
+@click.argument("modules", nargs=-1)
+def cmd(repeats, modules):
+    baseline = import_time("sys", repeats)
+    print(f"{'interpreter':>12}: {baseline * 1000:7.1f} ms")
+    for module in modules or MODULES:
+        try:
+            seconds = import_time(module, repeats)
+        except RuntimeError as err:
+            print(f"{module:>12}: {err}")
+            continue
+        print(f"{module:>12}: {(seconds - baseline) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    cmd()
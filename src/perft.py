@@ -0,0 +1,283 @@
+# perft: move generator validation and timing
+
+import time
+import click
+
+from checkers import Board, Game
+
+
+def reference_moves(game : Game, board : Board, color : str) -> list:
+    """
+    Straightforward move generator that recomputes every coordinate and bounds
+    check, kept as the reference the other generators are compared with.
+    Jumps are compulsory: if any piece can jump, only jumps are returned.
+    Args:
+        game (Game): the game the board belongs to (unused)
+        board (Board): the board to generate moves on
+        color (str): the player to move
+    Returns:
+        list[tuple]: (location, destination) of every legal move
+    """
+    moves = []
+    jumps = []
+    for piece in board.pieces[color]:
+        row, col = piece.location
+        if piece.is_king:
+            directions = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+        elif piece.color == 'B':
+            directions = [(-1, 1), (-1, -1)]
+        else:
+            directions = [(1, 1), (1, -1)]
+        for d_row, d_col in directions:
+            next_row, next_col = row + d_row, col + d_col
+            if not (0 <= next_row < board.size and 0 <= next_col < board.size):
+                continue
+            next_square = board.grid[next_row][next_col]
+            if next_square is None:
+                moves.append((piece.location, (next_row, next_col)))
+            elif next_square.color != piece.color:
+                jump_row, jump_col = next_row + d_row, next_col + d_col
+                if 0 <= jump_row < board.size and 0 <= jump_col < board.size \
+                        and board.grid[jump_row][jump_col] is None:
+                    jumps.append((piece.location, (jump_row, jump_col)))
+    return jumps if jumps else moves
+
+
+def game_moves(game : Game, board : Board, color : str) -> list:
+    """
+    Move generator used by the game: Game.player_all_moves.
+    """
+    game.jump_bool = False
+    moves = game.player_all_moves(board, color)
+    game.jump_bool = False
+    return [(location, destination) for location, destination, _ in moves]
+
+
+def staged_moves(game : Game, board : Board, color : str) -> list:
+    """
+    Move generator used by the smartbot search: Game.generate_moves.
+    """
+    return [(location, destination) for location, destination, _
+            in game.generate_moves(board, color)]
+
+
+# dict[str, function]: every available move generator
+GENERATORS = {"reference": reference_moves, "game": game_moves,
+              "staged": staged_moves}
+
+# tuple[str]: the move semantics perft can count with. "hop" counts every
+# jump of a multi-jump as a move, "path" counts a whole capture sequence as
+# one move.
+SEMANTICS = ("hop", "path")
+
+
+def _is_jump(location : tuple, destination : tuple) -> bool:
+    return abs(destination[0] - location[0]) == 2
+
+
+def _other(color : str) -> str:
+    return "R" if color == "B" else "B"
+
+
+def _hop_perft(generate, game, board, color, depth) -> int:
+    if depth == 0:
+        return 1
+    nodes = 0
+    for location, destination in generate(game, board, color):
+        undo = board.make_move(location, destination)
+        next_color = _other(color)
+        # as in Game.move, the turn only passes once the piece that jumped
+        # has no jumps left
+        if _is_jump(location, destination) and \
+                game._piece_moves_jumps(board, undo[0])[0]:
+            next_color = color
+        nodes += _hop_perft(generate, game, board, next_color, depth - 1)
+        board.unmake_move(undo)
+    return nodes
+
+
+def _paths(generate, game, board, color, location, destination) -> list:
+    """
+    Returns every capture sequence starting with a move, as lists of
+    (location, destination) hops.
+    """
+    if not _is_jump(location, destination):
+        return [[(location, destination)]]
+    undo = board.make_move(location, destination)
+    paths = []
+    for start, end in generate(game, board, color):
+        if start == destination and _is_jump(start, end):
+            paths.extend([(location, destination)] + path for path in
+                         _paths(generate, game, board, color, start, end))
+    board.unmake_move(undo)
+    return paths if paths else [[(location, destination)]]
+
+
+def _path_moves(generate, game, board, color) -> list:
+    paths = []
+    for location, destination in generate(game, board, color):
+        paths.extend(_paths(generate, game, board, color, location, destination))
+    return paths
+
+
+def _path_perft(generate, game, board, color, depth) -> int:
+    if depth == 0:
+        return 1
+    nodes = 0
+    for path in _path_moves(generate, game, board, color):
+        undos = [board.make_move(location, destination)
+                 for location, destination in path]
+        nodes += _path_perft(generate, game, board, _other(color), depth - 1)
+        for undo in reversed(undos):
+            board.unmake_move(undo)
+    return nodes
+
+
+def divide(game : Game, depth : int, generator = "game", semantics = "hop") -> dict:
+    """
+    Counts the leaf nodes below each move from the game's current position.
+    The game's board is left as it was.
+    Args:
+        game (Game): the game whose current position to start from
+        depth (int): the number of moves to look ahead, at least 1
+        generator (str, optional): a name from GENERATORS. Defaults to "game".
+        semantics (str, optional): "hop" or "path". Defaults to "hop".
+    Raises:
+        ValueError: if the generator or semantics is unknown, or depth < 1
+    Returns:
+        dict[str, int]: leaf count per root move, written as moves are in
+        the TUI (1-based "row,col" squares joined by "-")
+    """
+    if generator not in GENERATORS:
+        raise ValueError(f"Unknown generator {generator}")
+    if semantics not in SEMANTICS:
+        raise ValueError(f"Unknown semantics {semantics}")
+    if depth < 1:
+        raise ValueError("divide needs a depth of at least 1")
+    generate = GENERATORS[generator]
+    board = game.board
+    color = game.current_player
+    jump_bool = game.jump_bool
+    counts = {}
+    if semantics == "hop":
+        roots = [[move] for move in generate(game, board, color)]
+    else:
+        roots = _path_moves(generate, game, board, color)
+    for path in roots:
+        undos = [board.make_move(location, destination)
+                 for location, destination in path]
+        if semantics == "hop":
+            location, destination = path[0]
+            next_color = _other(color)
+            if _is_jump(location, destination) and \
+                    game._piece_moves_jumps(board, undos[0][0])[0]:
+                next_color = color
+            nodes = _hop_perft(generate, game, board, next_color, depth - 1)
+        else:
+            nodes = _path_perft(generate, game, board, _other(color), depth - 1)
+        for undo in reversed(undos):
+            board.unmake_move(undo)
+        counts[move_name(path)] = nodes
+    game.jump_bool = jump_bool
+    return counts
+
+
+def perft(game : Game, depth : int, generator = "game", semantics = "hop") -> int:
+    """
+    Counts the leaf nodes depth moves ahead of the game's current position.
+    Args:
+        game (Game): the game whose current position to start from
+        depth (int): the number of moves to look ahead
+        generator (str, optional): a name from GENERATORS. Defaults to "game".
+        semantics (str, optional): "hop" or "path". Defaults to "hop".
+    Returns:
+        int: the number of leaf nodes
+    """
+    if depth == 0:
+        return 1
+    return sum(divide(game, depth, generator, semantics).values())
+
+
+def move_name(path : list) -> str:
+    """
+    Writes a move, or a capture sequence, with 1-based squares.
+    """
+    squares = [path[0][0]] + [destination for _, destination in path]
+    return "-".join(f"{row + 1},{col + 1}" for row, col in squares)
+
+
+def compare(game : Game, depth : int, semantics = "hop", generators = None) -> dict:
+    """
+    Runs divide with several generators from the same position, timing each.
+    Args:
+        game (Game): the game whose current position to start from
+        depth (int): the number of moves to look ahead, at least 1
+        semantics (str, optional): "hop" or "path". Defaults to "hop".
+        generators (list[str], optional): generators to run. Defaults to
+        all of GENERATORS.
+    Returns:
+        dict: per generator, the divide counts, the total, the time taken and
+        nodes per second, and under "mismatches" the root moves whose counts
+        differ between generators
+    """
+    generators = list(GENERATORS) if generators is None else generators
+    results = {}
+    for name in generators:
+        start = time.perf_counter()
+        counts = divide(game, depth, name, semantics)
+        seconds = time.perf_counter() - start
+        nodes = sum(counts.values())
+        results[name] = {"divide": counts, "nodes": nodes, "seconds": seconds,
+                         "nps": nodes / seconds if seconds else 0.0}
+    moves = set()
+    for result in results.values():
+        moves.update(result["divide"])
+    mismatches = {}
+    for move in sorted(moves):
+        counts = {name: result["divide"].get(move) for name, result in results.items()}
+        if len(set(counts.values())) > 1:
+            mismatches[move] = counts
+    return {"generators": results, "mismatches": mismatches}
+
+
+@click.command()
+@click.option("--depth", default=4, help="number of moves to look ahead")
+@click.option("--size", multiple=True, type=int,
+              help="board size, may be repeated. Defaults to 8")
+@click.option("--all_sizes", is_flag=True, help="run on every size from 6 to 20")
+@click.option("--position", default=None,
+              help="position to start from, as written by Game.to_position")
+@click.option("--semantics", type=click.Choice(["hop", "path", "both"]),
+              default="both")
+@click.option("--generator", "generators", multiple=True,
+              type=click.Choice(list(GENERATORS)),
+              help="generator to run, may be repeated. Defaults to all")
+@click.option("--divide", "show_divide", is_flag=True,
+              help="print the count below every root move")
+def cmd(depth, size, all_sizes, position, semantics, generators, show_divide):
+    if position:
+        games = [Game.from_position(position)]
+    else:
+        sizes = range(6, 21) if all_sizes else (size or (8,))
+        games = [Game(Board(n)) for n in sizes]
+    all_semantics = SEMANTICS if semantics == "both" else (semantics,)
+    failed = False
+    for game in games:
+        for semantic in all_semantics:
+            result = compare(game, depth, semantic, list(generators) or None)
+            print(f"size {game.board.size}, {semantic} semantics, depth {depth}")
+            for name, stats in result["generators"].items():
+                print(f"  {name:>10}: {stats['nodes']:>12} nodes "
+                      f"{stats['seconds']:8.3f} s {stats['nps']:12.0f} nodes/s")
+                if show_divide:
+                    for move, count in stats["divide"].items():
+                        print(f"      {move}: {count}")
+            for move, counts in result["mismatches"].items():
+                failed = True
+                print(f"  MISMATCH {move}: {counts}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    cmd()
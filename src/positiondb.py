@@ -0,0 +1,396 @@
+# SQLite store of positions from recorded games, with the results of the
+# games they occurred in, indexed by position key and material signature
+
+import sqlite3
+
+import click
+
+from checkers import Board, make_rng, position_key
+
+# int: rows written per transaction when ingesting
+BATCH_SIZE = 50000
+
+# tuple[str]: the columns of a position row
+COLUMNS = ("key", "position", "size", "black_men", "black_kings", "red_men",
+           "red_kings", "games", "black_wins", "draws", "red_wins")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    key INTEGER PRIMARY KEY,
+    position TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    black_men INTEGER NOT NULL,
+    black_kings INTEGER NOT NULL,
+    red_men INTEGER NOT NULL,
+    red_kings INTEGER NOT NULL,
+    games INTEGER NOT NULL,
+    black_wins INTEGER NOT NULL,
+    draws INTEGER NOT NULL,
+    red_wins INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS positions_signature
+    ON positions (size, black_men, black_kings, red_men, red_kings);
+"""
+
+# counts of a position already stored are added to, keeping its text
+_UPSERT = f"""
+INSERT INTO positions ({", ".join(COLUMNS)})
+VALUES ({", ".join("?" * len(COLUMNS))})
+ON CONFLICT (key) DO UPDATE SET
+    games = games + excluded.games,
+    black_wins = black_wins + excluded.black_wins,
+    draws = draws + excluded.draws,
+    red_wins = red_wins + excluded.red_wins
+"""
+
+
+def signed_key(key : int) -> int:
+    """
+    Turns a 64-bit position key into the signed integer SQLite stores.
+    Args:
+        key (int): the position key
+    Returns:
+        int: the key as a signed 64-bit integer
+    """
+    return key - 2 ** 64 if key >= 2 ** 63 else key
+
+
+def parse_signature(text : str) -> tuple:
+    """
+    Reads a material signature such as "12,0,11,1": the number of black
+    men, black kings, red men and red kings.
+    Args:
+        text (str): the signature
+    Raises:
+        ValueError: if the signature is not four counts
+    Returns:
+        tuple[int]: the signature
+    """
+    counts = tuple(int(count) for count in text.split(","))
+    if len(counts) != 4 or min(counts) < 0:
+        raise ValueError(f"A signature is four counts, not {text!r}")
+    return counts
+
+
+def board_signature(board : Board) -> tuple:
+    """
+    Returns the material signature of a board: the number of black men,
+    black kings, red men and red kings.
+    """
+    return (board.men["B"], board.kings["B"], board.men["R"], board.kings["R"])
+
+
+def read_positions(path : str):
+    """
+    Streams a labelled positions file, as written by tuner.py record: one
+    position per line (see Game.to_position) followed by black's score in
+    its game (1 for a win, 0.5 for a draw, 0 for a loss).
+    Args:
+        path (str): the labelled positions file
+    Yields:
+        tuple(str, float): each position and black's score
+    """
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                position, outcome = line.split()
+                yield position, float(outcome)
+
+
+class PositionDB:
+    """
+    Class representing a database of positions from recorded games. Each
+    position is stored once under its position key (see
+    checkers.position_key), with how many times it occurred and how those
+    games ended, and can be found by key or by material signature.
+    Two positions with the same 64-bit key share a row.
+    Examples:
+    1) Storing self-play games:
+        db = PositionDB("positions.db")
+        db.add_games(self_play_games(100, 8))
+    2) Looking a position up:
+        row = db.find(game.to_position())
+    3) Positions with 8 black men against 7 red men and a red king:
+        rows = db.by_signature((8, 0, 7, 1))
+    """
+
+    def __init__(self, path : str, batch_size = BATCH_SIZE):
+        """
+        Constructor
+
+        Args:
+            path (str): the database file, created if missing
+            batch_size (int, optional): positions written per transaction
+            when ingesting. Defaults to BATCH_SIZE.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self._conn = sqlite3.connect(path)
+        self._conn.row_factory = sqlite3.Row
+        # bulk inserts are much faster with a write-ahead log, which stays
+        # safe against a crash of the process
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # dict[int, Board]: a board per size to read positions onto
+        self._boards = {}
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
+
+    def __enter__(self) -> "PositionDB":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the database.
+        """
+        self._conn.close()
+
+    def add_positions(self, labelled) -> int:
+        """
+        Stores positions with the results of their games. Positions are
+        counted up in memory and written in transactions of batch_size
+        positions, so a position repeated within a batch is only read once
+        and costs one write.
+        Args:
+            labelled (iterable[tuple(str, float)]): positions (see
+            Game.to_position) with black's score in their game
+        Raises:
+            ValueError: if a position is not valid
+        Returns:
+            int: the number of positions read
+        """
+        count = 0
+        batch = {}
+        for position, outcome in labelled:
+            row = batch.get(position)
+            if row is None:
+                row = batch[position] = self._read(position)[1]
+            row[7] += 1
+            row[8 if outcome == 1 else 9 if outcome == 0.5 else 10] += 1
+            count += 1
+            if count % self.batch_size == 0:
+                self._write(batch)
+                batch = {}
+        self._write(batch)
+        return count
+
+    def add_games(self, games) -> int:
+        """
+        Stores the positions of games with their results. A position
+        reached more than once in a game is only counted once.
+        Args:
+            games (iterable[tuple(list[str], float)]): the positions of each
+            game and black's score in it, as yielded by
+            evaluator.self_play_games
+        Returns:
+            int: the number of positions stored
+        """
+        return self.add_positions((position, outcome)
+                                  for positions, outcome in games
+                                  for position in dict.fromkeys(positions))
+
+    def ingest(self, path : str) -> int:
+        """
+        Stores the positions of a labelled positions file (see
+        read_positions).
+        Args:
+            path (str): the file
+        Returns:
+            int: the number of positions read
+        """
+        return self.add_positions(read_positions(path))
+
+    def get(self, key : int):
+        """
+        Returns the row of a position key.
+        Args:
+            key (int): the position key
+        Returns:
+            dict | None: the position's columns (see COLUMNS) and black's
+            mean "score", or None if it is not stored
+        """
+        row = self._conn.execute("SELECT * FROM positions WHERE key = ?",
+                                 (signed_key(key),)).fetchone()
+        return None if row is None else self._row(row)
+
+    def find(self, position : str):
+        """
+        Returns the row of a position written by Game.to_position (see get).
+        """
+        key, _ = self._read(position)
+        return self.get(key)
+
+    def by_signature(self, signature : tuple, size = 8, limit = None,
+                     min_games = 1) -> list:
+        """
+        Returns the positions with a material signature, most played first.
+        Args:
+            signature (tuple[int]): the number of black men, black kings,
+            red men and red kings
+            size (int, optional): the board size. Defaults to 8.
+            limit (int, optional): the most positions to return. Defaults to
+            all of them.
+            min_games (int, optional): the fewest games a position must have
+            occurred in. Defaults to 1.
+        Returns:
+            list[dict]: the rows of the positions (see get)
+        """
+        rows = self._conn.execute(
+            "SELECT * FROM positions WHERE size = ? AND black_men = ? AND "
+            "black_kings = ? AND red_men = ? AND red_kings = ? AND games >= ? "
+            "ORDER BY games DESC LIMIT ?",
+            (size, *signature, min_games, -1 if limit is None else limit))
+        return [self._row(row) for row in rows]
+
+    def sample(self, signature : tuple, n : int, size = 8, seed = None) -> list:
+        """
+        Picks positions with a material signature at random, without
+        replacement.
+        Args:
+            signature (tuple[int]): the material signature (see by_signature)
+            n (int): the number of positions, fewer if there are not enough
+            size (int, optional): the board size. Defaults to 8.
+            seed (optional): seed of the choice, see checkers.make_rng.
+            Defaults to None.
+        Returns:
+            list[dict]: the rows of the positions (see get)
+        """
+        # the rows are counted and picked by their place on the signature
+        # index alone, so neither the keys nor the rows not picked are read
+        # into memory
+        where = ("WHERE size = ? AND black_men = ? AND black_kings = ? AND "
+                 "red_men = ? AND red_kings = ?")
+        parameters = (size, *signature)
+        count = self._conn.execute(f"SELECT COUNT(*) FROM positions {where}",
+                                   parameters).fetchone()[0]
+        picked = make_rng(seed).sample(range(count), min(n, count))
+        rows = []
+        for offset in picked:
+            key = self._conn.execute(
+                f"SELECT key FROM positions {where} ORDER BY key "
+                "LIMIT 1 OFFSET ?", (*parameters, offset)).fetchone()[0]
+            rows.append(self._row(self._conn.execute(
+                "SELECT * FROM positions WHERE key = ?", (key,)).fetchone()))
+        return rows
+
+    def signatures(self, size = 8) -> list:
+        """
+        Returns every material signature stored for a board size.
+        Args:
+            size (int, optional): the board size. Defaults to 8.
+        Returns:
+            list[tuple(tuple[int], int, int)]: each signature, the number of
+            positions with it and the games they occurred in, most positions
+            first
+        """
+        rows = self._conn.execute(
+            "SELECT black_men, black_kings, red_men, red_kings, COUNT(*), "
+            "SUM(games) FROM positions WHERE size = ? "
+            "GROUP BY black_men, black_kings, red_men, red_kings "
+            "ORDER BY COUNT(*) DESC", (size,))
+        return [(tuple(row[:4]), row[4], row[5]) for row in rows]
+
+    def _read(self, position : str) -> tuple:
+        """
+        Private method that reads a position onto a board of its size,
+        returning its key and a new row for it with no games.
+        """
+        player, _, text = position.strip().partition(":")
+        if player not in ("B", "R"):
+            raise ValueError(f"Unknown player to move {player!r} in position")
+        size = text.count("/") + 1
+        board = self._boards.get(size)
+        if board is None:
+            board = self._boards[size] = Board(size)
+        board.load_text(text)
+        key = position_key(board, player)
+        return key, [signed_key(key), position.strip(), size,
+                     *board_signature(board), 0, 0, 0, 0]
+
+    def _write(self, batch : dict) -> None:
+        """
+        Private method that writes a batch of rows in one transaction.
+        """
+        if batch:
+            with self._conn:
+                self._conn.executemany(_UPSERT, batch.values())
+
+    @staticmethod
+    def _row(row) -> dict:
+        """
+        Private method that turns a database row into a dict.
+        """
+        row = dict(row)
+        row["key"] %= 2 ** 64
+        row["score"] = (row["black_wins"] + row["draws"] / 2) / row["games"]
+        return row
+
+
+@click.group()
+def cmd():
+    pass
+
+
+@cmd.command()
+@click.argument("files", nargs=-1, required=True)
+@click.option("--db", default="positions.db", help="database file")
+@click.option("--batch_size", default=BATCH_SIZE, help="positions per transaction")
+def ingest(files, db, batch_size):
+    """
+    Stores the positions of labelled positions files (see tuner.py record).
+    """
+    with PositionDB(db, batch_size) as database:
+        for path in files:
+            count = database.ingest(path)
+            print(f"read {count} positions from {path}")
+        print(f"{len(database)} positions in {db}")
+
+
+@cmd.command()
+@click.option("--db", default="positions.db", help="database file")
+@click.option("--position", default=None, help="position to look up")
+@click.option("--signature", default=None,
+              help="material signature such as 12,0,11,1: black men, black "
+                   "kings, red men and red kings")
+@click.option("--size", default=8, help="board size of the signature")
+@click.option("--limit", default=20, help="most positions to list")
+@click.option("--sample", default=None, type=int,
+              help="list this many positions of the signature at random")
+@click.option("--seed", default=None, help="seed of the sample")
+def query(db, position, signature, size, limit, sample, seed):
+    """
+    Looks up a position, lists the positions of a material signature, or
+    without either lists the signatures stored.
+    """
+    with PositionDB(db) as database:
+        if position:
+            rows = [row for row in [database.find(position)] if row]
+        elif signature:
+            try:
+                counts = parse_signature(signature)
+            except ValueError as err:
+                raise click.BadParameter(str(err))
+            if sample is None:
+                rows = database.by_signature(counts, size, limit)
+            else:
+                rows = database.sample(counts, sample, size, seed)
+        else:
+            for counts, positions, games in database.signatures(size):
+                print(f"{','.join(map(str, counts)):>12} {positions:>10} "
+                      f"positions {games:>10} games")
+            return
+        for row in rows:
+            print(f"{row['position']} games {row['games']} "
+                  f"black {row['black_wins']} draws {row['draws']} "
+                  f"red {row['red_wins']} score {row['score']:.3f}")
+        if not rows:
+            print("no positions found")
+
+
+if __name__ == "__main__":
+    cmd()
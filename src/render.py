@@ -0,0 +1,174 @@
+# headless rendering of recorded games to PNG frames, across worker processes
+
+import json
+import os
+from multiprocessing import Pool
+
+import click
+
+# int: the default width and height of a frame in pixels
+FRAME_SIZE = 400
+
+
+def read_games(path : str):
+    """
+    Streams a recorded games file: one JSON object per line, holding the
+    "positions" of a game (see Game.to_position) in the order they were
+    reached and optionally its "id".
+    Args:
+        path (str): the recorded games file
+    Yields:
+        tuple(str, list[str] | None): the id of each game, its line number
+        if it has none, and its positions, or None if the line is not a
+        valid record
+    """
+    with open(path) as f:
+        for number, line in enumerate(f):
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                    yield str(record.get("id", number)), record["positions"]
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    yield str(number), None
+
+
+def check_id(game_id : str) -> str:
+    """
+    Checks that a game id can name a file in the output directory.
+    Args:
+        game_id (str): the id
+    Raises:
+        ValueError: if the id is empty, "." or "..", or holds a path
+        separator
+    Returns:
+        str: the id
+    """
+    if game_id in ("", ".", "..") or any(
+            separator in game_id for separator in ("/", "\\", os.sep, "\0")):
+        raise ValueError(f"Game id {game_id!r} cannot be used as a file name")
+    return game_id
+
+
+def _init_worker() -> None:
+    """
+    Private function that lets pygame run without a display in a worker
+    process, and keeps its greeting out of the output.
+    """
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+
+def render_game(job : tuple) -> tuple:
+    """
+    Renders the positions of a game to PNG files. Runs in the worker
+    processes.
+    Args:
+        job (tuple): the game's id and positions, the output directory, the
+        frame size in pixels and whether to render only the last position
+    Returns:
+        tuple(str, int, str | None): the game's id, the number of frames
+        written and, if the game could not be rendered, why
+    """
+    game_id = job[0]
+    try:
+        return game_id, _render_frames(*job), None
+    except Exception as err:
+        return game_id, 0, f"{type(err).__name__}: {err}"
+
+
+def _render_frames(game_id : str, positions : list, out_dir : str,
+                   frame_size : int, thumbnail : bool) -> int:
+    """
+    Private function that renders the positions of a game (see
+    render_game), returning the number of frames written.
+    """
+    import pygame as pg
+
+    from checkers import Board
+    from gui import draw_board
+
+    check_id(game_id)
+    if positions is None:
+        raise ValueError("The line is not a valid game record")
+    if not positions:
+        raise ValueError("The game has no positions")
+    if thumbnail:
+        positions = positions[-1:]
+        paths = [os.path.join(out_dir, f"{game_id}.png")]
+    else:
+        game_dir = os.path.join(out_dir, game_id)
+        os.makedirs(game_dir, exist_ok=True)
+        paths = [os.path.join(game_dir, f"{i:04d}.png")
+                 for i in range(len(positions))]
+
+    surface = pg.Surface((frame_size, frame_size))
+    board = None
+    for position, path in zip(positions, paths):
+        text = position.strip().partition(":")[2]
+        size = text.count("/") + 1
+        if board is None or board.size != size:
+            board = Board(size)
+        board.load_text(text)
+        draw_board(surface, board)
+        pg.image.save(surface, path)
+    return len(paths)
+
+
+def render_games(paths : list, out_dir : str, frame_size = FRAME_SIZE,
+                 thumbnail = False, processes = None) -> tuple:
+    """
+    Renders every game of recorded games files to PNG frames, one game per
+    job across a pool of processes. The frames of a game go to a directory
+    named after its id, as 0000.png, 0001.png and so on, and a thumbnail
+    to a file named after its id.
+    Args:
+        paths (list[str]): the recorded games files (see read_games)
+        out_dir (str): the directory to write to, created if missing
+        frame_size (int, optional): the width and height of a frame in
+        pixels. Defaults to FRAME_SIZE.
+        thumbnail (bool, optional): render only the last position of each
+        game. Defaults to False.
+        processes (int, optional): the number of worker processes. Defaults
+        to the number of CPUs.
+    Returns:
+        tuple(int, int, list[tuple(str, str)]): the number of games and
+        frames rendered, and the id of every game that could not be
+        rendered with why. Such games are skipped, though some of their
+        frames may have been written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = ((game_id, positions, out_dir, frame_size, thumbnail)
+            for path in paths for game_id, positions in read_games(path))
+    games = frames = 0
+    failed = []
+    with Pool(processes, initializer=_init_worker) as pool:
+        for game_id, count, error in pool.imap_unordered(render_game, jobs,
+                                                         chunksize=4):
+            if error is None:
+                games += 1
+                frames += count
+            else:
+                failed.append((game_id, error))
+    return games, frames, failed
+
+
+@click.command()
+@click.argument("files", nargs=-1, required=True)
+@click.option("--out", default="frames", help="directory to write the frames to")
+@click.option("--frame_size", default=FRAME_SIZE, help="frame width and height in pixels")
+@click.option("--thumbnail", is_flag=True, help="render only the last position of each game")
+@click.option("--processes", default=None, type=int, help="worker processes")
+def cmd(files, out, frame_size, thumbnail, processes):
+    """
+    Renders recorded games to PNG frames without a window.
+    """
+    games, frames, failed = render_games(files, out, frame_size, thumbnail,
+                                         processes)
+    for game_id, error in failed:
+        print(f"skipped game {game_id}: {error}")
+    print(f"rendered {frames} frames of {games} games to {out}"
+          + (f", {len(failed)} games failed" if failed else ""))
+
+
+if __name__ == "__main__":
+    cmd()
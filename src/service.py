@@ -0,0 +1,588 @@
+# position evaluation service: evaluates and searches positions for many
+# clients over a socket, batching and sharing the work
+#
+# Requests and answers are JSON objects, one per line. A client sends:
+#     {"id": <id>, "op": "evaluate", "position": <position>}
+#     {"id": <id>, "op": "search", "position": <position>,
+#      "depth": <n>, "movetime": <ms>}         depth and movetime optional
+#     {"id": <id>, "op": "stats"}
+# and the service answers each request, in the order the answers are ready:
+#     {"id": <id>, "score": <s>}                        after evaluate
+#     {"id": <id>, "move": <move> | null, "score": <s>, "depth": <n>,
+#      "pv": [<move>, ...]}                             after search
+#     {"id": <id>, "stats": {...}}                      after stats
+#     {"id": <id>, "error": <message>}                  if a request fails
+# Positions are written as by Game.to_position and moves as by
+# engine.format_move. Scores are from the point of view of the player to
+# move.
+
+import asyncio
+import json
+import math
+import os
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+
+from caches import LRUCache
+from checkers import Board, Game
+from engine import format_move
+
+# int: the TCP port the service listens on by default
+PORT = 8765
+
+# int: the deepest depth a search with a movetime and no depth goes to
+MAX_TIMED_DEPTH = 64
+
+# int: the deepest depth a search without a movetime may ask for, so that
+# no request ties up a worker for long
+MAX_DEPTH = 10
+
+# tuple[int]: the smallest and largest board sizes served, as in the CLIs
+SIZES = (6, 20)
+
+# the worker process's evaluator, transposition table size and warm search
+# bots by board size
+_EVALUATOR = None
+_TT_MB = 16
+_SEARCHERS = {}
+
+
+class ServiceError(Exception):
+    """
+    Raised by the client when the service answers a request with an error
+    """
+
+
+def _check_position(position) -> int:
+    """
+    Private function that turns away a position that is not text, or whose
+    board size is out of SIZES, before a board is built for it or it reaches
+    a batch, where it would fail the other requests. Returns the board size.
+    """
+    if not isinstance(position, str):
+        raise ValueError(f"A position must be a string, not {position!r}")
+    size = position.count("/") + 1
+    if not SIZES[0] <= size <= SIZES[1]:
+        raise ValueError(f"The board size must be between {SIZES[0]} and "
+                         f"{SIZES[1]}, not {size}")
+    return size
+
+
+def _init_worker(weights, tt_mb : float) -> None:
+    """
+    Private function that loads the evaluator of a worker process.
+    """
+    global _EVALUATOR, _TT_MB
+    _TT_MB = tt_mb
+    if weights:
+        # numpy is only needed for learned evaluators
+        from evaluator import load_evaluator
+        _EVALUATOR = load_evaluator(weights)
+
+
+def evaluate_positions(positions : list) -> list:
+    """
+    Evaluates a batch of positions, with the learned evaluator if the worker
+    has one. Runs in the worker processes.
+    Args:
+        positions (list[str]): the positions
+    Returns:
+        list[tuple(float | None, str | None)]: the score of each position
+        from the point of view of the player to move, or an error message if
+        the position is not valid
+    """
+    boards = []
+    results = []
+    for position in positions:
+        try:
+            _check_position(position)
+            game = Game.from_position(position)
+        except Exception as err:
+            # only this position's request fails, not the whole batch
+            results.append((None, str(err) or repr(err)))
+            continue
+        boards.append((len(results), game.board, game.current_player))
+        results.append(None)
+    if _EVALUATOR is None:
+        scores = [board._evaluate() for _, board, _ in boards]
+    else:
+        scores = _EVALUATOR.evaluate_batch([board for _, board, _ in boards]).tolist()
+    for (i, _, player), score in zip(boards, scores):
+        results[i] = (score if player == "B" else -score, None)
+    return results
+
+
+def search_position(job : tuple) -> dict:
+    """
+    Searches a position one depth deeper at a time with a SmartBot kept warm
+    for its board size. Runs in the worker processes.
+    Args:
+        job (tuple): the position, the depth and the movetime in
+        milliseconds, either of which may be None
+    Raises:
+        ValueError: if the position is not valid
+    Returns:
+        dict: the "move" of the deepest completed depth, its "score", the
+        "depth" and the principal variation "pv", with moves written as by
+        format_move
+    """
+    from bots import SmartBot
+
+    position, depth, movetime = job
+    size = _check_position(position)
+    bot = _SEARCHERS.get(size)
+    if bot is None:
+        bot = SmartBot(Game(Board(size)), "B", evaluator=_EVALUATOR, tt_mb=_TT_MB)
+        bot._game.set_position(position)
+        # kept only once a valid position has been set up on it
+        _SEARCHERS[size] = bot
+    else:
+        bot._game.set_position(position)
+    bot._color = bot._game.current_player
+    bot.deadline = None if movetime is None else time.monotonic() + movetime / 1000
+    result = {"move": None, "score": 0, "depth": 0, "pv": []}
+    try:
+        for current, lines in bot.analysis(1, MAX_TIMED_DEPTH if depth is None
+                                           else depth):
+            if not lines:
+                break
+            result = {"move": format_move(*lines[0]["move"]),
+                      "score": lines[0]["score"], "depth": current,
+                      "pv": [format_move(*move) for move in lines[0]["pv"]]}
+        if result["move"] is None and bot.aborted:
+            # out of time before the first depth, which is searched in full
+            # to have a move to give
+            bot.deadline = None
+            for current, lines in bot.analysis(1, 1):
+                if lines:
+                    result = {"move": format_move(*lines[0]["move"]),
+                              "score": lines[0]["score"], "depth": current,
+                              "pv": [format_move(*lines[0]["move"])]}
+    finally:
+        bot.deadline = None
+    return result
+
+
+class EvaluationService:
+    """
+    Class representing the service. Evaluations arriving within a short
+    window of each other are coalesced into one batch for the evaluator,
+    and a position asked for more than once is evaluated or searched once.
+    Batches are evaluated in a worker process of their own, so that they
+    never wait behind searches, which run in a pool of worker processes.
+    Results are kept in LRU caches. When max_pending requests are waiting, the
+    service stops reading from its clients until some are answered.
+    """
+
+    def __init__(self, weights = None, processes = None, window = 0.002,
+                 max_batch = 256, max_pending = 1024, max_searches = None,
+                 cache_entries = 65536, tt_mb = 16):
+        """
+        Constructor
+
+        Args:
+            weights (str, optional): evaluator weights file. Defaults to the
+            SmartBot's evaluation.
+            processes (int, optional): the number of worker processes: one
+            evaluates the batches and the others search, though there is
+            always at least one searching. Defaults to the number of CPUs.
+            window (float, optional): seconds a batch waits for more
+            evaluations after its first. Defaults to 0.002.
+            max_batch (int, optional): the most positions per batch.
+            Defaults to 256.
+            max_pending (int, optional): the most requests waiting for
+            their answer. Defaults to 1024.
+            max_searches (int, optional): the most searches running at once.
+            Defaults to the number of searching processes.
+            cache_entries (int, optional): the most evaluations and the most
+            searches to keep results for. Defaults to 65536.
+            tt_mb (float, optional): memory limit of each worker's
+            transposition table, in megabytes. Defaults to 16.
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self.window = window
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        searchers = max(self.processes - 1, 1)
+        self.max_searches = max_searches or searchers
+        self._executor = ProcessPoolExecutor(searchers, initializer=_init_worker,
+                                             initargs=(weights, tt_mb))
+        self._batch_executor = ProcessPoolExecutor(1, initializer=_init_worker,
+                                                   initargs=(weights, tt_mb))
+        # LRUCache: scores by position, and search results by position,
+        # depth and movetime
+        self.evaluations = LRUCache(cache_entries)
+        self.searches = LRUCache(cache_entries)
+        self.batches = 0
+        self.batched = 0
+        self.requests = 0
+        # the asyncio objects are made in the service's event loop
+        self._queue = None
+        self._pending = None
+        self._search_slots = None
+        # dict: futures of the evaluations and searches under way
+        self._evaluating = {}
+        self._searching = {}
+
+    async def evaluate(self, position : str) -> float:
+        """
+        Evaluates a position in the next batch, unless it is cached or
+        already being evaluated.
+        Args:
+            position (str): the position
+        Raises:
+            ValueError: if the position is not valid
+        Returns:
+            float: its score from the point of view of the player to move
+        """
+        _check_position(position)
+        score = self.evaluations.get(position)
+        if score is not None:
+            return score
+        future = self._evaluating.get(position)
+        if future is None:
+            future = self._evaluating[position] = \
+                asyncio.get_running_loop().create_future()
+            await self._queue.put(position)
+        return await asyncio.shield(future)
+
+    async def search(self, position : str, depth = None, movetime = None) -> dict:
+        """
+        Searches a position, unless the same search is cached or under way.
+        Args:
+            position (str): the position
+            depth (int, optional): the deepest depth to search, at most
+            MAX_DEPTH without a movetime. Defaults to MAX_TIMED_DEPTH if
+            movetime is given.
+            movetime (float, optional): milliseconds to search for
+        Raises:
+            ValueError: if the position is not valid, neither depth nor
+            movetime is given, or either is not a positive number or the
+            depth is too deep
+        Returns:
+            dict: the result (see search_position)
+        """
+        _check_position(position)
+        if depth is None and movetime is None:
+            raise ValueError("A search needs a depth or a movetime")
+        if depth is not None:
+            if isinstance(depth, bool) or not isinstance(depth, int) or depth < 1:
+                raise ValueError(f"The depth must be a positive integer, not {depth!r}")
+            limit = MAX_DEPTH if movetime is None else MAX_TIMED_DEPTH
+            if depth > limit:
+                raise ValueError(f"The depth must be at most {limit}"
+                                 + (" without a movetime" if movetime is None else ""))
+        if movetime is not None and (isinstance(movetime, bool) or
+                                     not isinstance(movetime, (int, float)) or
+                                     not 0 < movetime < math.inf):
+            raise ValueError(f"The movetime must be a positive number, not {movetime!r}")
+        key = (position, depth, movetime)
+        result = self.searches.get(key)
+        if result is not None:
+            return result
+        future = self._searching.get(key)
+        if future is None:
+            future = self._searching[key] = \
+                asyncio.get_running_loop().create_future()
+            asyncio.get_running_loop().create_task(self._run_search(key, future))
+        return await asyncio.shield(future)
+
+    def stats(self) -> dict:
+        """
+        Returns the number of requests answered, the mean evaluation batch
+        size and the stats of the caches (see Cache.stats).
+        """
+        return {"requests": self.requests, "batches": self.batches,
+                "mean_batch": self.batched / self.batches if self.batches else 0.0,
+                "evaluations": self.evaluations.stats(),
+                "searches": self.searches.stats()}
+
+    async def serve(self, host = "127.0.0.1", port = PORT, path = None) -> None:
+        """
+        Serves clients until cancelled.
+        Args:
+            host (str, optional): the address to listen on. Defaults to
+            127.0.0.1.
+            port (int, optional): the TCP port to listen on. Defaults to PORT.
+            path (str, optional): a Unix socket to listen on instead of TCP
+        """
+        self._queue = asyncio.Queue()
+        self._pending = asyncio.Semaphore(self.max_pending)
+        self._search_slots = asyncio.Semaphore(self.max_searches)
+        batcher = asyncio.create_task(self._batch_loop())
+        if path is None:
+            server = await asyncio.start_server(self._handle_client, host, port)
+        else:
+            server = await asyncio.start_unix_server(self._handle_client, path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self._executor.shutdown(cancel_futures=True)
+            self._batch_executor.shutdown(cancel_futures=True)
+
+    async def _handle_client(self, reader, writer) -> None:
+        """
+        Private method that answers the requests of one client. Once a
+        request is read, the next one is only read when there is room for
+        this one among the pending requests, so a full service pushes back
+        on its clients while idle connections cost nothing.
+        """
+        tasks = set()
+        while True:
+            try:
+                line = await reader.readline()
+            except (ConnectionError, ValueError):
+                # the client went away, or sent a line over the size limit
+                line = b""
+            if not line:
+                break
+            await self._pending.acquire()
+            task = asyncio.create_task(self._answer(line, writer))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+        writer.close()
+
+    async def _answer(self, line : bytes, writer) -> None:
+        """
+        Private method that answers a request and frees its pending slot.
+        """
+        answer = {}
+        try:
+            request = json.loads(line)
+            answer["id"] = request.get("id")
+            op = request.get("op")
+            if op == "evaluate":
+                answer["score"] = await self.evaluate(request["position"])
+            elif op == "search":
+                answer.update(await self.search(request["position"],
+                                                request.get("depth"),
+                                                request.get("movetime")))
+            elif op == "stats":
+                answer["stats"] = self.stats()
+            else:
+                raise ValueError(f"Unknown op {op!r}")
+        except Exception as err:
+            answer["error"] = f"{type(err).__name__}: {err}"
+        finally:
+            self.requests += 1
+            self._pending.release()
+        try:
+            writer.write((json.dumps(answer) + "\n").encode())
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def _batch_loop(self) -> None:
+        """
+        Private method that collects the evaluations queued within a window
+        of the first into a batch, and evaluates it in a worker process.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.batches += 1
+            self.batched += len(batch)
+            try:
+                results = await loop.run_in_executor(self._batch_executor,
+                                                     evaluate_positions, batch)
+            except Exception as err:
+                results = [(None, f"Evaluation failed: {err!r}")] * len(batch)
+            for position, (score, error) in zip(batch, results):
+                future = self._evaluating.pop(position)
+                if error is None:
+                    self.evaluations.put(position, score)
+                    future.set_result(score)
+                else:
+                    future.set_exception(ValueError(error))
+
+    async def _run_search(self, key : tuple, future) -> None:
+        """
+        Private method that runs a search in a worker process once a search
+        slot is free. Timed searches are shared while they run but not
+        cached, since a later one may get further.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            async with self._search_slots:
+                result = await loop.run_in_executor(self._executor,
+                                                    search_position, key)
+        except Exception as err:
+            future.set_exception(err)
+        else:
+            if key[2] is None:
+                self.searches.put(key, result)
+            future.set_result(result)
+        finally:
+            del self._searching[key]
+
+
+class ServiceClient:
+    """
+    Class representing a connection to the service. Requests can be sent
+    one at a time or many at once, in which case they are answered in
+    parallel.
+    Examples:
+    1) Evaluating positions:
+        with ServiceClient() as client:
+            scores = client.evaluate_many(positions)
+    2) Searching a position for half a second:
+        result = client.search(game.to_position(), movetime=500)
+    """
+
+    def __init__(self, host = "127.0.0.1", port = PORT, path = None,
+                 timeout = None, max_inflight = 256):
+        """
+        Constructor, connects to the service.
+
+        Args:
+            host (str, optional): the service's address. Defaults to
+            127.0.0.1.
+            port (int, optional): the service's TCP port. Defaults to PORT.
+            path (str, optional): the service's Unix socket, instead of TCP
+            timeout (float, optional): seconds to wait for an answer.
+            Defaults to waiting forever.
+            max_inflight (int, optional): the most requests sent before
+            reading answers. Defaults to 256.
+        """
+        if path is None:
+            self._socket = socket.create_connection((host, port), timeout)
+        else:
+            self._socket = socket.socket(socket.AF_UNIX)
+            self._socket.settimeout(timeout)
+            self._socket.connect(path)
+        self._file = self._socket.makefile("rwb")
+        self.max_inflight = max_inflight
+        self._next_id = 0
+
+    def __enter__(self) -> "ServiceClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the connection.
+        """
+        self._file.close()
+        self._socket.close()
+
+    def evaluate(self, position : str) -> float:
+        """
+        Evaluates a position.
+        Args:
+            position (str): the position, as written by Game.to_position
+        Raises:
+            ServiceError: if the service could not evaluate it
+        Returns:
+            float: its score from the point of view of the player to move
+        """
+        return self.evaluate_many([position])[0]
+
+    def evaluate_many(self, positions : list) -> list:
+        """
+        Evaluates positions, sending up to max_inflight of them before
+        reading the answers so that the service can batch them.
+        Args:
+            positions (list[str]): the positions
+        Raises:
+            ServiceError: if the service could not evaluate one of them
+        Returns:
+            list[float]: their scores
+        """
+        answers = self._send_many([{"op": "evaluate", "position": position}
+                                   for position in positions])
+        return [answer["score"] for answer in answers]
+
+    def search(self, position : str, depth = None, movetime = None) -> dict:
+        """
+        Searches a position to a depth or for a time.
+        Args:
+            position (str): the position
+            depth (int, optional): the deepest depth to search
+            movetime (int, optional): milliseconds to search for
+        Raises:
+            ServiceError: if the service could not search it
+        Returns:
+            dict: the best "move" (see engine.parse_move) or None, its
+            "score", the "depth" it was found at and the principal variation
+            "pv"
+        """
+        answer = self._send_many([{"op": "search", "position": position,
+                                   "depth": depth, "movetime": movetime}])[0]
+        del answer["id"]
+        return answer
+
+    def stats(self) -> dict:
+        """
+        Returns the service's stats (see EvaluationService.stats).
+        """
+        return self._send_many([{"op": "stats"}])[0]["stats"]
+
+    def _send_many(self, requests : list) -> list:
+        """
+        Private method that sends requests and returns their answers in the
+        same order.
+        """
+        answers = {}
+        ids = []
+        for start in range(0, len(requests), self.max_inflight):
+            for request in requests[start:start + self.max_inflight]:
+                self._next_id += 1
+                ids.append(self._next_id)
+                request["id"] = self._next_id
+                self._file.write((json.dumps(request) + "\n").encode())
+            self._file.flush()
+            while len(answers) < len(ids):
+                line = self._file.readline()
+                if not line:
+                    raise ServiceError("The service closed the connection")
+                answer = json.loads(line)
+                answers[answer["id"]] = answer
+        for request_id in ids:
+            if "error" in answers[request_id]:
+                raise ServiceError(answers[request_id]["error"])
+        return [answers[request_id] for request_id in ids]
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1", help="address to listen on")
+@click.option("--port", default=PORT, help="TCP port to listen on")
+@click.option("--unix", default=None, help="Unix socket to listen on instead of TCP")
+@click.option("--weights", default=None, help="evaluator weights file")
+@click.option("--processes", default=None, type=int, help="worker processes")
+@click.option("--window", default=2.0, help="milliseconds a batch waits for more positions")
+@click.option("--max_batch", default=256, help="most positions per batch")
+@click.option("--max_pending", default=1024, help="most requests waiting for an answer")
+@click.option("--max_searches", default=None, type=int, help="most searches running at once")
+@click.option("--hash", "hash_mb", default=16.0,
+              help="transposition table size of each worker in megabytes")
+def cmd(host, port, unix, weights, processes, window, max_batch, max_pending,
+        max_searches, hash_mb):
+    service = EvaluationService(weights, processes, window / 1000, max_batch,
+                                max_pending, max_searches, tt_mb=hash_mb)
+    print(f"serving on {unix or f'{host}:{port}'}")
+    try:
+        asyncio.run(service.serve(host, port, unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    cmd()
@@ -0,0 +1,218 @@
+# command line entry point for bot-vs-bot simulations
+
+import json
+import os
+import random
+
+import click
+
+from bots import BOT_TYPES, simulate
+from checkers import Board
+
+# int: finished games between two checkpoints
+CHECKPOINT_EVERY = 100
+
+
+def _ranges(indices) -> list:
+    """
+    Private function that writes a set of game indices as [start, end)
+    ranges, which stay short however many games a run has.
+    """
+    ranges = []
+    for index in sorted(indices):
+        if ranges and ranges[-1][1] == index:
+            ranges[-1][1] += 1
+        else:
+            ranges.append([index, index + 1])
+    return ranges
+
+
+class SimulationLog:
+    """
+    Class representing the record of a simulation run, so that it survives
+    the process being killed. Every finished game is appended to a results
+    file as one JSON object per line, with its "id", "seed", "winner",
+    "draw_reason", black's "result" (1 for a win, 0.5 for a draw, 0 for a
+    loss), its number of "plies" and the "positions" reached (see
+    Game.to_position). Every checkpoint_every games, the run's settings,
+    the games completed and the win counts are written to a checkpoint file
+    beside it, from which the run can be resumed.
+    """
+
+    def __init__(self, path : str, config : dict, checkpoint_every = CHECKPOINT_EVERY):
+        """
+        Constructor, starts a new run.
+
+        Args:
+            path (str): the results file
+            config (dict): the run's "player1", "player2", "size", "games",
+            "seed" and "first_game"
+            checkpoint_every (int, optional): finished games between two
+            checkpoints. Defaults to CHECKPOINT_EVERY.
+        Raises:
+            FileExistsError: if the results file exists, which only a resumed
+            run may add to
+        """
+        if os.path.exists(path):
+            raise FileExistsError(f"{path} exists, resume the run or choose "
+                                  "another results file")
+        self.path = path
+        self.checkpoint_path = path + ".checkpoint"
+        self.config = config
+        self.checkpoint_every = checkpoint_every
+        # set[int]: the indices of the games finished
+        self.completed = set()
+        # dict[str, int]: the games won by each color, and drawn
+        self.counts = {"B": 0, "R": 0, "draw": 0}
+        self._file = open(path, "a")
+        self.checkpoint()
+
+    @classmethod
+    def resume(cls, path : str, checkpoint_every = CHECKPOINT_EVERY) -> "SimulationLog":
+        """
+        Reopens the log of a run to continue it. The games finished after
+        the last checkpoint are read back from the results file, and a line
+        cut short when the run was killed is dropped.
+        Args:
+            path (str): the results file
+            checkpoint_every (int, optional): see the constructor
+        Raises:
+            FileNotFoundError: if the run has no checkpoint
+        Returns:
+            SimulationLog: the log, with the run's settings in config
+        """
+        log = cls.__new__(cls)
+        log.path = path
+        log.checkpoint_path = path + ".checkpoint"
+        log.checkpoint_every = checkpoint_every
+        with open(log.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        log.config = checkpoint["config"]
+        log.completed = {index for start, end in checkpoint["completed"]
+                         for index in range(start, end)}
+        log.counts = checkpoint["counts"]
+
+        valid = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                valid += len(line)
+                if record["id"] not in log.completed:
+                    log._count(record)
+        with open(path, "r+b") as f:
+            f.truncate(valid)
+        log._file = open(path, "a")
+        return log
+
+    def record(self, index : int, seed, game, positions : list) -> None:
+        """
+        Appends a finished game to the results file, writing a checkpoint
+        every checkpoint_every games.
+        Args:
+            index (int): the game's index in the run
+            seed: the game's seed
+            game (Game): the finished game
+            positions (list[str]): the positions reached, starting with the
+            first
+        """
+        result = 0.5 if game.winner is None else 1.0 if game.winner == "B" else 0.0
+        record = {"id": index, "seed": seed, "winner": game.winner,
+                  "draw_reason": game.draw_reason, "result": result,
+                  "plies": len(positions) - 1, "positions": positions}
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        self._count(record)
+        if len(self.completed) % self.checkpoint_every == 0:
+            self.checkpoint()
+
+    def checkpoint(self) -> None:
+        """
+        Writes the checkpoint, replacing the last one only once it is
+        complete.
+        """
+        temporary = self.checkpoint_path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump({"config": self.config, "completed": _ranges(self.completed),
+                       "counts": self.counts}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.checkpoint_path)
+
+    def close(self) -> None:
+        """
+        Writes a last checkpoint and closes the results file.
+        """
+        self.checkpoint()
+        self._file.close()
+
+    def _count(self, record : dict) -> None:
+        """
+        Private method that adds a finished game to the completed games and
+        win counts.
+        """
+        self.completed.add(record["id"])
+        self.counts[record["winner"] or "draw"] += 1
+
+
+@click.command()
+@click.option("--player1", type=click.Choice(list(BOT_TYPES)), default="smart",
+              help="bot playing black")
+@click.option("--player2", type=click.Choice(list(BOT_TYPES)), default="random",
+              help="bot playing red")
+@click.option("--size", default=6, help="board size")
+@click.option("--games", default=100, help="number of games to play")
+@click.option("--seed", default=None,
+              help="master seed, from which every game's seed is derived")
+@click.option("--first_game", default=0,
+              help="number of the first game, to replay games of a seeded run")
+@click.option("--results", default=None,
+              help="file to stream every finished game to, with a checkpoint "
+                   "beside it")
+@click.option("--checkpoint_every", default=CHECKPOINT_EVERY,
+              help="finished games between two checkpoints")
+@click.option("--resume", is_flag=True,
+              help="continue the run of --results where it stopped, with its "
+                   "settings")
+def cmd(player1: str, player2: str, size: int, games: int, seed: str,
+        first_game: int, results: str, checkpoint_every: int,
+        resume: bool) -> None:
+    log = None
+    if resume:
+        if results is None:
+            raise click.UsageError("--resume needs the --results of the run")
+        try:
+            log = SimulationLog.resume(results, checkpoint_every)
+        except FileNotFoundError as err:
+            raise click.UsageError(f"Cannot resume: {err}")
+        config = log.config
+        player1, player2, size = config["player1"], config["player2"], config["size"]
+        games, seed, first_game = config["games"], config["seed"], config["first_game"]
+        print(f"resuming after {len(log.completed)} of {games} games")
+    if size > 20 or size < 6:
+        print("Please enter a size between 6 and 20")
+        return
+    if results is not None and log is None:
+        if seed is None:
+            # a resumed run must play the same games it would have
+            seed = str(random.SystemRandom().getrandbits(64))
+        config = {"player1": player1, "player2": player2, "size": size,
+                  "games": games, "seed": seed, "first_game": first_game}
+        try:
+            log = SimulationLog(results, config, checkpoint_every)
+        except FileExistsError as err:
+            raise click.UsageError(str(err))
+    print(f"testing {player1} against {player2}")
+    try:
+        simulate(player1, player2, games, Board(size), seed, first_game, log)
+    finally:
+        if log is not None:
+            log.close()
+
+
+if __name__ == "__main__":
+    cmd()
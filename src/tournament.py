@@ -0,0 +1,485 @@
+# round-robin and gauntlet tournaments between bot configurations, with
+# sequential probability ratio test early stopping and an Elo table
+
+import math
+import os
+import random
+import time
+from multiprocessing import Pool
+
+import click
+
+from bots import BOT_TYPES, SmartBot, make_bot
+from checkers import Board, Game, game_seed
+
+# tuple[str]: the tournament modes. In a round-robin every configuration
+# plays every other, in a gauntlet the first plays all the others.
+MODES = ("roundrobin", "gauntlet")
+
+# int: the deepest depth searched by a smartbot with a time limit and no
+# depth
+MAX_TIMED_DEPTH = 64
+
+# dict[str, object]: evaluators loaded in this process, by weights file
+_EVALUATORS = {}
+
+
+def parse_config(spec : str) -> dict:
+    """
+    Reads a bot configuration such as "smart:depth=3,weights=w.json". The
+    type comes first, optionally followed by options passed on to the bot.
+    Two options are handled for every type: "time", the seconds per move,
+    and "weights", an evaluator weights file for a smartbot.
+    Args:
+        spec (str): the configuration
+    Raises:
+        ValueError: if the type is unknown or an option has no value
+    Returns:
+        dict: the "name", "type" and "options" of the configuration
+    """
+    bot_type, _, rest = spec.partition(":")
+    if bot_type not in BOT_TYPES and bot_type != "engine":
+        raise ValueError(f"Unknown bot {bot_type}, expected one of "
+                         f"{list(BOT_TYPES) + ['engine']}")
+    options = {}
+    for item in filter(None, rest.split(",")):
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"Option {item!r} of {spec!r} has no value")
+        for kind in (int, float):
+            try:
+                value = kind(value)
+                break
+            except ValueError:
+                pass
+        options[key] = value
+    return {"name": spec, "type": bot_type, "options": options}
+
+
+def make_player(config : dict, game : Game, color : str) -> tuple:
+    """
+    Creates the bot of a configuration.
+    Args:
+        config (dict): the configuration, from parse_config
+        game (Game): the game the bot plays
+        color (str): color of bot's pieces
+    Returns:
+        tuple: the bot, and the seconds per move of a smartbot, or None
+    """
+    options = dict(config["options"])
+    movetime = options.pop("time", None)
+    weights = options.pop("weights", None)
+    if weights is not None:
+        if weights not in _EVALUATORS:
+            # numpy is only needed for learned evaluators
+            from evaluator import load_evaluator
+            _EVALUATORS[weights] = load_evaluator(weights)
+        options["evaluator"] = _EVALUATORS[weights]
+    if config["type"] == "engine":
+        from engine import EngineBot
+        if movetime is not None:
+            options["movetime"] = int(movetime * 1000)
+        return EngineBot(game, color, **options), None
+    if config["type"] == "mcts" and movetime is not None:
+        options["time_limit"] = movetime
+        movetime = None
+    if config["type"] == "smart" and movetime is not None:
+        options.setdefault("depth", MAX_TIMED_DEPTH)
+    return make_bot(config["type"], game, color, **options), movetime
+
+
+def timed_move(bot : SmartBot, movetime : float) -> tuple:
+    """
+    Has a smartbot deepen its search until movetime seconds have passed,
+    playing the best move of the deepest completed depth.
+    Args:
+        bot (SmartBot): the bot
+        movetime (float): seconds for the move
+    Returns:
+        tuple(Piece, tuple): the piece to move and its destination, or None
+        if there is no move
+    """
+    best = None
+    bot.deadline = time.monotonic() + movetime
+    try:
+        for _, lines in bot.analysis(1):
+            if lines:
+                best = (lines[0]["piece"], lines[0]["move"][1])
+    finally:
+        bot.deadline = None
+    if best is None and bot.aborted:
+        depth, bot.depth = bot.depth, 1
+        best = bot.suggest_move()
+        bot.depth = depth
+    return best
+
+
+def random_opening(size : int, plies : int, rng : random.Random) -> list:
+    """
+    Picks random moves from the starting position, so that deterministic
+    bots do not play the same game over and over.
+    Args:
+        size (int): the size of the board
+        plies (int): the number of moves
+        rng (random.Random): the random number generator
+    Returns:
+        list[tuple]: the (location, destination) of every move
+    """
+    game = Game(Board(size))
+    moves = []
+    for _ in range(plies):
+        legal = list(game.generate_moves(game.board, game.current_player))
+        if game.end_game or not legal:
+            break
+        location, destination, piece = rng.choice(legal)
+        game.apply_move_unchecked(piece, destination)
+        moves.append((location, destination))
+    return moves
+
+
+def play_game(black : dict, red : dict, size : int, opening : list,
+              max_plies : int, seed = None):
+    """
+    Plays one game between two configurations.
+    Args:
+        black (dict): the configuration playing black
+        red (dict): the configuration playing red
+        size (int): the size of the board
+        opening (list): the moves to play first, from random_opening
+        max_plies (int): the number of moves after which the game is drawn
+        seed (optional): seed of the game, which bots draw from. Defaults to
+        None.
+    Returns:
+        str | None: the winner's color, None for a draw
+    """
+    game = Game(Board(size), seed=seed)
+    for location, destination in opening:
+        game.apply_move_unchecked(game.board.get_piece(location), destination)
+    players = {"B": make_player(black, game, "B"),
+               "R": make_player(red, game, "R")}
+    try:
+        plies = len(opening)
+        while not game.end_game and plies < max_plies:
+            bot, movetime = players[game.current_player]
+            if movetime is None:
+                move = bot.suggest_move()
+            else:
+                move = timed_move(bot, movetime)
+            if move is None:
+                break
+            game.apply_move_unchecked(*move)
+            plies += 1
+    finally:
+        for bot, _ in players.values():
+            if hasattr(bot, "close"):
+                bot.close()
+    return game.winner
+
+
+def play_pair(job : tuple) -> tuple:
+    """
+    Plays a pair of games from the same random opening, each configuration
+    taking black once. Runs in the worker processes.
+    Args:
+        job (tuple): the pairing, the configurations, the board size, the
+        seed of the pair, the number of opening moves and max_plies
+    Returns:
+        tuple: the pairing, and the first configuration's score in each game
+    """
+    pairing, first, second, size, seed, opening_plies, max_plies = job
+    opening = random_opening(size, opening_plies, random.Random(seed))
+    scores = []
+    for i, (black, red, color) in enumerate(((first, second, "B"),
+                                             (second, first, "R"))):
+        winner = play_game(black, red, size, opening, max_plies,
+                           game_seed(seed, i))
+        scores.append(0.5 if winner is None else float(winner == color))
+    return pairing, scores
+
+
+def elo_difference(score : float) -> float:
+    """
+    Returns the Elo difference that gives an expected score.
+    """
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def expected_score(elo : float) -> float:
+    """
+    Returns the expected score of a player rated elo points above their
+    opponent.
+    """
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def sprt(wins : int, draws : int, losses : int, elo0 : float, elo1 : float,
+         alpha : float, beta : float) -> tuple:
+    """
+    Runs a sequential probability ratio test of H0, the first player is
+    elo0 stronger, against H1, they are elo1 stronger, with the normal
+    approximation of the log-likelihood ratio used by engine testing
+    frameworks.
+    Args:
+        wins, draws, losses (int): the first player's results
+        elo0, elo1 (float): the Elo differences of the two hypotheses
+        alpha (float): the probability of accepting H1 when H0 holds
+        beta (float): the probability of accepting H0 when H1 holds
+    Returns:
+        tuple(float, str | None): the log-likelihood ratio, and "H0" or "H1"
+        once one is accepted, None while undecided
+    """
+    games = wins + draws + losses
+    llr = 0.0
+    if games:
+        win, draw = wins / games, draws / games
+        score = win + draw / 2
+        variance = win + draw / 4 - score * score
+        if variance > 0:
+            score0, score1 = expected_score(elo0), expected_score(elo1)
+            llr = games * (score1 - score0) * \
+                (2 * score - score0 - score1) / (2 * variance)
+    if llr >= math.log((1 - beta) / alpha):
+        return llr, "H1"
+    if llr <= math.log(beta / (1 - alpha)):
+        return llr, "H0"
+    return llr, None
+
+
+class Tournament:
+    """
+    Class representing a tournament between bot configurations. Pairings
+    are played a pair of games at a time in worker processes, and each stops
+    as soon as its SPRT accepts a hypothesis or it reaches max_games.
+    """
+
+    def __init__(self, configs : list, mode = "roundrobin", size = 8,
+                 max_games = 1000, elo0 = 0.0, elo1 = 50.0, alpha = 0.05,
+                 beta = 0.05, opening_plies = 4, max_plies = 300, seed = 0,
+                 processes = None):
+        """
+        Constructor
+
+        Args:
+            configs (list[dict]): the configurations, from parse_config
+            mode (str, optional): "roundrobin" or "gauntlet". Defaults to
+            "roundrobin".
+            size (int, optional): the size of the board. Defaults to 8.
+            max_games (int, optional): the most games per pairing. Defaults
+            to 1000.
+            elo0, elo1 (float, optional): the SPRT hypotheses, the Elo
+            difference between the first and second configuration of a
+            pairing. Defaults to 0 and 50.
+            alpha, beta (float, optional): the SPRT error rates. Default to
+            0.05.
+            opening_plies (int, optional): random moves played before the
+            bots take over. Defaults to 4.
+            max_plies (int, optional): moves after which a game is drawn.
+            Defaults to 300.
+            seed (int, optional): master seed of the random openings and of
+            the games. Defaults to 0.
+            processes (int, optional): worker processes. Defaults to the
+            number of CPUs.
+        Raises:
+            ValueError: if the mode is unknown or there are fewer than two
+            configurations
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode {mode}, expected one of {MODES}")
+        if len(configs) < 2:
+            raise ValueError("A tournament needs at least two bots")
+        self.configs = configs
+        self.mode = mode
+        self.size = size
+        self.max_games = max_games
+        self.elo0, self.elo1 = elo0, elo1
+        self.alpha, self.beta = alpha, beta
+        self.opening_plies = opening_plies
+        self.max_plies = max_plies
+        self.seed = seed
+        self.processes = processes
+        if mode == "gauntlet":
+            self.pairings = [(0, j) for j in range(1, len(configs))]
+        else:
+            self.pairings = [(i, j) for i in range(len(configs))
+                             for j in range(i + 1, len(configs))]
+        # dict[tuple, list[int]]: wins, draws and losses of the first
+        # configuration of every pairing
+        self.results = {pairing: [0, 0, 0] for pairing in self.pairings}
+        # dict[tuple, str | None]: the SPRT decision of every pairing
+        self.decisions = {pairing: None for pairing in self.pairings}
+        self._pairs = {pairing: 0 for pairing in self.pairings}
+
+    def games(self, pairing : tuple) -> int:
+        """
+        Returns the number of games played in a pairing.
+        """
+        return sum(self.results[pairing])
+
+    def finished(self, pairing : tuple) -> bool:
+        """
+        Returns whether a pairing needs no more games.
+        """
+        return self.decisions[pairing] is not None or \
+            self.games(pairing) + 2 > self.max_games
+
+    def run(self, verbose = False) -> None:
+        """
+        Plays the tournament. Every round gives each unfinished pairing one
+        pair of games per worker process.
+        Args:
+            verbose (bool, optional): print the standings after every round.
+            Defaults to False.
+        """
+        batch = self.processes or os.cpu_count() or 1
+        with Pool(self.processes) as pool:
+            while True:
+                jobs = []
+                for pairing in self.pairings:
+                    if self.finished(pairing):
+                        continue
+                    pairs = min(batch, (self.max_games - self.games(pairing)) // 2)
+                    for _ in range(pairs):
+                        jobs.append(self._job(pairing))
+                if not jobs:
+                    break
+                for pairing, scores in pool.imap_unordered(play_pair, jobs):
+                    self._record(pairing, scores)
+                if verbose:
+                    print(self.pairing_table())
+
+    def _job(self, pairing : tuple) -> tuple:
+        """
+        Private method that builds the job of the next pair of games of a
+        pairing.
+        """
+        first, second = pairing
+        index = self._pairs[pairing]
+        self._pairs[pairing] += 1
+        return (pairing, self.configs[first], self.configs[second], self.size,
+                f"{self.seed}:{first}:{second}:{index}", self.opening_plies,
+                self.max_plies)
+
+    def _record(self, pairing : tuple, scores : list) -> None:
+        """
+        Private method that adds the results of a pair of games to a pairing
+        and reruns its SPRT.
+        """
+        results = self.results[pairing]
+        for score in scores:
+            results[0 if score == 1 else 1 if score == 0.5 else 2] += 1
+        if self.decisions[pairing] is None:
+            _, self.decisions[pairing] = sprt(*results, self.elo0, self.elo1,
+                                              self.alpha, self.beta)
+
+    def ratings(self, iterations = 1000) -> list:
+        """
+        Fits Elo ratings to all the games with the Bradley-Terry model,
+        counting a draw as half a win for each side. A virtual draw per
+        pairing keeps the ratings finite when a bot wins or loses every
+        game. The ratings average 0.
+        Args:
+            iterations (int, optional): iterations of the fit. Defaults to
+            1000.
+        Returns:
+            list[float]: the rating of every configuration
+        """
+        n = len(self.configs)
+        scores = [0.0] * n
+        games = {}
+        for (i, j), (wins, draws, losses) in self.results.items():
+            played = wins + draws + losses + 1
+            games[(i, j)] = games[(j, i)] = played
+            scores[i] += wins + (draws + 1) / 2
+            scores[j] += losses + (draws + 1) / 2
+        strength = [1.0] * n
+        for _ in range(iterations):
+            for i in range(n):
+                total = sum(played / (strength[i] + strength[j])
+                            for (k, j), played in games.items() if k == i)
+                if total:
+                    strength[i] = scores[i] / total
+        ratings = [400 * math.log10(s) for s in strength]
+        mean = sum(ratings) / n
+        return [rating - mean for rating in ratings]
+
+    def elo_table(self) -> str:
+        """
+        Returns the configurations ranked by rating, as text.
+        """
+        ratings = self.ratings()
+        played = [0] * len(self.configs)
+        points = [0.0] * len(self.configs)
+        for (i, j), (wins, draws, losses) in self.results.items():
+            for k in (i, j):
+                played[k] += wins + draws + losses
+            points[i] += wins + draws / 2
+            points[j] += losses + draws / 2
+        width = max(len(config["name"]) for config in self.configs)
+        lines = [f"{'rank':>4}  {'bot':<{width}}  {'elo':>7}  {'games':>6}  {'score':>6}"]
+        order = sorted(range(len(self.configs)), key=lambda k: -ratings[k])
+        for rank, k in enumerate(order, 1):
+            score = points[k] / played[k] if played[k] else 0.0
+            lines.append(f"{rank:>4}  {self.configs[k]['name']:<{width}}  "
+                         f"{ratings[k]:>7.1f}  {played[k]:>6}  {score:>6.1%}")
+        return "\n".join(lines)
+
+    def pairing_table(self) -> str:
+        """
+        Returns the results, Elo difference with its 95% interval, and SPRT
+        state of every pairing, as text.
+        """
+        lines = []
+        for pairing in self.pairings:
+            wins, draws, losses = self.results[pairing]
+            games = wins + draws + losses
+            first, second = (self.configs[k]["name"] for k in pairing)
+            line = f"{first} vs {second}: +{wins} ={draws} -{losses}"
+            if games:
+                score = (wins + draws / 2) / games
+                deviation = math.sqrt(max(
+                    (wins + draws / 4) / games - score * score, 0) / games)
+                low = elo_difference(score - 1.96 * deviation)
+                high = elo_difference(score + 1.96 * deviation)
+                llr, decision = sprt(wins, draws, losses, self.elo0,
+                                     self.elo1, self.alpha, self.beta)
+                line += (f"  elo {elo_difference(score):+.1f} "
+                         f"[{low:+.1f}, {high:+.1f}]  llr {llr:.2f} "
+                         f"{decision or 'running'}")
+            lines.append(line)
+        return "\n".join(lines)
+
+
+@click.command()
+@click.option("--bot", "bots", multiple=True, required=True,
+              help="bot configuration such as smart:depth=3,weights=w.json, "
+                   "given once per bot; the first is the gauntlet's champion")
+@click.option("--mode", type=click.Choice(MODES), default="roundrobin")
+@click.option("--size", default=8, help="board size")
+@click.option("--max_games", default=1000, help="most games per pairing")
+@click.option("--elo0", default=0.0, help="SPRT null hypothesis, in Elo")
+@click.option("--elo1", default=50.0, help="SPRT alternative hypothesis, in Elo")
+@click.option("--alpha", default=0.05, help="SPRT false positive rate")
+@click.option("--beta", default=0.05, help="SPRT false negative rate")
+@click.option("--openings", default=4, help="random moves opening every game")
+@click.option("--max_plies", default=300, help="moves after which a game is drawn")
+@click.option("--seed", default=0, help="seed of the random openings")
+@click.option("--processes", default=None, type=int, help="worker processes")
+@click.option("--verbose", is_flag=True, help="print the standings every round")
+def cmd(bots, mode, size, max_games, elo0, elo1, alpha, beta, openings,
+        max_plies, seed, processes, verbose):
+    try:
+        configs = [parse_config(spec) for spec in bots]
+        tournament = Tournament(configs, mode, size, max_games, elo0, elo1,
+                                alpha, beta, openings, max_plies, seed,
+                                processes)
+    except ValueError as err:
+        raise click.BadParameter(str(err))
+    tournament.run(verbose)
+    print(tournament.pairing_table())
+    print()
+    print(tournament.elo_table())
+
+
+if __name__ == "__main__":
+    cmd()
@@ -2,7 +2,10 @@ import time
 import click
 from colorama import Fore, Style
 from checkers import Piece, Board, Game
-from bots import RandomBot, SmartBot
+from bots import RandomBot, SmartBot, MCTSBot
+from worker import WorkerBot
+from engine import EngineBot
+from hints import HintEngine
 
 class TUIPlayer:
     """
@@ -10,28 +13,49 @@ class TUIPlayer:
     Attributes:
         color(str): the color of the player's pieces
         n(int): The number of the player
-        type(str): Whether the player is a human, a random bot, or a smart bot
+        type(str): Whether the player is a human, a random bot, a smart bot,
+            an mcts bot or an engine process
         board(Board): The board that the player is playing on
         game(Game): The game that the player is playing with
+        evaluator: A learned evaluator for a smart bot, or None to use the
+            material count
+        worker(bool): Whether a bot runs in its own engine worker process
+        engine(str): The command starting an engine process, None for the
+            reference engine
+        hints(HintEngine): Analyses the position while a human thinks, or
+            None for no hints
     """
     def __init__(self, board: Board, n: int, player_type: str,
-        game: Game, delay = 0.5):
+        game: Game, delay = 0.5, evaluator = None, worker = False,
+        engine = None, hints = None):
         self.color = game.players[n]
-        if player_type == "human":
+        if player_type == "engine":
+            self.bot = EngineBot(game, self.color, engine)
+            self.name = f"{self.bot.name} {n}"
+        elif player_type != "human" and worker:
+            self.name = f"{player_type} bot {n}"
+            options = ({"evaluator": evaluator}
+                       if evaluator and player_type == "smart" else {})
+            self.bot = WorkerBot(game, self.color, player_type, **options)
+        elif player_type == "human":
             self.name = f"Player {n}"
             self.bot = None
         elif player_type == "random":
             self.name = f"random bot {n}"
             self.bot = RandomBot(game, self.color)
+        elif player_type == "mcts":
+            self.name = f"mcts bot {n}"
+            self.bot = MCTSBot(game, self.color)
         else:
             self.name  = f"smart bot {n}"
-            self.bot = SmartBot(game, self.color)
+            self.bot = SmartBot(game, self.color, evaluator=evaluator)
         self.n = n
         self.type = player_type
         self.board = board
         self.game = game
         self.draw_count = 0
         self.delay = delay
+        self.hints = hints if player_type == "human" else None
 
     def check_if_valid(self,loc: list) -> bool:
         """
@@ -59,6 +83,9 @@ class TUIPlayer:
         if input == "I resign":
             self.game.resign(self.n)
             return "break"
+        elif input == "hint":
+            self.show_hint()
+            return "continue"
         elif input == "draw":
             if self.draw_count > 0:
                 self.draw_count += 1
@@ -85,6 +112,23 @@ class TUIPlayer:
             return "continue"
         return p
 
+    def show_hint(self) -> None:
+        """
+        Method that prints the best move the background analysis has found
+        for the current position so far.
+        """
+        if self.hints is None:
+            print("Hints are turned off")
+            return
+        hint = self.hints.hint(self.game)
+        if hint is None:
+            print("No hint yet, ask again in a moment")
+            return
+        location, destination = hint["move"]
+        print(f"Hint: move {location[0] + 1},{location[1] + 1} to "
+              f"{destination[0] + 1},{destination[1] + 1} (score "
+              f"{hint['score']:g} at depth {hint['depth']})")
+
     def get_jump(self, piece: Piece) -> None:
         """
         Method that asks the player to input a jump if they are able to make a
@@ -112,7 +156,7 @@ class TUIPlayer:
             while self.color == self.game.current_player:
                 destination = self.bot.suggest_move()
                 if destination[0] == piece:
-                    self.game.move(piece, destination[1])
+                    self.game.apply_move_unchecked(piece, destination[1])
 
     def get_move(self) -> None:
         """
@@ -134,11 +178,15 @@ class TUIPlayer:
                         break
                     self.game._alternate_turns()
                     break
+                if self.hints is not None:
+                    self.hints.start(self.game)
                 print("piece must be chosen in the format 'row,column'")
                 if self.draw_count > 1:
                     print("Please do not spam draw offers")
                 else:
                     print("Resign by entering 'I resign' offer a draw w/'draw'")
+                if self.hints is not None:
+                    print("Ask for a hint by entering 'hint'")
                 # Requests move
                 selected =input(f"What piece would {self.name} like to move?\n")
                 # Processes move
@@ -174,6 +222,8 @@ class TUIPlayer:
                     continue
                 if self.color == self.game.current_player:
                     self.get_jump(piece)
+            if self.hints is not None:
+                self.hints.cancel()
         else:
             # Do bot things need to see bot implimentation
             # Ask for a column (and re-ask if
@@ -182,10 +232,16 @@ class TUIPlayer:
             while self.color == self.game.current_player:
                 if self.game.draw_offered is True:
                     self.game.accept_reject_draw(self.n, False)
-                move = self.bot.suggest_move()
-                time.sleep(self.delay)
+                if isinstance(self.bot, WorkerBot):
+                    # the worker searches during the delay
+                    self.bot.request_move()
+                    time.sleep(self.delay)
+                    move = self.bot.suggest_move()
+                else:
+                    move = self.bot.suggest_move()
+                    time.sleep(self.delay)
                 print(f"{self.name} moves {move[0].location, move[1]}")
-                self.game.move(move[0], move[1])
+                self.game.apply_move_unchecked(move[0], move[1])
                 if self.game.current_player == self.color:
                     self.get_jump(move[0])
 
@@ -284,6 +340,8 @@ def play_checkers(game: Game, board: Board, players) -> None:
             print(f"{players[1]} Wins!")
         else:
             print(f"{players[2]} Wins!")
+    elif game.draw_reason is not None:
+        print(f"It's a draw by {game.draw_reason}!")
     else:
         print("It's a draw!")
     print(f"The game took {turn_count} turns.")
@@ -308,18 +366,34 @@ def ask_for_rematch(game: Game, players) -> None:
 @click.command()
 
 @click.option("--player1", prompt="player1 type",type=click.Choice([
-            'human', 'random','smart'], case_sensitive=False),
-            default="human", help="human, random bot or smart bot")
+            'human', 'random','smart', 'mcts', 'engine'], case_sensitive=False),
+            default="human",
+            help="human, random bot, smart bot, mcts bot or engine process")
 @click.option("--player2", prompt="player2 type",type=click.Choice([
-            'human', 'random','smart'], case_sensitive=False),
-            default = "random", help="human, random bot or smart bot")
+            'human', 'random','smart', 'mcts', 'engine'], case_sensitive=False),
+            default = "random",
+            help="human, random bot, smart bot, mcts bot or engine process")
 @click.option("--bot_delay", prompt = "bot delay", default=0.5,
             help="Delay between bot moves")
 @click.option("--size", prompt="board size", default=8, help="board size")
 @click.option("--rounds", prompt="how many rounds would you like to play?",
             default=1)
-def cmd(player1: str, player2: str, bot_delay: int, size: int, rounds: int
-        ) -> None:
+@click.option("--weights1", default=None,
+            help="evaluator weights file for a smart bot player 1")
+@click.option("--weights2", default=None,
+            help="evaluator weights file for a smart bot player 2")
+@click.option("--worker", is_flag=True,
+            help="run each bot in its own engine worker process")
+@click.option("--engine1", default=None,
+            help="command starting player 1's engine, if not the reference one")
+@click.option("--engine2", default=None,
+            help="command starting player 2's engine, if not the reference one")
+@click.option("--hints", is_flag=True,
+            help="analyse in the background so human players can ask for hints")
+@click.option("--hint_depth", default=6, help="depth of the hint analysis")
+def cmd(player1: str, player2: str, bot_delay: int, size: int, rounds: int,
+        weights1: str, weights2: str, worker: bool, engine1: str,
+        engine2: str, hints: bool, hint_depth: int) -> None:
 
     if len(str(size)) != 1 and len(str(size)) != 2:
         print("Please enter size as an int between 6 and 20.")
@@ -335,8 +409,17 @@ def cmd(player1: str, player2: str, bot_delay: int, size: int, rounds: int
     print()
     board = Board(size)
     game = Game(board)
-    p1 = TUIPlayer(board, 1, player1, game, bot_delay)
-    p2 = TUIPlayer(board, 2, player2, game, bot_delay)
+    evaluators = {}
+    for n, weights in ((1, weights1), (2, weights2)):
+        if weights:
+            # numpy is only needed for learned evaluators
+            from evaluator import load_evaluator
+            evaluators[n] = load_evaluator(weights)
+    hint_engine = HintEngine(hint_depth) if hints else None
+    p1 = TUIPlayer(board, 1, player1, game, bot_delay, evaluators.get(1),
+                   worker, engine1, hint_engine)
+    p2 = TUIPlayer(board, 2, player2, game, bot_delay, evaluators.get(2),
+                   worker, engine2, hint_engine)
 
     players = {1: p1, 2: p2}
     while True:
@@ -348,6 +431,11 @@ def cmd(player1: str, player2: str, bot_delay: int, size: int, rounds: int
             if ask_for_rematch(game, players) is False:
                 break
     print(f"The final score is {game.score[0]} to {game.score[1]}")
+    for player in players.values():
+        if isinstance(player.bot, (WorkerBot, EngineBot)):
+            player.bot.close()
+    if hint_engine is not None:
+        hint_engine.cancel()
 
 if __name__ == "__main__":
     cmd()
\ No newline at end of file
@@ -0,0 +1,240 @@
+# Texel-style tuning of the smartbot's evaluation weights
+
+import math
+from multiprocessing import Pool
+
+import click
+import numpy as np
+
+from checkers import Game
+from evaluator import (FEATURES, WeightedEvaluator, board_features,
+                       save_evaluator, self_play_games)
+
+
+def read_chunks(path : str, chunk_size : int):
+    """
+    Streams a labelled positions file in chunks. Each line of the file holds
+    a position (see Game.to_position) and black's score in the game it comes
+    from (1 for a win, 0.5 for a draw, 0 for a loss), separated by a space.
+    Args:
+        path (str): the labelled positions file
+        chunk_size (int): the number of lines per chunk
+    Yields:
+        list[str]: the lines of the next chunk
+    """
+    chunk = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                chunk.append(line)
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+def chunk_features(lines : list) -> tuple:
+    """
+    Parses a chunk of labelled positions.
+    Args:
+        lines (list[str]): lines of a labelled positions file
+    Returns:
+        tuple(np.ndarray, np.ndarray): the features and the result of every
+        position
+    """
+    features = []
+    results = []
+    for line in lines:
+        position, result = line.split()
+        features.append(board_features(Game.from_position(position).board))
+        results.append(float(result))
+    return (np.array(features, dtype=np.float64).reshape(len(lines), len(FEATURES)),
+            np.array(results))
+
+
+def chunk_error(job : tuple) -> tuple:
+    """
+    Computes the prediction error of a set of weights on a chunk of labelled
+    positions. The predicted result of a position is sigmoid(scale * eval).
+    Runs in the worker processes.
+    Args:
+        job (tuple): the chunk's lines, the weight vector, the scale and
+        whether to compute the gradient
+    Returns:
+        tuple(float, np.ndarray | None, int): the sum of squared errors, its
+        gradient with respect to the weights or None if not asked for, and
+        the number of positions
+    """
+    lines, weights, scale, with_gradient = job
+    features, results = chunk_features(lines)
+    predicted = 1 / (1 + np.exp(-scale * (features @ weights)))
+    error = results - predicted
+    gradient = None
+    if with_gradient:
+        gradient = -2 * scale * features.T @ (error * predicted * (1 - predicted))
+    return float(error @ error), gradient, len(results)
+
+
+class Tuner:
+    """
+    Class that fits evaluation weights to a labelled positions file by
+    minimizing the mean squared error between the results and the results
+    predicted from the evaluation. The error over the file is computed in
+    chunks spread across worker processes, so the file never has to fit in
+    memory.
+    """
+
+    def __init__(self, path : str, processes = None, chunk_size = 10000):
+        """
+        Constructor
+        Args:
+            path (str): the labelled positions file (see read_chunks)
+            processes (int, optional): number of worker processes. Defaults
+            to the number of CPUs.
+            chunk_size (int, optional): positions per chunk. Defaults to 10000.
+        """
+        self.path = path
+        self.processes = processes
+        self.chunk_size = chunk_size
+
+    def error(self, pool, weights : dict, scale : float,
+              with_gradient = True) -> tuple:
+        """
+        Computes the mean squared prediction error and its gradient.
+        Args:
+            pool (Pool): the worker processes
+            weights (dict[str, float]): the evaluation weights
+            scale (float): the scale from evaluation to sigmoid input
+            with_gradient (bool, optional): compute the gradient as well.
+            Defaults to True.
+        Raises:
+            ValueError: if the positions file is empty
+        Returns:
+            tuple(float, np.ndarray | None): the error and its gradient, or
+            None if with_gradient is False
+        """
+        vector = np.array([weights[name] for name in FEATURES])
+        jobs = ((lines, vector, scale, with_gradient)
+                for lines in read_chunks(self.path, self.chunk_size))
+        total = 0.0
+        gradient = np.zeros(len(FEATURES)) if with_gradient else None
+        count = 0
+        for chunk_total, chunk_gradient, chunk_count in pool.imap_unordered(chunk_error, jobs):
+            total += chunk_total
+            if with_gradient:
+                gradient += chunk_gradient
+            count += chunk_count
+        if count == 0:
+            raise ValueError(f"No positions in {self.path}")
+        return total / count, gradient / count if with_gradient else None
+
+    def fit_scale(self, pool, weights : dict) -> float:
+        """
+        Finds the scale that best maps the evaluation to results for fixed
+        weights, by golden section search. The interior point that survives
+        an iteration is kept, so each iteration costs one pass over the file.
+        """
+        low, high = 0.01, 10.0
+        ratio = (math.sqrt(5) - 1) / 2
+        a = high - ratio * (high - low)
+        b = low + ratio * (high - low)
+        error_a = self.error(pool, weights, a, with_gradient=False)[0]
+        error_b = self.error(pool, weights, b, with_gradient=False)[0]
+        for _ in range(20):
+            if error_a < error_b:
+                high, b, error_b = b, a, error_a
+                a = high - ratio * (high - low)
+                error_a = self.error(pool, weights, a, with_gradient=False)[0]
+            else:
+                low, a, error_a = a, b, error_b
+                b = low + ratio * (high - low)
+                error_b = self.error(pool, weights, b, with_gradient=False)[0]
+        return (low + high) / 2
+
+    def tune(self, weights = None, iterations = 100, learning_rate = 1.0,
+             verbose = False) -> tuple:
+        """
+        Fits the evaluation weights by gradient descent.
+        Args:
+            weights (dict[str, float], optional): the starting weights.
+            Defaults to WeightedEvaluator.DEFAULT_WEIGHTS.
+            iterations (int, optional): passes over the file. Defaults to 100.
+            learning_rate (float, optional): step size. Defaults to 1.
+            verbose (bool, optional): print the error after every pass.
+        Returns:
+            tuple(WeightedEvaluator, float): the fitted evaluator and its error
+        """
+        weights = WeightedEvaluator(weights).weights
+        with Pool(self.processes) as pool:
+            scale = self.fit_scale(pool, weights)
+            if verbose:
+                print(f"scale: {scale:.4f}")
+            for i in range(iterations):
+                error, gradient = self.error(pool, weights, scale)
+                if verbose:
+                    print(f"iteration {i}: error {error:.6f}")
+                for name, step in zip(FEATURES, gradient):
+                    weights[name] -= learning_rate * step
+            error, _ = self.error(pool, weights, scale, with_gradient=False)
+        # only the ordering of scores matters to the search, so express the
+        # weights in material units with a man weighing 1, as in
+        # Board._evaluate
+        if weights["men"] > 0:
+            weights = {name: weight / weights["men"]
+                       for name, weight in weights.items()}
+        return WeightedEvaluator(weights), error
+
+
+@click.group()
+def cmd():
+    pass
+
+
+@cmd.command()
+@click.option("--games", default=100, help="number of self-play games")
+@click.option("--size", default=8, help="board size")
+@click.option("--depth", default=2, help="smartbot search depth")
+@click.option("--epsilon", default=0.2, help="probability of a random move")
+@click.option("--out", default="positions.txt", help="file to append to")
+@click.option("--seed", default=None, help="master seed of the games")
+def record(games, size, depth, epsilon, out, seed):
+    """
+    Appends labelled positions from self-play games to a file.
+    """
+    count = 0
+    with open(out, "a") as f:
+        for positions, outcome in self_play_games(games, size, depth,
+                                                  epsilon, seed):
+            f.writelines(f"{position} {outcome}\n" for position in positions)
+            count += len(positions)
+    print(f"wrote {count} positions to {out}")
+
+
+@cmd.command()
+@click.option("--data", required=True, help="labelled positions file")
+@click.option("--out", default="weights.json", help="file to write the weights to")
+@click.option("--start", default=None, help="weights file to start from")
+@click.option("--processes", default=None, type=int, help="worker processes")
+@click.option("--chunk_size", default=10000, help="positions per chunk")
+@click.option("--iterations", default=100)
+@click.option("--learning_rate", default=1.0)
+def tune(data, out, start, processes, chunk_size, iterations, learning_rate):
+    """
+    Fits the smartbot evaluation weights to a labelled positions file.
+    """
+    weights = None
+    if start:
+        from evaluator import load_evaluator
+        evaluator = load_evaluator(start)
+        if evaluator.kind != "weighted":
+            raise click.UsageError("--start needs a .json weights file")
+        weights = evaluator.weights
+    tuner = Tuner(data, processes, chunk_size)
+    evaluator, error = tuner.tune(weights, iterations, learning_rate, True)
+    save_evaluator(evaluator, out)
+    print(f"error {error:.6f}, wrote weights to {out}")
+
+
+if __name__ == "__main__":
+    cmd()
@@ -0,0 +1,210 @@
+# engine worker process that keeps a warm bot for the front-ends
+
+import time
+from multiprocessing import Pipe, Process
+
+from checkers import Board, Game
+
+
+def _serve(conn, bot_type : str, size : int, color : str, options : dict) -> None:
+    """
+    Main loop of the worker process. The bot, its game and the lookup tables
+    for the board size are created once and kept warm between requests.
+    Messages received:
+        ("move", request_id, position, color, game_number): search a position
+        ("stop",): exit
+    Messages sent:
+        ("move", request_id, (location, destination) or None)
+        ("error", request_id, message)
+    """
+    from bots import make_bot
+
+    game = Game(Board(size))
+    bot = make_bot(bot_type, game, color, **options)
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message[0] == "stop":
+            break
+        _, request_id, position, color, game_number = message
+        try:
+            # a new game number tells the bot that a rematch has started
+            game.game_number = game_number
+            game.set_position(position)
+            bot._color = color
+            move = bot.suggest_move()
+            if move is not None:
+                piece, destination = move
+                move = (piece.location, destination)
+            conn.send(("move", request_id, move))
+        except Exception as err:
+            conn.send(("error", request_id, repr(err)))
+    conn.close()
+
+
+class EngineWorker:
+    """
+    Class representing a bot running in its own process. Positions are sent
+    to it over a pipe and moves come back asynchronously, so the caller is
+    free to do other work while the bot searches.
+    """
+
+    def __init__(self, bot_type : str, size : int, color : str, options = None):
+        """
+        Constructor, starts the worker process.
+        Args:
+            bot_type (str): "random", "smart" or "mcts"
+            size (int): the size of the board
+            color (str): color of bot's pieces
+            options (dict, optional): passed on to the bot's constructor
+        """
+        self._conn, child = Pipe()
+        self._process = Process(target=_serve, args=(
+            child, bot_type, size, color, options or {}), daemon=True)
+        self._process.start()
+        child.close()
+        self._next_id = 0
+        self._pending = None
+
+    def request(self, position : str, color : str, game_number = 0) -> int:
+        """
+        Asks the worker for a move. Any earlier request still being searched
+        will have its answer discarded.
+        Args:
+            position (str): the position, as written by Game.to_position
+            color (str): color of bot's pieces
+            game_number (int, optional): the game's game_number
+        Returns:
+            int: the id of the request
+        """
+        self._next_id += 1
+        self._pending = self._next_id
+        self._conn.send(("move", self._next_id, position, color, game_number))
+        return self._next_id
+
+    def poll(self, timeout = 0.0):
+        """
+        Returns the answer to the latest request if it has arrived.
+        Args:
+            timeout (float | None, optional): seconds to wait for it, None to
+            wait until it arrives. Defaults to 0.
+        Raises:
+            RuntimeError: if the bot failed in the worker
+        Returns:
+            tuple(bool, tuple | None): whether the answer arrived, and the
+            (location, destination) of the move, or None if there is none
+        """
+        while self._pending is not None and self._conn.poll(timeout):
+            kind, request_id, result = self._conn.recv()
+            if request_id != self._pending:
+                continue
+            self._pending = None
+            if kind == "error":
+                raise RuntimeError(f"Engine worker failed: {result}")
+            return True, result
+        return False, None
+
+    @property
+    def busy(self) -> bool:
+        """
+        Whether a request is waiting for its answer
+        """
+        return self._pending is not None
+
+    def close(self) -> None:
+        """
+        Stops the worker process.
+        """
+        if self._process.is_alive():
+            try:
+                self._conn.send(("stop",))
+            except (BrokenPipeError, OSError):
+                pass
+            self._process.join(1)
+            if self._process.is_alive():
+                self._process.terminate()
+        self._conn.close()
+
+
+class WorkerBot:
+    """
+    Class representing a bot whose searches run in an EngineWorker. It can be
+    used like the other bots through suggest_move, or without blocking
+    through request_move and poll_move.
+    """
+
+    def __init__(self, game : Game, color : str, bot_type = "smart", **options):
+        """
+        Constructor
+
+        Args:
+            game (Game): the current game
+            color (str): color of bot's pieces
+            bot_type (str, optional): the bot running in the worker, "random",
+            "smart" or "mcts". Defaults to "smart".
+            options: passed on to the bot's constructor in the worker
+        """
+        self._game = game
+        self._board = game.board
+        self._color = color
+        self.wins = 0
+        self.worker = EngineWorker(bot_type, game.board.size, color, options)
+        self._position = None
+        self._requested_at = None
+
+    def request_move(self) -> None:
+        """
+        Starts a search of the current position in the worker, unless one is
+        already running for it.
+        """
+        position = self._game.to_position()
+        if self.worker.busy and position == self._position:
+            return
+        self._position = position
+        self._requested_at = time.monotonic()
+        self.worker.request(position, self._color, self._game.game_number)
+
+    def poll_move(self, min_delay = 0.0):
+        """
+        Returns the move found by the worker, if the search has finished and
+        at least min_delay seconds have passed since it was requested.
+
+        Args:
+            min_delay (float, optional): seconds to hold the move back for.
+            Defaults to 0.
+        Returns:
+            tuple(Piece, tuple) | None: the piece to move and its destination,
+            or None if the move is not ready
+        """
+        if self._position != self._game.to_position():
+            return None
+        if time.monotonic() - self._requested_at < min_delay:
+            return None
+        ready, move = self.worker.poll()
+        if not ready or move is None:
+            return None
+        location, destination = move
+        return self._board.get_piece(location), destination
+
+    def suggest_move(self) -> tuple:
+        """
+        Suggests a move, waiting for the worker's search to finish.
+
+        Returns:
+            tuple(Piece, tuple): a tuple containing the piece that should be
+            moved and where it should be moved in coordinate form
+        """
+        self.request_move()
+        _, move = self.worker.poll(None)
+        if move is None:
+            return None
+        location, destination = move
+        return self._board.get_piece(location), destination
+
+    def close(self) -> None:
+        """
+        Stops the worker process.
+        """
+        self.worker.close()